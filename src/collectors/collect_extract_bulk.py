@@ -66,6 +66,10 @@ def run_bulk(season: str, leagues: list):
         if matches:
             print(f"[bulk_extract]   -> extracting {len(matches)} matches...", flush=True)
 
+            # En listning per liga istället för en existens-koll per match
+            existing = set(azure_blob.list_prefix(container, f"stats/{season}/{league_id}/"))
+
+            to_upload = {}
             for match in matches:
                 match_id = match.get("id")
                 if not match_id:
@@ -75,14 +79,16 @@ def run_bulk(season: str, leagues: list):
                 blob_path = f"stats/{season}/{league_id}/{match_id}.json"
 
                 # Hoppa över om filen redan finns
-                try:
-                    azure_blob.get_text(container, blob_path)
+                if blob_path in existing or blob_path in to_upload:
                     skipped += 1
                     continue
-                except Exception:
-                    pass
 
-                azure_blob.upload_json(container, blob_path, match)
+                to_upload[blob_path] = match
+
+            for blob_path, err in azure_blob.upload_many_json(container, to_upload):
+                if err is not None:
+                    print(f"[bulk_extract]   ⚠️ Upload failed for {blob_path}: {err}", flush=True)
+                    continue
                 exported += 1
 
         print(f"[bulk_extract]   Done: {exported} exported, {skipped} skipped\n", flush=True)
@@ -1,6 +1,7 @@
 import os
 import argparse
 from src.storage import azure_blob
+from src.common import master_players
 
 CONTAINER = os.getenv("AZURE_STORAGE_CONTAINER", "afp")
 MASTER_PATH = "players/africa/players_africa_master.json"
@@ -8,17 +9,7 @@ MASTER_PATH = "players/africa/players_africa_master.json"
 
 def load_master_ids():
     """Läs in masterfilen och returnera en set med giltiga player_ids (endast numeriska)."""
-    data = azure_blob.get_json(CONTAINER, MASTER_PATH)
-    ids = set()
-    if isinstance(data, dict) and "players" in data:
-        players = data["players"]
-    else:
-        players = data
-    for p in players:
-        pid = str(p.get("id", ""))
-        if pid.isdigit():
-            ids.add(pid)
-    return ids
+    return set(master_players.get_registry(CONTAINER).numeric_ids)
 
 
 def load_manifest(season: str, league_id: str):
@@ -3,6 +3,7 @@ import argparse
 import json
 import yaml
 from src.storage import azure_blob
+from src.common import master_players
 
 
 MASTER_PATH = "players/africa/players_africa_master.json"
@@ -10,17 +11,7 @@ LEAGUES_PATH = "config/leagues.yaml"
 
 
 def load_master_ids(container: str):
-    data = azure_blob.get_json(container, MASTER_PATH)
-    ids = set()
-    if isinstance(data, dict) and "players" in data:
-        players = data["players"]
-    else:
-        players = data
-    for p in players:
-        pid = str(p.get("id", ""))
-        if pid.isdigit():
-            ids.add(pid)
-    return ids
+    return set(master_players.get_registry(container).numeric_ids)
 
 
 def load_leagues():
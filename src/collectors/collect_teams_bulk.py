@@ -1,6 +1,7 @@
 import os
 import argparse
 from src.storage import azure_blob
+from src.common import master_players
 
 CONTAINER = os.environ.get("AZURE_STORAGE_CONTAINER") or "afp"
 HISTORY_PATH = "players/africa/players_africa_history.json"
@@ -16,17 +17,12 @@ def load_json(container: str, path: str):
 
 
 def build_master_lookup(container: str):
-    """Bygg en lookup {player_id: {name, country}} från masterfilen"""
-    data = load_json(container, MASTER_PATH)
-    players = data.get("players", [])
-    lookup = {}
-    for player in players:
-        pid = str(player.get("id"))
-        lookup[pid] = {
-            "name": player.get("name"),
-            "country": player.get("country"),
-        }
-    return lookup
+    """Lookup {player_id: spelare} från det delade masterregistret (spelarna har name/country)"""
+    try:
+        return master_players.get_registry(container).by_id
+    except Exception as e:
+        print(f"[collect_teams_bulk] ⚠️ Could not load {MASTER_PATH}: {e}", flush=True)
+        return {}
 
 
 def collect_teams(container: str, season: str):
@@ -56,8 +52,8 @@ def collect_teams(container: str, season: str):
 
             league_teams[club_id]["players"].append({
                 "id": pid,
-                "name": info["name"],
-                "country": info["country"]
+                "name": info.get("name"),
+                "country": info.get("country")
             })
             processed += 1
 
@@ -2,6 +2,7 @@ import os
 import yaml
 from collections import defaultdict
 from src.storage import azure_blob
+from src.common import master_players
 
 CONTAINER = os.environ.get("AZURE_STORAGE_CONTAINER", "afp")
 
@@ -28,11 +29,10 @@ def get_active_season(container: str, league_id: int) -> str | None:
 
 
 def load_master(container: str):
-    path = "players/africa/players_africa_master.json"
-    master = azure_blob.get_json(container, path)
-    if not master or "players" not in master:
-        raise RuntimeError(f"[collect_teams_current_bulk] Missing or invalid master file at {path}")
-    return master["players"]
+    registry = master_players.get_registry(container)
+    if not registry.players:
+        raise RuntimeError(f"[collect_teams_current_bulk] Missing or invalid master file at {master_players.MASTER_PATH}")
+    return registry.players
 
 
 def load_team_info(container: str, league_id: int, team_id: int):
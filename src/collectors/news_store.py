@@ -0,0 +1,179 @@
+# src/collectors/news_store.py
+"""
+Append-only, deduplicerad nyhetsstore per liga och dag.
+
+Layout (under collectorns BLOB_PREFIX, normalt "collector/" – se collector_prefix):
+  curated/news/_store/<league>/<day>/index.json
+  curated/news/_store/<league>/<day>/chunks/<nnnn>-<ts>.jsonl
+
+Varje collector-körning skriver EN ny chunk med bara de items som inte redan
+finns (dedupe på item-id och på hash av normaliserad URL – samma story i flera
+feeds sparas en gång; items med olika id hålls isär även om URL:en är densamma)
+och uppdaterar det kompakta indexet. Producern läser
+index + chunks som en sammanslagen, deduplicerad ström.
+
+Indexet håller även first_seen per story (ärvt från gårdagens index), vilket
+produce_scoring använder för novelty_24h.
+"""
+
+import os
+import json
+import hashlib
+from datetime import datetime, timedelta
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+STORE_ROOT = "curated/news/_store"
+DEFAULT_COLLECTOR_PREFIX = "collector/"
+
+
+def collector_prefix() -> str:
+    """
+    Prefixet som collectorn skriver under, sett från jobb som läser dess output.
+    Collect-jobbet skriver under sin BLOB_PREFIX (infra/collect-job.yaml: "collector/");
+    läsare (t.ex. producern) anger samma värde i COLLECTOR_BLOB_PREFIX.
+    """
+    return os.getenv("COLLECTOR_BLOB_PREFIX", DEFAULT_COLLECTOR_PREFIX)
+
+
+def store_prefix(prefix: str, league: str, day: str) -> str:
+    return f"{prefix}{STORE_ROOT}/{league}/{day}"
+
+
+# Spårningsparametrar som inte pekar ut en annan artikel (utm_* matchas på prefix)
+TRACKING_PARAMS = {"fbclid", "gclid", "at_medium", "at_campaign"}
+
+
+def _is_tracking(param: str) -> bool:
+    param = param.lower()
+    return param.startswith("utm_") or param in TRACKING_PARAMS
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalisera URL för dedupe: gemen värd, utan fragment/avslutande snedstreck och
+    utan spårningsparametrar. Övriga query-parametrar behålls (sorterade) –
+    article.php?id=123 och ?id=456 är olika artiklar.
+    """
+    if not url:
+        return ""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = parts.path.rstrip("/")
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                             if not _is_tracking(k)))
+    return urlunsplit(("", host, path, query, ""))
+
+
+def _h(value: str) -> str:
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()[:16]
+
+
+def item_keys(item: dict):
+    """Dedupe-nycklar för ett item: url:<hash> och id:<hash> (de som finns)."""
+    keys = []
+    url = normalize_url(item.get("link") or "")
+    if url:
+        keys.append(f"url:{_h(url)}")
+    if item.get("id"):
+        keys.append(f"id:{_h(str(item['id']))}")
+    return keys
+
+
+def _find_known(keys: dict, entries: dict, ks):
+    """
+    Känd story för ett items nycklar. id-träff vinner; en URL-träff räknas bara om
+    storyn och itemet inte har olika id (samma URL kan bära flera artiklar).
+    """
+    id_key = next((k for k in ks if k.startswith("id:")), None)
+    if id_key is not None and id_key in keys:
+        return keys[id_key]
+    for k in ks:
+        if k.startswith("url:") and k in keys:
+            known = keys[k]
+            known_id = entries.get(known, {}).get("id_key")
+            if id_key is None or known_id is None or known_id == id_key:
+                return known
+    return None
+
+
+def empty_index(league: str, day: str) -> dict:
+    return {"league": league, "day": day, "chunks": [], "keys": {}, "items": {}}
+
+
+def append_items(index: dict, prev_index, items_by_source: dict, now_iso: str):
+    """
+    Lägg in nya items i indexet (muterar index). Returnerar listan av nya items,
+    var och en med "store_key" och "first_seen" satta. Redan kända items får bara
+    källan tillagd i index["items"][key]["sources"].
+    """
+    keys = index["keys"]
+    entries = index["items"]
+    prev_keys = (prev_index or {}).get("keys", {})
+    prev_items = (prev_index or {}).get("items", {})
+    chunk_no = len(index["chunks"])
+
+    new_items = []
+    for source, items in items_by_source.items():
+        for item in items or []:
+            ks = item_keys(item)
+            if not ks:
+                continue
+            known = _find_known(keys, entries, ks)
+            if known is not None:
+                srcs = entries[known]["sources"]
+                if source not in srcs:
+                    srcs.append(source)
+                for k in ks:
+                    keys.setdefault(k, known)
+                continue
+
+            # URL-nyckeln kan redan tillhöra en annan story (annat id) → använd id-nyckeln
+            store_key = next((k for k in ks if k not in entries), ks[-1])
+            id_key = next((k for k in ks if k.startswith("id:")), None)
+            prev_key = _find_known(prev_keys, prev_items, ks)
+            first_seen = prev_items.get(prev_key, {}).get("first_seen") if prev_key else None
+            first_seen = first_seen or now_iso
+
+            for k in ks:
+                keys.setdefault(k, store_key)
+            entries[store_key] = {"first_seen": first_seen, "sources": [source], "chunk": chunk_no,
+                                  "id_key": id_key}
+            new_items.append({**item, "store_key": store_key, "first_seen": first_seen})
+    return new_items
+
+
+def chunk_name(index: dict, ts: str) -> str:
+    safe_ts = "".join(ch for ch in ts if ch.isalnum())
+    return f"chunks/{len(index['chunks']):04d}-{safe_ts}.jsonl"
+
+
+def to_jsonl(items) -> str:
+    return "\n".join(json.dumps(i, ensure_ascii=False) for i in items)
+
+
+def from_jsonl(text: str):
+    return [json.loads(line) for line in (text or "").splitlines() if line.strip()]
+
+
+def previous_day(day: str) -> str:
+    return (datetime.strptime(day, "%Y-%m-%d") - timedelta(days=1)).date().isoformat()
+
+
+def merge_stream(index: dict, chunks):
+    """
+    Slå ihop chunk-innehåll (i chunk-ordning) till en deduplicerad lista och
+    berika varje item med "sources" (alla feeds som bar storyn) från indexet.
+    """
+    entries = index.get("items", {})
+    seen, out = set(), []
+    for chunk_items in chunks:
+        for item in chunk_items:
+            key = item.get("store_key")
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            entry = entries.get(key, {})
+            out.append({**item, "sources": list(entry.get("sources", [item.get("source")]))})
+    return out
@@ -1,11 +1,15 @@
 # collectors/rss_multi.py
-import os, json, uuid, sys, pathlib, re
+import os, json, uuid, sys, pathlib, re, time, threading, hashlib
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timezone
+from urllib.parse import urlparse
 from zoneinfo import ZoneInfo
 import requests
 import feedparser
 
 from src.common.blob_io import get_container_client
+from src.common.http_session import make_session
+from src.collectors import news_store
 
 TZ = ZoneInfo("Europe/Stockholm")
 
@@ -22,6 +26,13 @@ def upload_json(container_client, path: str, obj):
     container_client.upload_blob(name=path, data=data, overwrite=True)
     return path
 
+def download_json(container_client, path: str):
+    """Läs en JSON-blob via container-klienten; None om den saknas/inte går att läsa."""
+    try:
+        return json.loads(container_client.download_blob(path).readall())
+    except Exception:
+        return None
+
 def load_feeds_config():
     import yaml
     with open("config/feeds.yaml", "r", encoding="utf-8") as f:
@@ -40,9 +51,18 @@ STOPWORDS = {
     "Real","Barcelona","Bayern","Dortmund","PSG","Marseille","Roma","Inter","Milan",
     "Africa","African","Nigeria","Ghana","Senegal","Egypt","Morocco","Algeria","Tunisia","Ivory","Coast",
 }
-def _extract_candidates(text: str):
+def _extract_candidates(text: str, matcher=None):
+    """Spelarnamn i texten. Med matcher (entity_matcher) → masterlistans namn, annars regex-heuristik."""
     if not text: return []
     seen, out = set(), []
+    if matcher is not None:
+        for _start, _end, kind, payload in matcher.find_all(text):
+            if kind == "club":
+                continue
+            name = payload.get("name")
+            if name and name not in seen:
+                seen.add(name); out.append(name)
+        return out
     for m in NAME_RE.finditer(text):
         name = m.group(1).strip()
         parts = name.split()
@@ -53,7 +73,16 @@ def _extract_candidates(text: str):
     return out
 # ---------------------------------------------------------------------------
 
-def parse_items(feed, source_name):
+def load_player_matcher():
+    """Aho-Corasick-matcher över masterlistan; None (→ regex) om den inte kan laddas."""
+    try:
+        from src.common import entity_matcher
+        return entity_matcher.get_player_matcher()
+    except Exception as e:
+        print(f"[collector] WARN: master matcher unavailable, using regex ({e})")
+        return None
+
+def parse_items(feed, source_name, matcher=None):
     items = []
     for e in feed.entries:
         published_iso = None
@@ -69,7 +98,7 @@ def parse_items(feed, source_name):
 
         title = (getattr(e, "title", "") or "").strip()
         summary = (getattr(e, "summary", "") or "")[:1000]
-        players = _extract_candidates(f"{title} {summary}")
+        players = _extract_candidates(f"{title} {summary}", matcher)
 
         items.append({
             "id": getattr(e, "id", None) or str(uuid.uuid4()),
@@ -84,15 +113,74 @@ def parse_items(feed, source_name):
         })
     return items
 
-def collect_one(source, timeout_s, container_client, league, day, prefix=""):
+# ---- Parallell hämtning: begränsning per värd + global deadline ----------
+_HOST_LOCK = threading.Lock()
+_HOST_SEMAPHORES = {}
+
+def _host_semaphore(url: str, per_host: int):
+    host = urlparse(url).netloc.lower()
+    with _HOST_LOCK:
+        sem = _HOST_SEMAPHORES.get(host)
+        if sem is None:
+            sem = threading.BoundedSemaphore(max(1, per_host))
+            _HOST_SEMAPHORES[host] = sem
+    return sem
+
+def _fetch(url, timeout_s, session=None, per_host=None, deadline=None, extra_headers=None):
+    """GET med per-värd-semafor; HTTP-timeouten kapas så att den globala deadlinen hålls."""
+    def _remaining():
+        if deadline is None:
+            return timeout_s
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise requests.exceptions.Timeout("global deadline reached")
+        return min(timeout_s, left)
+
+    getter = session.get if session is not None else requests.get
+    headers = {"User-Agent": "afp-collector/1.0", **(extra_headers or {})}
+    if not per_host:
+        return getter(url, timeout=_remaining(), headers=headers)
+    sem = _host_semaphore(url, per_host)
+    # Köa på värdplatsen ända fram till deadlinen; timeout_s gäller bara själva anropet
+    wait_s = None if deadline is None else max(0.0, deadline - time.monotonic())
+    if not sem.acquire(timeout=wait_s):
+        raise requests.exceptions.Timeout("global deadline reached (waiting for host slot)")
+    try:
+        return getter(url, timeout=_remaining(), headers=headers)
+    finally:
+        sem.release()
+
+# ---- Villkorlig GET: validators (ETag/Last-Modified/hash) per källa ------
+def validators_path(prefix: str, name: str) -> str:
+    return f"{prefix}raw/news/{name}/validators.json"
+
+def conditional_headers(validators, day: str):
+    """
+    If-None-Match/If-Modified-Since från sparade validators.
+    Bara samma dag – items.json är per dag, så första körningen en ny dag hämtar alltid fullt.
+    """
+    if not validators or validators.get("day") != day:
+        return {}
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+def collect_one(source, timeout_s, container_client, league, day, prefix="", matcher=None,
+                session=None, per_host=None, deadline=None):
     name = source["name"]; url = source["url"]
     print(f"[{name}] START {url}")
 
     raw_prefix = f"{prefix}raw/news/{name}/{day}"
     curated_prefix = f"{prefix}curated/news/{name}/{league}/{day}"
 
+    v_path = validators_path(prefix, name)
+    validators = download_json(container_client, v_path)
+
     try:
-        r = requests.get(url, timeout=timeout_s, headers={"User-Agent": "afp-collector/1.0"})
+        r = _fetch(url, timeout_s, session, per_host, deadline, conditional_headers(validators, day))
         r.raise_for_status()
     except requests.exceptions.Timeout:
         upload_json(container_client, f"{raw_prefix}/timeout.json", {
@@ -107,6 +195,15 @@ def collect_one(source, timeout_s, container_client, league, day, prefix=""):
         print(f"[{name}] ERROR {e}")
         return
 
+    if r.status_code == 304:
+        print(f"[{name}] NOT MODIFIED (304) – skip")
+        return
+
+    content_hash = hashlib.sha256(r.content).hexdigest()
+    if validators and validators.get("day") == day and validators.get("content_hash") == content_hash:
+        print(f"[{name}] UNCHANGED (same content hash) – skip")
+        return
+
     feed = feedparser.parse(r.content)
     raw_obj = {
         "source": name, "url": url, "fetched_at": now_iso(),
@@ -116,16 +213,43 @@ def collect_one(source, timeout_s, container_client, league, day, prefix=""):
     }
     upload_json(container_client, f"{raw_prefix}/rss.json", raw_obj)
 
-    items = parse_items(feed, name)
+    items = parse_items(feed, name, matcher)
     curated_items_path = upload_json(container_client, f"{curated_prefix}/items.json", items)
 
     manifest = {
         "source": name, "league": league, "curated_items_path": curated_items_path,
         "count": len(items), "generated_at": now_iso(), "raw_index": f"{raw_prefix}/rss.json",
-        "enrichment": {"players": "regex"}
+        "enrichment": {"players": "master_automaton" if matcher is not None else "regex"}
     }
     upload_json(container_client, f"{curated_prefix}/input_manifest.json", manifest)
+
+    # Validators sparas sist, så en avbruten körning hämtar om fullt nästa gång
+    upload_json(container_client, v_path, {
+        "source": name, "url": url, "day": day,
+        "etag": r.headers.get("ETag"),
+        "last_modified": r.headers.get("Last-Modified"),
+        "content_hash": content_hash,
+        "fetched_at": now_iso(),
+    })
     print(f"[{name}] OK {len(items)} items -> {curated_items_path}")
+    return items
+
+def update_news_store(container_client, prefix, league, day, items_by_source):
+    """Skriv nya (deduplicerade) items som en chunk i dagens news-store och uppdatera indexet."""
+    base = news_store.store_prefix(prefix, league, day)
+    index = download_json(container_client, f"{base}/index.json") or news_store.empty_index(league, day)
+    prev_day = news_store.previous_day(day)
+    prev_index = download_json(container_client, f"{news_store.store_prefix(prefix, league, prev_day)}/index.json")
+
+    ts = now_iso()
+    new_items = news_store.append_items(index, prev_index, items_by_source, ts)
+    if new_items:
+        chunk = news_store.chunk_name(index, ts)
+        container_client.upload_blob(name=f"{base}/{chunk}", data=news_store.to_jsonl(new_items).encode("utf-8"), overwrite=True)
+        index["chunks"].append(chunk)
+    index["updated_at"] = ts
+    upload_json(container_client, f"{base}/index.json", index)
+    print(f"[collector] STORE {len(new_items)} new items ({len(index['items'])} unique today) -> {base}")
 
 def main():
     try:
@@ -137,6 +261,9 @@ def main():
     league = cfg.get("league", "unknown")
     timeout_s = int(cfg.get("timeout_s", 15))
     sources = cfg["sources"]
+    max_workers = int(os.getenv("COLLECT_MAX_WORKERS", cfg.get("max_workers", 8)))
+    per_host = int(cfg.get("per_host_limit", 2))
+    deadline_s = float(os.getenv("COLLECT_DEADLINE_S", cfg.get("deadline_s", 120)))
 
     container_client = get_container_client()
     if container_client is None:
@@ -145,20 +272,61 @@ def main():
 
     prefix = os.getenv("BLOB_PREFIX", "")
     day = today_str()
+    matcher = load_player_matcher()
 
-    print(f"[collector] League={league} | Sources={len(sources)} | Day={day} | Timeout={timeout_s}s | Mode=SAS")
-    for src in sources:
+    print(f"[collector] League={league} | Sources={len(sources)} | Day={day} | Timeout={timeout_s}s | "
+          f"Workers={max_workers} | PerHost={per_host} | Deadline={deadline_s:.0f}s | Mode=SAS")
+
+    def _record_unexpected(src, e):
+        raw_prefix = f"{prefix}raw/news/{src.get('name','unknown')}/{day}"
+        upload_json(container_client, f"{raw_prefix}/error.json", {
+            "source": src.get("name","unknown"),
+            "kind": "unexpected_error",
+            "error": str(e),
+            "ts": now_iso()
+        })
+        print(f"[{src.get('name','unknown')}] UNEXPECTED ERROR: {e}")
+
+    items_by_source = {}
+    items_lock = threading.Lock()
+
+    def _run(src, session=None, deadline=None):
         try:
-            collect_one(src, timeout_s, container_client, league, day, prefix)
+            items = collect_one(src, timeout_s, container_client, league, day, prefix, matcher,
+                                session=session, per_host=per_host, deadline=deadline)
         except Exception as e:
-            raw_prefix = f"{prefix}raw/news/{src.get('name','unknown')}/{day}"
-            upload_json(container_client, f"{raw_prefix}/error.json", {
-                "source": src.get("name","unknown"),
-                "kind": "unexpected_error",
-                "error": str(e),
-                "ts": now_iso()
-            })
-            print(f"[{src.get('name','unknown')}] UNEXPECTED ERROR: {e}")
+            _record_unexpected(src, e)
+            return
+        if items:
+            with items_lock:
+                items_by_source[src["name"]] = items
+
+    if max_workers <= 1:
+        for src in sources:
+            _run(src)
+    else:
+        deadline = time.monotonic() + deadline_s
+        session = make_session(max_workers, "afp-collector/1.0")
+        pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rss")
+        futures = {pool.submit(_run, src, session, deadline): src for src in sources}
+        _done, pending = wait(futures, timeout=deadline_s + timeout_s)
+        for fut in pending:
+            src = futures[fut]
+            if fut.cancel():
+                raw_prefix = f"{prefix}raw/news/{src.get('name','unknown')}/{day}"
+                upload_json(container_client, f"{raw_prefix}/timeout.json", {
+                    "source": src.get("name", "unknown"), "url": src.get("url"), "kind": "deadline",
+                    "deadline_s": deadline_s, "ts": now_iso()
+                })
+            print(f"[{src.get('name','unknown')}] DEADLINE – not finished within {deadline_s:.0f}s")
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    with items_lock:
+        fetched = dict(items_by_source)
+    try:
+        update_news_store(container_client, prefix, league, day, fetched)
+    except Exception as e:
+        print(f"[collector] STORE ERROR: {e}")
     print("[collector] DONE")
 
 if __name__ == "__main__":
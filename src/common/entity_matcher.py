@@ -0,0 +1,148 @@
+# src/common/entity_matcher.py
+"""
+Aho-Corasick-matchning av spelar-/klubbnamn i fri text.
+
+Alla mönster (namn, alias, klubbar) kompileras till en automat som går igenom
+texten en gång, oavsett hur många spelare masterlistan innehåller. Text och
+mönster normaliseras med master_players.normalize_name, så matchning sker på
+hela ord ("Salah" matchar inte "Salahs" eller "Assalah"). Överlappande träffar
+löses upp vänstraste-längsta, så "Mo Salah" räknas som ett omnämnande.
+"""
+
+import threading
+from collections import deque
+
+from src.common import master_players
+
+# Alias kortare än så här (t.ex. "Mo") ger för många falska träffar
+MIN_ALIAS_LEN = 3
+
+_LOCK = threading.Lock()
+_PLAYER_MATCHERS = {}
+
+
+class EntityMatcher:
+    """
+    Multi-pattern-matchare. add() mönster med valfri payload, build() en gång,
+    därefter find_all(text) → [(start, end, kind, payload), ...] i textordning.
+    """
+
+    __slots__ = ("_goto", "_fail", "_out", "_patterns", "_built")
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        self._patterns = []   # [(kind, payload)]
+        self._built = False
+
+    def add(self, pattern: str, kind: str, payload=None):
+        key = master_players.normalize_name(pattern)
+        if not key:
+            return
+        if self._built:
+            raise RuntimeError("EntityMatcher: add() efter build()")
+        node = 0
+        for ch in key:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = nxt
+        self._patterns.append((len(key), kind, payload))
+        self._out[node] = self._out[node] + (len(self._patterns) - 1,)
+
+    def build(self):
+        """Beräkna fail-länkar (BFS) och slå ihop output-mängder."""
+        queue = deque()
+        for nxt in self._goto[0].values():
+            self._fail[nxt] = 0
+            queue.append(nxt)
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                cand = self._goto[f].get(ch, 0)
+                self._fail[nxt] = cand if cand != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+        self._built = True
+        return self
+
+    def find_all(self, text: str):
+        """Ordgränsade träffar i den normaliserade texten, utan överlapp (se _leftmost_longest)."""
+        if not self._built:
+            self.build()
+        norm = master_players.normalize_name(text)
+        n = len(norm)
+        goto, fail, out, patterns = self._goto, self._fail, self._out, self._patterns
+        hits = []
+        node = 0
+        for i, ch in enumerate(norm):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if not out[node]:
+                continue
+            end = i + 1
+            if end < n and norm[end] != " ":
+                continue
+            for idx in out[node]:
+                length, kind, payload = patterns[idx]
+                start = end - length
+                if start > 0 and norm[start - 1] != " ":
+                    continue
+                hits.append((start, end, kind, payload))
+        return _leftmost_longest(hits)
+
+
+def _leftmost_longest(hits):
+    """
+    Lös upp överlapp: vänstraste och därefter längsta spann vinner ("Mo Salah" slår "Salah").
+    Flera payloads på exakt samma spann behålls, men bara en träff per payload (namn före alias).
+    """
+    hits.sort(key=lambda h: (h[0], -h[1], h[2] != "name"))
+    kept, span, seen = [], None, set()
+    for hit in hits:
+        if span is None or hit[0] >= span[1]:
+            span, seen = (hit[0], hit[1]), set()
+        elif (hit[0], hit[1]) != span:
+            continue
+        if id(hit[3]) in seen:
+            continue
+        seen.add(id(hit[3]))
+        kept.append(hit)
+    return kept
+
+
+def build_player_matcher(registry) -> EntityMatcher:
+    """Matcher över spelarnamn, alias och klubbar i ett MasterRegistry."""
+    matcher = EntityMatcher()
+    for p in registry.players:
+        if p.get("name"):
+            matcher.add(p["name"], "name", p)
+        for alias in list(p.get("aliases") or []) + list(p.get("short_aliases") or []):
+            if len(master_players.normalize_name(alias)) >= MIN_ALIAS_LEN:
+                matcher.add(alias, "alias", p)
+    for players in registry.by_club.values():
+        club = players[0].get("club")
+        matcher.add(club, "club", players)
+    return matcher.build()
+
+
+def get_player_matcher(container: str = master_players.CONTAINER) -> EntityMatcher:
+    """Processens delade matcher för masterlistan (byggs vid första anropet)."""
+    matcher = _PLAYER_MATCHERS.get(container)
+    if matcher is None:
+        registry = master_players.get_registry(container)
+        with _LOCK:
+            matcher = _PLAYER_MATCHERS.get(container)
+            if matcher is None:
+                matcher = build_player_matcher(registry)
+                _PLAYER_MATCHERS[container] = matcher
+    return matcher
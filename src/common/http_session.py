@@ -0,0 +1,12 @@
+# src/common/http_session.py
+import requests
+
+
+def make_session(pool_size: int, user_agent: str) -> requests.Session:
+    """Delad requests-session (keep-alive) dimensionerad för worker-poolen."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = user_agent
+    return session
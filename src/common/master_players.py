@@ -0,0 +1,131 @@
+# src/common/master_players.py
+"""
+Delad, memoiserad laddning av players/africa/players_africa_master.json.
+
+Masterfilen parsas en gång per process (per container) och exponeras som ett
+read-only register med färdiga index. Alla moduler i samma process delar samma
+objekt, så sektioner/jobb som bara läser masterlistan ska gå via get_registry()
+istället för att själva anropa get_json och bygga egna dicts.
+
+Verktyg som skriver om masterfilen (merge_*, propose_transfers) läser den fortfarande
+direkt – registret är enbart för läsning.
+"""
+
+import os
+import re
+import threading
+import unicodedata
+from types import MappingProxyType
+
+from src.storage import azure_blob
+
+CONTAINER = os.getenv("AZURE_STORAGE_CONTAINER", "afp")
+MASTER_PATH = "players/africa/players_africa_master.json"
+
+_LOCK = threading.Lock()
+_REGISTRIES = {}
+
+
+def normalize_name(value) -> str:
+    """Gemener, utan accenter och skiljetecken, med enkla mellanslag ("Sadio Mané" → "sadio mane")."""
+    if not value:
+        return ""
+    text = unicodedata.normalize("NFKD", str(value))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^a-z0-9]+", " ", text.lower())
+    return text.strip()
+
+
+def _freeze_index(index: dict):
+    return MappingProxyType({k: tuple(v) for k, v in index.items()})
+
+
+class MasterRegistry:
+    """
+    Read-only vy över masterlistan.
+
+    players      tuple med spelare (read-only mappings, samma ordning som i filen)
+    by_id        {str(id): spelare}
+    by_name      {normaliserat namn: (spelare, ...)}
+    by_alias     {normaliserat alias/short_alias: (spelare, ...)}
+    by_club      {normaliserat klubbnamn: (spelare, ...)}
+    by_position  {pos: (spelare, ...)}
+    """
+
+    __slots__ = ("players", "by_id", "by_name", "by_alias", "by_club", "by_position", "numeric_ids")
+
+    def __init__(self, raw_players):
+        players = tuple(MappingProxyType(dict(p)) for p in raw_players if isinstance(p, dict))
+
+        by_id, by_name, by_alias, by_club, by_position = {}, {}, {}, {}, {}
+        for p in players:
+            pid = p.get("id")
+            if pid is not None:
+                by_id.setdefault(str(pid), p)
+
+            name = normalize_name(p.get("name"))
+            if name:
+                by_name.setdefault(name, []).append(p)
+
+            aliases = {normalize_name(a) for a in (p.get("aliases") or []) + (p.get("short_aliases") or [])}
+            for alias in aliases:
+                if alias:
+                    by_alias.setdefault(alias, []).append(p)
+
+            club = normalize_name(p.get("club"))
+            if club:
+                by_club.setdefault(club, []).append(p)
+
+            pos = p.get("pos")
+            if pos:
+                by_position.setdefault(pos, []).append(p)
+
+        self.players = players
+        self.by_id = MappingProxyType(by_id)
+        self.by_name = _freeze_index(by_name)
+        self.by_alias = _freeze_index(by_alias)
+        self.by_club = _freeze_index(by_club)
+        self.by_position = _freeze_index(by_position)
+        # Endast numeriska ID:n (placeholders som AFR007, NEW005 saknar matchdata)
+        self.numeric_ids = frozenset(k for k in by_id if k.isdigit())
+
+    def __len__(self):
+        return len(self.players)
+
+    def get(self, player_id, default=None):
+        """Slå upp spelare på id (int eller str)."""
+        if player_id is None:
+            return default
+        return self.by_id.get(str(player_id), default)
+
+    def find(self, name: str):
+        """Spelare vars namn eller alias matchar (normaliserat)."""
+        key = normalize_name(name)
+        return self.by_name.get(key) or self.by_alias.get(key) or ()
+
+    def club_players(self, club: str):
+        return self.by_club.get(normalize_name(club), ())
+
+    def position_players(self, pos: str):
+        return self.by_position.get(pos, ())
+
+
+def _extract_players(data):
+    if isinstance(data, dict) and "players" in data:
+        return data["players"] or []
+    if isinstance(data, list):
+        return data
+    return []
+
+
+def get_registry(container: str = CONTAINER, refresh: bool = False) -> MasterRegistry:
+    """Returnera processens delade MasterRegistry (laddas vid första anropet)."""
+    reg = None if refresh else _REGISTRIES.get(container)
+    if reg is not None:
+        return reg
+    with _LOCK:
+        reg = None if refresh else _REGISTRIES.get(container)
+        if reg is None:
+            reg = MasterRegistry(_extract_players(azure_blob.get_json(container, MASTER_PATH)))
+            _REGISTRIES[container] = reg
+    return reg
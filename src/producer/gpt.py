@@ -5,10 +5,20 @@ Clean logging: only our own lines with [gpt] prefix.
 
 import os
 import json
+import time
 import logging
+import tempfile
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
 from typing import Dict, Any, Optional
 from openai import OpenAI
 
+from src.storage import azure_blob
+from src.storage.hash_util import hash_dict
+
 # -------------------------------------------------------
 # Setup clean logger just for this module
 # -------------------------------------------------------
@@ -34,13 +44,16 @@ for noisy in [
 # OpenAI client singleton
 # -------------------------------------------------------
 _client = None
+_client_lock = threading.Lock()
 def _get_client() -> OpenAI:
     global _client
     if _client is None:
-        api_key = os.getenv("AFP_OPENAI_SECRETKEY")
-        if not api_key:
-            raise RuntimeError("Missing environment variable: AFP_OPENAI_SECRETKEY")
-        _client = OpenAI(api_key=api_key)
+        with _client_lock:
+            if _client is None:
+                api_key = os.getenv("AFP_OPENAI_SECRETKEY")
+                if not api_key:
+                    raise RuntimeError("Missing environment variable: AFP_OPENAI_SECRETKEY")
+                _client = OpenAI(api_key=api_key)
     return _client
 
 # -------------------------------------------------------
@@ -70,21 +83,107 @@ def _assemble_messages(prompt_config: Dict[str, Any], ctx: Optional[Any], system
     ]
 
 # -------------------------------------------------------
-# Main entrypoint
+# Response cache (local + blob) och coalescing av identiska anrop
 # -------------------------------------------------------
-def render_gpt(prompt_config: Dict[str, Any], ctx: Optional[Any], system_rules: Optional[str] = None) -> str:
-    client = _get_client()
-    messages = _assemble_messages(prompt_config, ctx, system_rules)
+MODEL = "gpt-4o-mini"
+TEMPERATURE = 0.7
+MAX_TOKENS = 500
 
-    persona = prompt_config.get("persona", "news_anchor")
-    logger.info("Calling GPT with persona=%s", persona)
+CACHE_CONTAINER = os.getenv("AZURE_STORAGE_CONTAINER", "afp")
+CACHE_BLOB_PREFIX = "producer/gpt_cache"
+DEFAULT_CACHE_TTL_S = int(os.getenv("GPT_CACHE_TTL_S", "86400"))
+
+_cache_lock = threading.Lock()
+_memory_cache: Dict[str, Dict[str, Any]] = {}
+_inflight: Dict[str, Future] = {}
+# Sektionens cache_ttl_s (sections_library.yaml), satt av produce_section.run_section
+_section_cache_ttl: ContextVar[Optional[int]] = ContextVar("section_cache_ttl", default=None)
+
+
+@contextmanager
+def section_cache_ttl(ttl_s: Optional[int]):
+    """Cache-TTL för render_gpt-anrop som görs inom blocket (None = GPT_CACHE_TTL_S)."""
+    token = _section_cache_ttl.set(None if ttl_s is None else int(ttl_s))
+    try:
+        yield
+    finally:
+        _section_cache_ttl.reset(token)
+
+
+def _cache_dir() -> str:
+    return os.getenv("GPT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "afp_gpt_cache"))
+
+
+def _cache_key(messages) -> str:
+    return hash_dict({"model": MODEL, "temperature": TEMPERATURE, "max_tokens": MAX_TOKENS, "messages": messages})
+
+
+def _entry_fresh(entry: Optional[Dict[str, Any]], ttl_s: int) -> bool:
+    if not isinstance(entry, dict) or "text" not in entry:
+        return False
+    return time.time() - float(entry.get("created_ts", 0)) <= ttl_s
+
+
+def _cache_get(key: str, ttl_s: int) -> Optional[str]:
+    entry = _memory_cache.get(key)
+    if _entry_fresh(entry, ttl_s):
+        return entry["text"]
 
+    try:
+        with open(os.path.join(_cache_dir(), f"{key}.json"), "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        entry = None
+    if not _entry_fresh(entry, ttl_s):
+        try:
+            entry = azure_blob.get_json(CACHE_CONTAINER, f"{CACHE_BLOB_PREFIX}/{key}.json")
+        except Exception:
+            entry = None
+        if _entry_fresh(entry, ttl_s):
+            _cache_put_local(key, entry)
+
+    if _entry_fresh(entry, ttl_s):
+        _memory_cache[key] = entry
+        return entry["text"]
+    return None
+
+
+def _cache_put_local(key: str, entry: Dict[str, Any]):
+    try:
+        os.makedirs(_cache_dir(), exist_ok=True)
+        tmp = os.path.join(_cache_dir(), f".{key}.{threading.get_ident()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, os.path.join(_cache_dir(), f"{key}.json"))
+    except OSError as e:
+        logger.info("Local cache write failed: %s", e)
+
+
+def _cache_put(key: str, text: str, persona: str):
+    entry = {
+        "text": text,
+        "model": MODEL,
+        "persona": persona,
+        "created_ts": time.time(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    _memory_cache[key] = entry
+    _cache_put_local(key, entry)
+    try:
+        azure_blob.upload_json(CACHE_CONTAINER, f"{CACHE_BLOB_PREFIX}/{key}.json", entry)
+    except Exception as e:
+        logger.info("Blob cache write failed: %s", e)
+
+
+def _call_gpt(messages, persona: str) -> str:
+    client = _get_client()
+    logger.info("Calling GPT with persona=%s", persona)
     try:
         resp = client.chat.completions.create(
-            model="gpt-4o-mini",
+            model=MODEL,
             messages=messages,
-            temperature=0.7,
-            max_tokens=500,
+            temperature=TEMPERATURE,
+            max_tokens=MAX_TOKENS,
         )
         text = resp.choices[0].message.content.strip()
         logger.info("Generated text length=%d chars", len(text))
@@ -93,5 +192,58 @@ def render_gpt(prompt_config: Dict[str, Any], ctx: Optional[Any], system_rules:
         logger.error("GPT call failed: %s", e)
         raise
 
+
+# -------------------------------------------------------
+# Main entrypoint
+# -------------------------------------------------------
+def render_gpt(prompt_config: Dict[str, Any], ctx: Optional[Any], system_rules: Optional[str] = None) -> str:
+    """
+    Rendera text via GPT. Svaret cachas på hash av (modell, parametrar, meddelanden)
+    i minnet, lokalt på disk och i blob. TTL per sektion: prompt_config["cache_ttl_s"], annars
+    sektionens cache_ttl_s i sections_library.yaml (section_cache_ttl), annars GPT_CACHE_TTL_S;
+    0 = ingen cache. Samtidiga identiska anrop slås ihop till ett.
+    """
+    section_ttl = _section_cache_ttl.get()
+    prompt_config = {"cache_ttl_s": DEFAULT_CACHE_TTL_S if section_ttl is None else section_ttl,
+                     **prompt_config}
+    messages = _assemble_messages(prompt_config, ctx, system_rules)
+    persona = prompt_config.get("persona", "news_anchor")
+    ttl_s = int(prompt_config["cache_ttl_s"])
+
+    if ttl_s <= 0:
+        return _call_gpt(messages, persona)
+
+    key = _cache_key(messages)
+    cached = _cache_get(key, ttl_s)
+    if cached is not None:
+        logger.info("Cache hit persona=%s key=%s", persona, key[:12])
+        return cached
+
+    with _cache_lock:
+        entry = _memory_cache.get(key)
+        if _entry_fresh(entry, ttl_s):
+            return entry["text"]
+        fut = _inflight.get(key)
+        owner = fut is None
+        if owner:
+            fut = Future()
+            _inflight[key] = fut
+
+    if not owner:
+        logger.info("Waiting for identical in-flight call persona=%s key=%s", persona, key[:12])
+        return fut.result()
+
+    try:
+        text = _call_gpt(messages, persona)
+        _cache_put(key, text, persona)
+        fut.set_result(text)
+        return text
+    except Exception as e:
+        fut.set_exception(e)
+        raise
+    finally:
+        with _cache_lock:
+            _inflight.pop(key, None)
+
 # Backwards compatibility
 run_gpt = render_gpt
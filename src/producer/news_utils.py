@@ -1,8 +1,10 @@
 import os
 import yaml
 from src.storage import azure_blob
+from src.collectors import news_store
 
 CONTAINER = os.getenv("AZURE_STORAGE_CONTAINER", "afp")
+COLLECTOR_PREFIX = news_store.collector_prefix()
 
 def log(msg: str):
     """Standardiserad loggning"""
@@ -22,15 +24,47 @@ def load_feeds_config():
     log(f"Loaded {len(feeds)} feeds from config: {feeds[:5]}{'...' if len(feeds) > 5 else ''}")
     return feeds
 
+def load_news_stream(day: str, league: str = "premier_league"):
+    """
+    Läs dagens deduplicerade news-store (index + chunks, se collectors/news_store).
+    Returnerar None om storen saknas för dagen.
+    """
+    base = news_store.store_prefix(COLLECTOR_PREFIX, league, day)
+    index_path = f"{base}/index.json"
+    if not azure_blob.exists(CONTAINER, index_path):
+        return None
+    index = azure_blob.get_json(CONTAINER, index_path)
+
+    chunks = []
+    for path, data, err in azure_blob.get_many_bytes(CONTAINER, [f"{base}/{c}" for c in index.get("chunks", [])]):
+        if err is not None:
+            log(f"store: error loading {path} → {err}")
+            continue
+        chunks.append(news_store.from_jsonl(data.decode("utf-8")))
+
+    items = news_store.merge_stream(index, chunks)
+    log(f"store: {len(items)} unique items from {len(chunks)} chunks ({index_path})")
+    return items
+
+
 def load_curated_news(day: str, league: str = "premier_league"):
     """
-    Ladda alla nyhets-items från collector/curated/news/<feed>/<league>/<day>/items.json i Azure.
+    Ladda dagens nyhets-items. Primärt från den deduplicerade news-storen;
+    fallback: alla <COLLECTOR_PREFIX>curated/news/<feed>/<league>/<day>/items.json i Azure.
     Returnerar en sammanslagen lista.
     """
+    try:
+        items = load_news_stream(day, league)
+    except Exception as e:
+        log(f"store: failed to load ({e}) → falling back to per-feed items.json")
+        items = None
+    if items is not None:
+        return items
+
     feeds = load_feeds_config()
     news_items = []
     for feed in feeds:
-        blob_path = f"collector/curated/news/{feed}/{league}/{day}/items.json"  # 🔧 fixad sökväg
+        blob_path = f"{COLLECTOR_PREFIX}curated/news/{feed}/{league}/{day}/items.json"  # 🔧 fixad sökväg
         if azure_blob.exists(CONTAINER, blob_path):
             try:
                 items = azure_blob.get_json(CONTAINER, blob_path)
@@ -1,11 +1,16 @@
 import argparse
+import importlib
 import subprocess
+import time
 import yaml
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from jinja2 import Environment, FileSystemLoader
 import os
 from glob import glob
 
+from src.producer import produce_section, role_utils
+
 
 def run(cmd):
     """Helper för att köra subprocess och logga"""
@@ -19,9 +24,54 @@ def run(cmd):
         print(res.stdout)
 
 
+def run_inprocess(module: str):
+    """Kör ett grundsteg (modulens main()) i samma process istället för som subprocess"""
+    print(f"[produce_auto] ▶️ Kör (in-process): {module}")
+    importlib.import_module(module).main()
+
+
+def _run_one_section(section_argv, library, pods_cfg):
+    section_id = section_argv[section_argv.index("--section") + 1]
+    started = time.monotonic()
+    try:
+        args = produce_section.build_arg_parser().parse_args(section_argv)
+        section_obj = produce_section.run_section(args, library, pods_cfg)
+        status = section_obj.get("status", "success") if isinstance(section_obj, dict) else "success"
+        return {"section": section_id, "status": status, "seconds": round(time.monotonic() - started, 1)}
+    except Exception as e:
+        print(f"[produce_auto] ❌ {section_id}: {e}")
+        return {"section": section_id, "status": "error", "error": str(e),
+                "seconds": round(time.monotonic() - started, 1)}
+
+
+def run_sections_concurrently(section_argvs, max_workers: int):
+    """
+    Kör sektionerna i en trådpool i den här processen. Library, pods och personas
+    laddas en gång; sektionerna väntar mest på GPT och blob-I/O.
+    Returnerar en statuslista (en post per sektion, i inskickad ordning).
+    """
+    library = produce_section.load_library()
+    pods_cfg = role_utils.load_yaml("config/pods.yaml")["pods"]
+    role_utils.load_yaml("config/speaking_roles.yaml")
+
+    # Importera sektionsmodulerna i förväg (seriellt) så att trådarna inte krockar i importen
+    for cfg in library.get("sections", {}).values():
+        if isinstance(cfg, dict) and cfg.get("module"):
+            try:
+                importlib.import_module(f"src.sections.{cfg['module']}")
+            except Exception as e:
+                print(f"[produce_auto] ⚠️ Kunde inte förimportera {cfg['module']}: {e}")
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="section") as pool:
+        return list(pool.map(lambda argv: _run_one_section(argv, library, pods_cfg), section_argvs))
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--all", action="store_true", help="Kör alla sektioner i src/sections/")
+    parser.add_argument("--subprocess", action="store_true", help="Kör varje steg som separat python -m (gamla läget)")
+    parser.add_argument("--max-workers", type=int, default=int(os.getenv("PRODUCE_MAX_WORKERS", "4")),
+                        help="Antal sektioner som körs parallellt (in-process)")
     args = parser.parse_args()
 
     today = datetime.utcnow().strftime("%Y-%m-%d")
@@ -33,9 +83,14 @@ def main():
     print(f"[produce_auto] 🚀 Startar auto-produce för {league} {today} (weekday={weekday})")
 
     # 1. Kör grundstegen
-    run(["src.producer.produce_candidates", "--league", league])
-    run(["src.producer.produce_scoring", "--league", league])
-    run(["src.producer.produce_enrich_articles", "--league", league])
+    if args.subprocess:
+        run(["src.producer.produce_candidates", "--league", league])
+        run(["src.producer.produce_scoring", "--league", league])
+        run(["src.producer.produce_enrich_articles", "--league", league])
+    else:
+        run_inprocess("src.producer.produce_candidates")
+        run_inprocess("src.producer.produce_scoring")
+        run_inprocess("src.producer.produce_enrich_articles")
 
     # 2. Ladda produce_plan.yaml
     plan_path = "src/producer/produce_plan.yaml"
@@ -74,23 +129,38 @@ def main():
     print(f"[produce_auto] 📋 Sektioner som ska köras: {section_ids}")
 
     # 5. Kör sektionerna
+    section_argvs = []
     for section_id in section_ids:
         task = plan.get(section_id)
         if not task and not args.all:
             print(f"[produce_auto] ⚠️ Hoppar över okänd sektion: {section_id}")
             continue
 
-        cmd = [
-            "src.producer.produce_section",
+        section_argvs.append([
             "--section", section_id,
             "--date", today,
             "--league", league,
             "--pod", pod,
             "--path-scope", "blob",
             "--write-latest",
-        ]
-        run(cmd)
+        ])
+
+    if args.subprocess:
+        for argv in section_argvs:
+            run(["src.producer.produce_section"] + argv)
+        print(f"[produce_auto] ✅ Klar")
+        return
+
+    summary = run_sections_concurrently(section_argvs, args.max_workers)
+
+    print("[produce_auto] === Sammanfattning ===")
+    for r in summary:
+        extra = f" – {r['error']}" if r.get("error") else ""
+        print(f"[produce_auto] {r['section']}: {r['status']} ({r['seconds']}s){extra}")
 
+    failed = [r["section"] for r in summary if r["status"] == "error"]
+    if failed:
+        raise RuntimeError(f"Fel i sektioner: {', '.join(failed)}")
     print(f"[produce_auto] ✅ Klar")
 
 
@@ -8,6 +8,7 @@ from email.utils import parsedate_to_datetime
 
 from src.storage import azure_blob
 from src.producer import news_utils
+from src.common import master_players, entity_matcher
 
 CONTAINER = os.getenv("AZURE_STORAGE_CONTAINER", "afp")
 
@@ -19,16 +20,9 @@ def log(msg: str):
 
 def load_master_players():
     """Ladda masterlistan med afrikanska spelare (lista, inte dict)"""
-    blob_path = "players/africa/players_africa_master.json"
-    log(f"Loading master players from blob: {blob_path}")
+    log(f"Loading master players from blob: {master_players.MASTER_PATH}")
 
-    data = azure_blob.get_json(CONTAINER, blob_path)
-    if isinstance(data, dict) and "players" in data:
-        players = data["players"]
-    elif isinstance(data, list):
-        players = data
-    else:
-        players = []
+    players = master_players.get_registry(CONTAINER).players
 
     log(f"Loaded {len(players)} master players")
     if players:
@@ -50,7 +44,33 @@ def normalize_date(value: str):
             return None
 
 
-def candidate_from_news(item, master_players):
+def match_player(text_blob: str, matcher):
+    """
+    Välj den spelare texten främst handlar om.
+    Namn/alias-träffar (direkt omnämnande, 1.0) går före klubbträffar (0.4);
+    vid lika antal träffar vinner den som nämns först. find_all löser upp överlapp,
+    så "Mo Salah" räknas som ett omnämnande och inte två.
+    Returnerar (player, direct_mention, mentioned_ids).
+    """
+    direct, clubs = {}, {}
+    for start, _end, kind, payload in matcher.find_all(text_blob):
+        bucket = clubs if kind == "club" else direct
+        count, first, _ = bucket.get(id(payload), (0, start, payload))
+        bucket[id(payload)] = (count + 1, first, payload)
+
+    mentioned_ids = [p.get("id") for _, _, p in direct.values()]
+
+    def _top(bucket):
+        return min(bucket.values(), key=lambda v: (-v[0], v[1]))[2]
+
+    if direct:
+        return _top(direct), 1.0, mentioned_ids
+    if clubs:
+        return _top(clubs)[0], 0.4, mentioned_ids
+    return None, 0.0, mentioned_ids
+
+
+def candidate_from_news(item, matcher):
     """Bygg en kandidat från en nyhetsitem"""
     title = item.get("title") or ""
     summary = item.get("summary") or item.get("description") or ""
@@ -58,23 +78,9 @@ def candidate_from_news(item, master_players):
     published_iso = normalize_date(item.get("published"))
     url = item.get("link")
 
-    text_blob = f"{title} {summary}".lower()
-
-    player = None
-    direct_mention = 0.0
-
-    for mp in master_players:
-        name = (mp.get("name") or "").lower()
-        club = (mp.get("club") or "").lower()
+    text_blob = f"{title} {summary}"
 
-        if name and name in text_blob:
-            player = mp
-            direct_mention = 1.0
-            break
-        if club and club in text_blob:
-            player = mp
-            direct_mention = 0.4
-            break
+    player, direct_mention, mentioned_ids = match_player(text_blob, matcher)
 
     if not player:
         return None
@@ -88,6 +94,7 @@ def candidate_from_news(item, master_players):
         },
         "player_id": player.get("id"),
         "club_id": player.get("club_id"),
+        "mentioned_player_ids": mentioned_ids,
         "event": {"type": "news"},
         "source": {
             "name": src,
@@ -96,6 +103,7 @@ def candidate_from_news(item, master_players):
         "title": title,
         "summary": summary,
         "published_iso": published_iso,
+        "first_seen": item.get("first_seen"),
         "direct_player_mention": direct_mention,
         "event_importance": 0.0,
         "recency_score": None,
@@ -108,14 +116,15 @@ def main():
     day = datetime.utcnow().strftime("%Y-%m-%d")
     log(f"START day={day} (UTC)")
 
-    master_players = load_master_players()
+    load_master_players()
+    matcher = entity_matcher.get_player_matcher(CONTAINER)
 
     news_items = news_utils.load_curated_news(day)
     log(f"Loaded {len(news_items)} news items (curated)")
 
     candidates = []
     for item in news_items:
-        cand = candidate_from_news(item, master_players)
+        cand = candidate_from_news(item, matcher)
         if cand:
             candidates.append(cand)
 
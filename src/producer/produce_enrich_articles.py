@@ -1,10 +1,17 @@
 # src/producer/produce_enrich_articles.py
 import os
 import json
+import time
+import hashlib
+import argparse
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urldefrag, urlparse
 from datetime import datetime, timezone
 from bs4 import BeautifulSoup
 
+from src.common.http_session import make_session
 from src.storage import azure_blob
 
 CONTAINER = os.getenv("AZURE_STORAGE_CONTAINER", "afp")
@@ -24,32 +31,209 @@ BAD_PATTERNS = [
 ]
 
 
-def fetch_article_text(url: str) -> str:
+# Taggar som aldrig innehåller brödtext
+BOILERPLATE_TAGS = ["script", "style", "noscript", "nav", "header", "footer", "aside", "form", "figure", "iframe"]
+MIN_PARAGRAPH_LEN = 40
+
+
+def _html_parser() -> str:
+    """lxml (C-parser) om den finns installerad, annars html.parser."""
+    try:
+        import lxml  # noqa: F401
+        return "lxml"
+    except ImportError:
+        return "html.parser"
+
+
+HTML_PARSER = _html_parser()
+
+
+def extract_article_text(html: str):
+    """Plocka brödtext ur HTML: ta bort boilerplate-taggar, föredra <article>/<main>, filtrera puffar."""
+    soup = BeautifulSoup(html, HTML_PARSER)
+    for tag in soup(BOILERPLATE_TAGS):
+        tag.decompose()
+
+    root = soup.find("article") or soup.find("main") or soup
+
+    paragraphs = []
+    seen = set()
+    for p in root.find_all("p"):
+        txt = p.get_text(" ", strip=True)
+        if len(txt) < MIN_PARAGRAPH_LEN or txt in seen:
+            continue
+        lower = txt.lower()
+        # Filtrera bort puffar, cookies, reklam
+        if any(bad in lower for bad in BAD_PATTERNS):
+            continue
+        seen.add(txt)
+        paragraphs.append(txt)
+
+    text = " ".join(paragraphs)
+    return text.strip() if text else None
+
+
+# ---- Parallell hämtning: poolad session, rate limit per domän, deadline ----
+PER_DOMAIN_CONCURRENCY = 2
+PER_DOMAIN_MIN_INTERVAL_S = 0.5
+
+class DeadlineExceeded(TimeoutError):
+    """Den globala deadlinen passerades innan URL:en hann hämtas."""
+
+
+_DOMAIN_LOCK = threading.Lock()
+_DOMAIN_STATE = {}   # domän → [semaphore, nästa tillåtna starttid]
+
+
+def _domain_slot(url: str):
+    domain = urlparse(url).netloc.lower()
+    with _DOMAIN_LOCK:
+        state = _DOMAIN_STATE.get(domain)
+        if state is None:
+            state = [threading.BoundedSemaphore(PER_DOMAIN_CONCURRENCY), 0.0]
+            _DOMAIN_STATE[domain] = state
+    return state
+
+
+def fetch_article_text(url: str, session=None, timeout_s: float = 15, deadline=None) -> str:
     """Hämta och rensa artikeltext från URL"""
     try:
-        resp = requests.get(url, timeout=15, headers={"User-Agent": "AFPBot/1.0"})
+        state = _domain_slot(url)
+        sem = state[0]
+
+        def _remaining():
+            if deadline is None:
+                return timeout_s
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise DeadlineExceeded("enrichment deadline reached")
+            return min(timeout_s, left)
+
+        # Köa på domänplatsen ända fram till deadlinen; timeout_s gäller bara själva anropet
+        wait_s = None if deadline is None else max(0.0, deadline - time.monotonic())
+        if not sem.acquire(timeout=wait_s):
+            raise DeadlineExceeded("enrichment deadline reached (waiting for domain slot)")
+        try:
+            with _DOMAIN_LOCK:
+                start_at = max(time.monotonic(), state[1])
+                state[1] = start_at + PER_DOMAIN_MIN_INTERVAL_S
+            delay = start_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            getter = session.get if session is not None else requests.get
+            resp = getter(url, timeout=_remaining(), headers={"User-Agent": "AFPBot/1.0"})
+        finally:
+            sem.release()
         resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "html.parser")
-
-        paragraphs = []
-        for p in soup.find_all("p"):
-            txt = p.get_text(" ", strip=True)
-            if not txt:
-                continue
-            lower = txt.lower()
-            # Filtrera bort puffar, cookies, reklam
-            if any(bad in lower for bad in BAD_PATTERNS):
-                continue
-            paragraphs.append(txt)
-
-        text = " ".join(paragraphs)
-        return text.strip() if text else None
+        return extract_article_text(resp.text)
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         log(f"WARN: failed to fetch {url} ({e})")
         return None
 
 
-def main(top_n: int = 15):
+def fetch_many(urls, max_workers: int = 8, timeout_s: float = 15, deadline_s: float = 60):
+    """
+    Hämta artikeltext för många URL:er parallellt.
+    Returnerar {url: text | None} för försökta URL:er; de som inte hanns med före deadline saknas.
+    """
+    urls = list(dict.fromkeys(u for u in urls if u))
+    if not urls:
+        return {}
+    deadline = time.monotonic() + deadline_s
+    session = make_session(max_workers, "AFPBot/1.0")
+    results = {}
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(urls)), thread_name_prefix="enrich")
+    futures = {pool.submit(fetch_article_text, u, session, timeout_s, deadline): u for u in urls}
+    done, pending = wait(futures, timeout=deadline_s + timeout_s)
+    for fut in done:
+        if fut.exception() is None:
+            results[futures[fut]] = fut.result()
+        else:
+            log(f"WARN: deadline – skipping {futures[fut]}")
+    for fut in pending:
+        log(f"WARN: deadline – skipping {futures[fut]}")
+    pool.shutdown(wait=False, cancel_futures=True)
+    return results
+
+
+# ---- Blob-cache för extraherad artikeltext ------------------------------
+ARTICLE_CACHE_PREFIX = "producer/article_cache"
+ARTICLE_CACHE_TTL_H = float(os.getenv("ARTICLE_CACHE_TTL_H", "168"))
+ARTICLE_CACHE_NEGATIVE_TTL_H = float(os.getenv("ARTICLE_CACHE_NEGATIVE_TTL_H", "6"))
+
+
+def article_cache_path(url: str) -> str:
+    # Nyckel = hela URL:en utan fragment; querysträngen kan peka ut en annan artikel
+    key = hashlib.sha256(urldefrag(url.strip()).url.encode("utf-8")).hexdigest()
+    return f"{ARTICLE_CACHE_PREFIX}/{key[:2]}/{key}.json"
+
+
+def _cache_entry_valid(entry, now: datetime) -> bool:
+    if not isinstance(entry, dict) or not entry.get("fetched_at"):
+        return False
+    try:
+        fetched_at = datetime.fromisoformat(entry["fetched_at"])
+    except ValueError:
+        return False
+    ttl_h = ARTICLE_CACHE_TTL_H if entry.get("ok") else ARTICLE_CACHE_NEGATIVE_TTL_H
+    return (now - fetched_at).total_seconds() <= ttl_h * 3600
+
+
+def load_cached_texts(urls):
+    """
+    Slå upp URL:er i artikelcachen. Returnerar {url: text | None} för giltiga träffar
+    (None = negativt cachad, dvs. hämtningen misslyckades nyligen).
+    """
+    urls = list(dict.fromkeys(u for u in urls if u))
+    now = datetime.now(timezone.utc)
+    hits = {}
+    results = azure_blob.get_many_json(CONTAINER, [article_cache_path(u) for u in urls])
+    for url, (_, entry, err) in zip(urls, results):
+        if err is None and _cache_entry_valid(entry, now):
+            hits[url] = entry.get("text") if entry.get("ok") else None
+    return hits
+
+
+def store_cached_texts(texts: dict):
+    """Skriv hämtade texter (och misslyckanden, som negativ cache) till artikelcachen."""
+    fetched_at = datetime.now(timezone.utc).isoformat()
+    entries = {
+        article_cache_path(url): {"url": url, "ok": bool(text), "text": text, "fetched_at": fetched_at}
+        for url, text in texts.items()
+    }
+    for path, err in azure_blob.upload_many_json(CONTAINER, entries):
+        if err is not None:
+            log(f"WARN: could not write article cache {path} ({err})")
+
+
+def fetch_with_cache(urls, max_workers: int = 8, deadline_s: float = 60):
+    """Som fetch_many, men hämtar bara URL:er som saknas (eller gått ut) i artikelcachen."""
+    urls = list(dict.fromkeys(u for u in urls if u))
+    try:
+        cached = load_cached_texts(urls)
+    except Exception as e:
+        log(f"WARN: article cache unavailable ({e})")
+        cached = {}
+    missing = [u for u in urls if u not in cached]
+    log(f"Article cache: {len(cached)} hits ({sum(1 for t in cached.values() if t is None)} negative), {len(missing)} to fetch")
+
+    # fetch_many utelämnar URL:er som inte hann hämtas – de cachas alltså inte negativt
+    fetched = fetch_many(missing, max_workers=max_workers, deadline_s=deadline_s) if missing else {}
+    if fetched:
+        try:
+            store_cached_texts(fetched)
+        except Exception as e:
+            log(f"WARN: could not update article cache ({e})")
+    return {**cached, **fetched}
+
+
+def main(top_n: int = None, max_workers: int = None, deadline_s: float = None):
+    top_n = top_n or int(os.getenv("ENRICH_TOP_N", "15"))
+    max_workers = max_workers or int(os.getenv("ENRICH_MAX_WORKERS", "8"))
+    deadline_s = deadline_s or float(os.getenv("ENRICH_DEADLINE_S", "90"))
+
     day = today_str()
     in_path = f"producer/scored/{day}/scored.jsonl"
     out_path = f"producer/scored/{day}/scored_enriched.jsonl"
@@ -66,21 +250,30 @@ def main(top_n: int = 15):
     scored = sorted(scored, key=lambda c: c.get("score", 0), reverse=True)
     top_items = scored[:top_n]
 
+    urls = [c.get("source", {}).get("url") for c in top_items]
+    log(f"Fetching {len([u for u in urls if u])} articles (workers={max_workers}, deadline={deadline_s:.0f}s, parser={HTML_PARSER})")
+    texts = fetch_with_cache(urls, max_workers=max_workers, deadline_s=deadline_s)
+
     enriched = []
     for c in top_items:
         url = c.get("source", {}).get("url")
-        if url:
-            article_text = fetch_article_text(url)
-            if article_text:
-                c["article_text"] = article_text
+        article_text = texts.get(url) if url else None
+        if article_text:
+            c["article_text"] = article_text
         enriched.append(c)
 
     text_out = "\n".join(json.dumps(c, ensure_ascii=False) for c in enriched)
     azure_blob.put_text(CONTAINER, out_path, text_out, content_type="application/json; charset=utf-8")
 
-    log(f"Wrote {out_path} with {len(enriched)} items")
+    log(f"Wrote {out_path} with {len(enriched)} items ({sum(1 for c in enriched if c.get('article_text'))} with text)")
     log("DONE")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--league", default="premier_league")
+    parser.add_argument("--top-n", type=int, default=None)
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--deadline-s", type=float, default=None)
+    args, _ = parser.parse_known_args()
+    main(top_n=args.top_n, max_workers=args.max_workers, deadline_s=args.deadline_s)
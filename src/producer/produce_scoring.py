@@ -76,7 +76,12 @@ def main():
                     recency_score = 0.0
 
         c["recency_score"] = recency_score
-        c["novelty_24h"] = 1   # TODO: riktig dedupe/novelty
+        # Novelty: storyn sågs första gången (i news-storen) inom 24h
+        c["novelty_24h"] = 1
+        if c.get("first_seen"):
+            first_seen = parse_datetime(c["first_seen"])
+            if first_seen and (now - first_seen).total_seconds() > 24 * 3600:
+                c["novelty_24h"] = 0
         c["language_match"] = 1.0
         c["source"]["authority"] = SOURCE_AUTHORITY.get(c["source"]["name"], 0.5)
 
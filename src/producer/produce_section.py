@@ -1,12 +1,11 @@
 # src/producer/produce_section.py
 import argparse
 import importlib
-import yaml
 import json
 import sys
 from pathlib import Path
 
-from src.producer import role_utils
+from src.producer import gpt, role_utils
 
 
 def build_section(section_name, args, library):
@@ -30,7 +29,10 @@ def build_section(section_name, args, library):
     return fn(args)
 
 
-def main():
+LIBRARY_PATH = "src/producer/sections_library.yaml"
+
+
+def build_arg_parser():
     parser = argparse.ArgumentParser()
     parser.add_argument("--section", required=True, help="Section name (e.g. NEWS.TOP3)")
     parser.add_argument("--date", required=True, help="Date for the section")
@@ -44,14 +46,22 @@ def main():
     parser.add_argument("--persona-ids")
     parser.add_argument("--dry-run", action="store_true")
     parser.add_argument("--pod", help="Pod key from pods.yaml")
-    args = parser.parse_args()
+    return parser
+
 
-    # Library
-    library_path = "src/producer/sections_library.yaml"
-    with open(library_path, "r", encoding="utf-8") as f:
-        library = yaml.safe_load(f)
+def load_library(path: str = LIBRARY_PATH):
+    return role_utils.load_yaml(path)
 
-    section_obj = build_section(args.section, args, library)
+
+def run_section(args, library, pods_cfg=None):
+    """
+    Bygg en sektion och validera/komplettera dess manifest (role → persona).
+    Sektionens cache_ttl_s (sections_library.yaml) gäller för dess GPT-anrop.
+    Returnerar sektionsobjektet; kastar RuntimeError om sektionen inte gav ett giltigt manifest.
+    """
+    cfg = (library.get("sections") or {}).get(args.section) or {}
+    with gpt.section_cache_ttl(cfg.get("cache_ttl_s")):
+        section_obj = build_section(args.section, args, library)
 
     # Acceptera två typer av manifest
     if isinstance(section_obj, dict):
@@ -63,7 +73,8 @@ def main():
             cfg = library["sections"][args.section]
             role = cfg.get("role")
             if role:
-                pods_cfg = role_utils.load_yaml("config/pods.yaml")["pods"]
+                if pods_cfg is None:
+                    pods_cfg = role_utils.load_yaml("config/pods.yaml")["pods"]
                 if args.pod and args.pod in pods_cfg:
                     persona_id = role_utils.resolve_persona_for_role(pods_cfg[args.pod], role)
                     section_obj.setdefault("meta", {})["persona"] = persona_id
@@ -88,6 +99,13 @@ def main():
         raise RuntimeError(
             f"Section {args.section} did not return a manifest. Got: {type(section_obj)}"
         )
+    return section_obj
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    library = load_library()
+    run_section(args, library)
 
 
 if __name__ == "__main__":
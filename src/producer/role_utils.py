@@ -1,14 +1,23 @@
 # src/producer/role_utils.py
+import copy
+import threading
 import yaml
 from typing import Dict
 
+_yaml_lock = threading.Lock()
+_yaml_cache: Dict[str, Dict] = {}
+
 
 def load_yaml(path: str) -> Dict:
     """
     Load a YAML file and return its content as a dict.
+    The file is parsed once per process; callers get their own copy.
     """
-    with open(path, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
+    with _yaml_lock:
+        if path not in _yaml_cache:
+            with open(path, "r", encoding="utf-8") as f:
+                _yaml_cache[path] = yaml.safe_load(f)
+        return copy.deepcopy(_yaml_cache[path])
 
 
 def get_pod_config(pod_name: str) -> Dict:
@@ -2,22 +2,20 @@
 
 import os
 import json
-from typing import List, Dict, Any
+from datetime import datetime
+from typing import List, Dict, Any, Mapping
 from src.storage import azure_blob
+from src.common import master_players
 
 CONTAINER = os.getenv("AZURE_CONTAINER", "afp")
 
 
-def load_masterlist() -> Dict[int, Dict[str, Any]]:
+def load_masterlist() -> Mapping[str, Mapping[str, Any]]:
     """
-    Laddar masterlistan och returnerar en dict med player_id som nyckel.
+    Returnerar masterlistan som read-only mapping med str(player_id) som nyckel
+    (delas med övriga moduler via src.common.master_players).
     """
-    blob_path = "players/africa/players_africa_master.json"
-    data = azure_blob.get_json(CONTAINER, blob_path)
-    players = {}
-    for p in data.get("players", []):
-        players[p["id"]] = p
-    return players
+    return master_players.get_registry(CONTAINER).by_id
 
 
 def extract_african_events(season: str, league_id: int, round_dates: List[str]) -> List[Dict[str, Any]]:
@@ -26,7 +24,6 @@ def extract_african_events(season: str, league_id: int, round_dates: List[str])
     Returnerar en lista av african_events.
     """
     master = load_masterlist()
-    african_ids = set(master.keys())
     events: List[Dict[str, Any]] = []
 
     for round_date in round_dates:
@@ -50,7 +47,8 @@ def extract_african_events(season: str, league_id: int, round_dates: List[str])
                     if not pl:
                         continue
                     pid = pl.get("id")
-                    if pid in african_ids:
+                    mp = master.get(str(pid))
+                    if mp is not None:
                         events.append({
                             "date": date,
                             "league_id": league_id,
@@ -62,8 +60,8 @@ def extract_african_events(season: str, league_id: int, round_dates: List[str])
                             "player": {
                                 "id": pid,
                                 "name": pl.get("name"),
-                                "country": master[pid]["country"],
-                                "club": master[pid]["club"],
+                                "country": mp.get("country"),
+                                "club": mp.get("club"),
                             },
                             "related_player": player if role == "assist" else assist
                         })
@@ -107,19 +105,23 @@ def save_last_stats(state: Dict[str, str]):
     azure_blob.upload_json(CONTAINER, STATE_PATH, state)
 
 
+def _round_date(name: str):
+    """'20-09-2025' → datetime (för kronologisk sortering); None om det inte är en datum-mapp."""
+    try:
+        return datetime.strptime(name, "%d-%m-%Y")
+    except ValueError:
+        return None
+
+
 def list_available_rounds(season: str, league_id: int) -> List[str]:
     """
     Lista alla datum-mappar som finns i stats/{season}/{league_id}/ i Azure.
     Returnerar sorterad lista [ "20-09-2025", "21-09-2025", ... ]
     """
     prefix = f"stats/{season}/{league_id}/"
-    blobs = azure_blob.list_prefix(CONTAINER, prefix)
-    rounds = set()
-    for b in blobs:
-        parts = b.split("/")
-        if len(parts) >= 4:
-            rounds.add(parts[3])  # stats/<season>/<league_id>/<round_date>/...
-    return sorted(rounds)
+    # Bara katalognivån (delimiter-listning) – matchfilerna under prefixet listas inte
+    rounds = [d for d in azure_blob.list_dirs(CONTAINER, prefix) if _round_date(d) is not None]
+    return sorted(rounds, key=_round_date)
 
 
 def find_next_round(season: str, league_id: int) -> List[str]:
@@ -1,9 +1,7 @@
 import os
-import io
-import pandas as pd
 from src.sections import utils
 from src.producer.gpt import run_gpt
-from src.storage import azure_blob
+from src.warehouse import leaderboards
 
 
 def build_section(args=None, **kwargs):
@@ -15,19 +13,16 @@ def build_section(args=None, **kwargs):
 
     persona_id, persona_block = utils.get_persona_block("expert", pod)
 
-    blob_path = "warehouse/metrics/cards_africa.parquet"
     container = os.getenv("AZURE_STORAGE_CONTAINER", "afp")
 
     # 🧩 Använd gemensam säsongsfunktion
     season = utils.current_season()
     print(f"[stats_discipline] Using season={season}")
+    blob_path = leaderboards.board_path(season)
 
     try:
-        svc = azure_blob._client()
-        container_client = svc.get_container_client(container)
-        blob_client = container_client.get_blob_client(blob_path)
-        data = blob_client.download_blob().readall()
-        df = pd.read_parquet(io.BytesIO(data))
+        # Förberäknad topplista: en liten blob-läsning, redan sorterad
+        top5 = leaderboards.top(season, "bad_boys", 5, container=container)
     except Exception as e:
         text = f"No discipline data available (failed to load {blob_path})."
         print(f"[stats_discipline] Error: {e}")
@@ -45,16 +40,9 @@ def build_section(args=None, **kwargs):
         manifest = {"script": text, "meta": {"persona": persona_id}}
         return utils.write_outputs(section_code, day, league, lang, pod, manifest, "empty", payload)
 
-    print(f"[stats_discipline] Total rows before filter: {len(df)}")
+    print(f"[stats_discipline] Rows for season {season}: {len(top5)}")
 
-    # Filtrera på aktuell säsong (om kolumn finns)
-    if "season" in df.columns:
-        df = df[df["season"] == season]
-        print(f"[stats_discipline] Rows after season filter: {len(df)}")
-    else:
-        print("[stats_discipline] No 'season' column found — using full dataset.")
-
-    if df.empty:
+    if not top5:
         text = f"No discipline data found for season {season}."
         payload = {
             "slug": "stats_discipline",
@@ -70,13 +58,6 @@ def build_section(args=None, **kwargs):
         manifest = {"script": text, "meta": {"persona": persona_id}, "season": season}
         return utils.write_outputs(section_code, day, league, lang, pod, manifest, "empty", payload)
 
-    # Top 5 spelare med flest kort
-    top5 = (
-        df.sort_values("total_cards", ascending=False)
-        .head(5)
-        .to_dict(orient="records")
-    )
-
     summary_text = "\n".join(
         [f"{p['player_name']} ({p['country']}) – {p['total_yellow']} yellow, {p['total_red']} red"
          for p in top5]
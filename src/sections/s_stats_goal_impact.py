@@ -1,7 +1,5 @@
 import os
-import io
-import pandas as pd
-from src.storage import azure_blob
+from src.warehouse import query
 from src.sections import utils
 from src.producer.gpt import run_gpt
 
@@ -15,9 +13,17 @@ def build_section(args=None, **kwargs):
     persona_id, _ = utils.get_persona_block("expert", pod)
 
     container = "afp"
-    blob_path = "warehouse/metrics/goals_assists_africa.parquet"
+    blob_path = query.DATASETS["goals_assists"]
 
-    if not azure_blob.exists(container, blob_path):
+    try:
+        # Top 5 spelare × säsong över alla säsonger (som tidigare); säsongstopplistorna
+        # i leaderboards täcker bara en säsong i taget
+        top = query.table("goals_assists", container).top(5, by=("goal_contributions", "goals")).records()
+    except Exception as e:
+        print(f"[stats_goal_impact] Error loading {blob_path}: {e}")
+        top = None
+
+    if top is None:
         text = "No goal impact data available."
         payload = {
             "slug": "stats_goal_impact",
@@ -33,19 +39,14 @@ def build_section(args=None, **kwargs):
         manifest = {"script": text, "meta": {"persona": persona_id}}
         return utils.write_outputs(section_code, day, league, lang, pod, manifest, "success", payload)
 
-    # ✅ Läs parquet
-    blob_bytes = azure_blob.get_bytes(container, blob_path)
-    df = pd.read_parquet(io.BytesIO(blob_bytes))
-
-    if df.empty:
+    if not top:
         text = "No goal impact data available."
     else:
-        sort_col = "goal_contributions" if "goal_contributions" in df.columns else "goals"
-        top = df.sort_values(sort_col, ascending=False).head(5)
+        sort_col = "goal_contributions" if "goal_contributions" in top[0] else "goals"
 
         # Skapa en enkel summering som GPT får använda som input
         summary_text = "\n".join(
-            [f"{row['player_name']} – {row[sort_col]} {sort_col}" for _, row in top.iterrows()]
+            [f"{row['player_name']} – {row[sort_col]} {sort_col}" for row in top]
         )
 
         instructions = (
@@ -55,7 +56,7 @@ def build_section(args=None, **kwargs):
         )
 
         prompt_config = {"persona": persona_id, "instructions": instructions}
-        gpt_output = run_gpt(prompt_config, {"goal_impact": top.to_dict(orient='records')})
+        gpt_output = run_gpt(prompt_config, {"goal_impact": top})
         text = gpt_output.strip() if gpt_output else "No goal impact commentary available."
 
     payload = {
@@ -1,9 +1,7 @@
 import os
-import io
-import pandas as pd
 from src.sections import utils
 from src.producer.gpt import run_gpt
-from src.storage import azure_blob
+from src.warehouse import leaderboards
 
 
 def build_section(args=None, **kwargs):
@@ -20,15 +18,12 @@ def build_section(args=None, **kwargs):
     print(f"[stats_top_contributors] Using season={season}")
 
     # Blob-sökväg till warehouse
-    blob_path = "warehouse/metrics/goals_assists_africa.parquet"
+    blob_path = leaderboards.board_path(season)
     container = os.getenv("AZURE_STORAGE_CONTAINER", "afp")
 
     try:
-        svc = azure_blob._client()
-        container_client = svc.get_container_client(container)
-        blob_client = container_client.get_blob_client(blob_path)
-        data = blob_client.download_blob().readall()
-        df = pd.read_parquet(io.BytesIO(data))
+        # Förberäknad topplista: en liten blob-läsning, redan sorterad
+        top5 = leaderboards.top(season, "top_contributions", 5, container=container)
     except Exception as e:
         print(f"[stats_top_contributors] Error loading {blob_path}: {e}")
         text = f"No data available for top contributors in season {season}."
@@ -46,37 +41,7 @@ def build_section(args=None, **kwargs):
         manifest = {"script": text, "meta": {"persona": persona_id}, "season": season}
         return utils.write_outputs(section_code, day, league, lang, pod, manifest, "empty", payload)
 
-    print(f"[stats_top_contributors] Total rows before filter: {len(df)}")
-
-    # 🧩 Filtrera på aktuell säsong
-    if "season" in df.columns:
-        df = df[df["season"] == season]
-        print(f"[stats_top_contributors] Rows after season filter: {len(df)}")
-    else:
-        print("[stats_top_contributors] No 'season' column found — using full dataset.")
-
-    if df.empty:
-        text = f"No contributors found for {season}."
-        payload = {
-            "slug": "stats_top_contributors_season",
-            "title": f"Top Contributors – {season}",
-            "text": text,
-            "length_s": 0,
-            "sources": {"warehouse": blob_path},
-            "meta": {"persona": persona_id},
-            "type": "stats",
-            "model": "static",
-            "items": [],
-        }
-        manifest = {"script": text, "meta": {"persona": persona_id}, "season": season}
-        return utils.write_outputs(section_code, day, league, lang, pod, manifest, "empty", payload)
-
-    # Säkerställ kolumn för goal_contributions
-    if "goal_contributions" not in df.columns:
-        df["goal_contributions"] = df.get("total_goals", 0) + df.get("total_assists", 0)
-
-    # Top 5 contributors
-    top5 = df.sort_values("goal_contributions", ascending=False).head(5).to_dict(orient="records")
+    print(f"[stats_top_contributors] Rows for season {season}: {len(top5)}")
 
     if not top5:
         text = f"No contributors found for {season}."
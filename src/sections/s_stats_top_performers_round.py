@@ -1,39 +1,51 @@
 import os
-import io
-import pandas as pd
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from src.sections import utils
 from src.producer import gpt
-from src.storage import azure_blob
+from src.warehouse import query
+
+
+def _to_date(value):
+    """date/datetime/ISO-sträng → date (None om värdet inte går att tolka)."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
 
 
 def detect_latest_round_dates(container: str, league_id: str, season: str) -> list:
     """
-    Identifierar senaste spelomgångens datum baserat på warehouse/match_results_africa.parquet.
+    Identifierar senaste spelomgångens datum baserat på warehouse/match_results_africa.
     Returnerar en lista av datum (ISO-strängar) som tillhör senaste omgången.
     """
     try:
-        blob_path = f"warehouse/match_results_africa/{season}/{league_id}.parquet"
-        blob_bytes = azure_blob.get_bytes(container, blob_path)
-        df = pd.read_parquet(io.BytesIO(blob_bytes))
+        blob_root = f"warehouse/match_results_africa/{season}/{league_id}"
+        table = query.table(blob_root, container).select("date", "round").to_arrow()
 
-        if df.empty or "date" not in df.columns or "round" not in df.columns:
-            print(f"[detect_latest_round] Invalid or empty data in {blob_path}")
+        if table.num_rows == 0 or "date" not in table.column_names or "round" not in table.column_names:
+            print(f"[detect_latest_round] Invalid or empty data in {blob_root}")
             return []
 
-        df["date"] = pd.to_datetime(df["date"], errors="coerce")
         today = datetime.utcnow().date()
 
         # Filtrera endast matcher som spelats (datum ≤ idag)
-        df_past = df[df["date"].dt.date <= today]
+        past = []
+        for row in table.to_pylist():
+            played = _to_date(row["date"])
+            if played is not None and played <= today and row["round"] is not None:
+                past.append((row["round"], played))
 
-        if df_past.empty:
+        if not past:
             print("[detect_latest_round] No past matches found")
             return []
 
         # Hitta senaste omgång (max round eller senast spelade datum)
-        latest_round = df_past["round"].max()
-        latest_dates = sorted(df_past[df_past["round"] == latest_round]["date"].dt.date.unique())
+        latest_round = max(rnd for rnd, _ in past)
+        latest_dates = sorted({played for rnd, played in past if rnd == latest_round})
 
         print(f"[detect_latest_round] Latest round={latest_round}, dates={latest_dates}")
         return [d.isoformat() for d in latest_dates]
@@ -71,12 +83,17 @@ def build_section(args=None, **kwargs):
     # 🧩 Identifiera senaste round_dates automatiskt
     round_dates = detect_latest_round_dates(container, league_id, season)
 
-    blob_path = f"warehouse/metrics/match_performance_africa/{season}/{league_id}.parquet"
+    blob_root = f"warehouse/metrics/match_performance_africa/{season}/{league_id}"
+    blob_path = f"{blob_root}.parquet"
     print(f"[stats_top_performers_round] Loading metrics from: {blob_path}")
 
     try:
-        blob_bytes = azure_blob.get_bytes(container, blob_path)
-        df = pd.read_parquet(io.BytesIO(blob_bytes))
+        # 🔍 Senaste omgången (round_dates) + top 5 på score/rating i en fråga
+        q = query.table(blob_root, container)
+        if round_dates:
+            q = q.where("date", "date in", round_dates)
+        top5 = q.top(5, by=("score", "rating")).records()
+        print(f"[stats_top_performers_round] {len(top5)} records for round_dates={round_dates}")
     except Exception as e:
         print(f"[stats_top_performers_round] Error loading {blob_path}: {e}")
         text = f"No performance data available for the latest round ({season})."
@@ -94,7 +111,7 @@ def build_section(args=None, **kwargs):
         manifest = {"script": text, "meta": {"persona": persona_id}, "season": season}
         return utils.write_outputs(section_code, day, league, lang, pod, manifest, "empty", payload)
 
-    if df.empty:
+    if not top5:
         text = f"No performance data available for the current round ({season})."
         payload = {
             "slug": "stats_top_performers_round",
@@ -110,20 +127,12 @@ def build_section(args=None, **kwargs):
         manifest = {"script": text, "meta": {"persona": persona_id}, "season": season}
         return utils.write_outputs(section_code, day, league, lang, pod, manifest, "empty", payload)
 
-    # 🔍 Filtrera på senaste omgång (round_dates)
-    if round_dates and "date" in df.columns:
-        df["date"] = pd.to_datetime(df["date"], errors="coerce")
-        df = df[df["date"].dt.date.astype(str).isin(round_dates)]
-        print(f"[stats_top_performers_round] Filtered to {len(df)} records for round_dates={round_dates}")
-
-    # Sortera efter score/rating och ta top 5
-    sort_col = "score" if "score" in df.columns else "rating"
-    df_sorted = df.sort_values(by=sort_col, ascending=False).head(5)
+    sort_col = "score" if "score" in top5[0] else "rating"
 
     # Bygg sammanfattning för GPT
     top_players = [
         f"{row['player_name']} ({row['team']}) score {row[sort_col]}"
-        for _, row in df_sorted.iterrows()
+        for row in top5
     ]
     summary = "; ".join(top_players)
 
@@ -150,7 +159,7 @@ from the latest round in the {league} ({season}). Use the following stats:
         "meta": {"persona": persona_id},
         "type": "stats",
         "model": "gpt",
-        "items": df_sorted.to_dict(orient="records"),
+        "items": top5,
     }
 
     manifest = {
@@ -1,8 +1,65 @@
 import os
+import threading
 from datetime import datetime
 
+from src.storage import blob_cache
+
+# Processgemensamma klienter: en BlobServiceClient (med sin HTTP-session/keep-alive)
+# och en ContainerClient per container. Skapas lat och återanvänds av alla anrop.
+_LOCK = threading.Lock()
+_SERVICE_CLIENT = None
+_CONTAINER_CLIENTS = {}
+_ENSURED_CONTAINERS = set()
+
 
 def _client():
+    """
+    Returnerar processens delade BlobServiceClient (skapas vid första anropet).
+    Trådsäker; credentials löses bara upp en gång per process.
+    """
+    global _SERVICE_CLIENT
+    if _SERVICE_CLIENT is None:
+        with _LOCK:
+            if _SERVICE_CLIENT is None:
+                _SERVICE_CLIENT = _build_client()
+    return _SERVICE_CLIENT
+
+
+def _container_client(container: str):
+    """Cachad ContainerClient per container (delar pipeline med _client())."""
+    cc = _CONTAINER_CLIENTS.get(container)
+    if cc is None:
+        svc = _client()
+        with _LOCK:
+            cc = _CONTAINER_CLIENTS.get(container)
+            if cc is None:
+                cc = svc.get_container_client(container)
+                _CONTAINER_CLIENTS[container] = cc
+    return cc
+
+
+def _ensure_container(container: str):
+    """Skapa containern om den saknas – kontrolleras bara en gång per process."""
+    if container in _ENSURED_CONTAINERS:
+        return
+    try:
+        _container_client(container).create_container()
+    except Exception:
+        pass
+    with _LOCK:
+        _ENSURED_CONTAINERS.add(container)
+
+
+def reset_clients():
+    """Släpp cachade klienter (t.ex. efter byte av credentials i env)."""
+    global _SERVICE_CLIENT
+    with _LOCK:
+        _SERVICE_CLIENT = None
+        _CONTAINER_CLIENTS.clear()
+        _ENSURED_CONTAINERS.clear()
+
+
+def _build_client():
     """
     Creates a BlobServiceClient using the best available credential, in order:
     0) Connection String via AZURE_STORAGE_CONNECTION_STRING (supports SAS)
@@ -66,14 +123,26 @@ def _client():
 
 
 def put_bytes(container: str, blob_path: str, data: bytes, content_type: str = "application/octet-stream"):
-    svc = _client()
-    container_client = svc.get_container_client(container)
-    try:
-        container_client.create_container()
-    except Exception:
-        pass
+    _ensure_container(container)
+    container_client = _container_client(container)
     blob = container_client.get_blob_client(blob_path)
-    blob.upload_blob(data, overwrite=True, content_type=content_type)
+    result = blob.upload_blob(data, overwrite=True, content_type=content_type)
+    # Vi vet redan innehållet → lägg det i läscachen under den nya etagen
+    etag = result.get("etag") if isinstance(result, dict) else None
+    if etag:
+        blob_cache.store(container, blob_path, etag, data)
+    else:
+        blob_cache.invalidate(container, blob_path)
+    return f"{container}/{blob_path}"
+
+
+def put_file(container: str, blob_path: str, fileobj, content_type: str = "application/octet-stream"):
+    """Ladda upp från en filström (läses från aktuell position, SDK:n delar upp i block)."""
+    _ensure_container(container)
+    container_client = _container_client(container)
+    blob = container_client.get_blob_client(blob_path)
+    blob.upload_blob(fileobj, overwrite=True, content_type=content_type)
+    blob_cache.invalidate(container, blob_path)  # innehållet finns inte i minnet att cacha
     return f"{container}/{blob_path}"
 
 
@@ -82,10 +151,7 @@ def put_text(container: str, blob_path: str, text: str, content_type: str = "tex
 
 
 def get_text(container: str, blob_path: str) -> str:
-    svc = _client()
-    container_client = svc.get_container_client(container)
-    blob = container_client.get_blob_client(blob_path)
-    return blob.download_blob().readall().decode("utf-8")
+    return get_bytes(container, blob_path).decode("utf-8")
 
 
 def get_json(container: str, blob_path: str):
@@ -94,19 +160,86 @@ def get_json(container: str, blob_path: str):
     return json.loads(text)
 
 
+def is_not_found(exc: Exception) -> bool:
+    """True om exc betyder att bloben inte finns (404) – inte ett tillfälligt fel som ska kastas vidare."""
+    if isinstance(exc, FileNotFoundError):
+        return True
+    try:
+        from azure.core.exceptions import ResourceNotFoundError
+    except ImportError:
+        return getattr(exc, "status_code", None) == 404
+    return isinstance(exc, ResourceNotFoundError) or getattr(exc, "status_code", None) == 404
+
+
 def exists(container: str, blob_path: str) -> bool:
-    svc = _client()
-    container_client = svc.get_container_client(container)
+    container_client = _container_client(container)
     blob = container_client.get_blob_client(blob_path)
     return blob.exists()
 
 
 def list_prefix(container: str, prefix: str):
-    svc = _client()
-    container_client = svc.get_container_client(container)
+    container_client = _container_client(container)
     return [b.name for b in container_client.list_blobs(name_starts_with=prefix)]
 
 
+# ---------- Hierarkisk (delimiter-baserad) listning, strömmande ----------
+
+LIST_PAGE_SIZE = 1000
+
+
+def iter_prefix(container: str, prefix: str, page_size: int = LIST_PAGE_SIZE):
+    """Som list_prefix men som generator – sidor hämtas lat, en i taget."""
+    container_client = _container_client(container)
+    for page in container_client.list_blobs(name_starts_with=prefix, results_per_page=page_size).by_page():
+        for b in page:
+            yield b.name
+
+
+def _walk(container: str, prefix: str, page_size: int = LIST_PAGE_SIZE):
+    """En nivå under prefix (delimiter '/'): yield (namn, är_katalog, etag)."""
+    from azure.storage.blob import BlobPrefix
+
+    container_client = _container_client(container)
+    if prefix and not prefix.endswith("/"):
+        prefix += "/"
+    for page in container_client.walk_blobs(name_starts_with=prefix, delimiter="/", results_per_page=page_size).by_page():
+        for item in page:
+            is_dir = isinstance(item, BlobPrefix)
+            yield item.name, is_dir, None if is_dir else item.etag
+
+
+def list_dirs(container: str, prefix: str):
+    """Namnen (utan avslutande '/') på 'underkataloger' direkt under prefix."""
+    base = prefix if prefix.endswith("/") else prefix + "/"
+    return [name[len(base):].rstrip("/") for name, is_dir, _ in _walk(container, base) if is_dir]
+
+
+def iter_files(container: str, prefix: str, with_etag: bool = False):
+    """Blobbar direkt under prefix (inte i underkataloger). Yield namn eller (namn, etag)."""
+    for name, is_dir, etag in _walk(container, prefix):
+        if not is_dir:
+            yield (name, etag) if with_etag else name
+
+
+def iter_stats_files(container: str, season: str = None, league: str = None, with_etag: bool = False):
+    """
+    Filer direkt under stats/<season>/<league>/ (matchfiler, manifest.json, matches.json),
+    utan att gå ned i datum-/players-mappar. Utan season/league listas katalognivåerna först,
+    så kostnaden växer med antalet säsonger/ligor – inte med all historik.
+    """
+    seasons = [season] if season else list_dirs(container, "stats/")
+    for s in seasons:
+        leagues = [league] if league else list_dirs(container, f"stats/{s}/")
+        for lg in leagues:
+            yield from iter_files(container, f"stats/{s}/{lg}/", with_etag=with_etag)
+
+
+def list_etags(container: str, prefix: str) -> dict:
+    """{blob_name: etag} för alla blobbar under prefix (för ändringsdetektering utan nedladdning)."""
+    container_client = _container_client(container)
+    return {b.name: b.etag for b in container_client.list_blobs(name_starts_with=prefix)}
+
+
 def utc_now_iso() -> str:
     return datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
 
@@ -118,8 +251,105 @@ def upload_json(container: str, blob_path: str, obj, content_type: str = "applic
 
 
 def get_bytes(container: str, blob_path: str) -> bytes:
-    """Hämta ett blob-innehåll som bytes (utan decode)."""
-    svc = _client()
-    container_client = svc.get_container_client(container)
+    """
+    Hämta ett blob-innehåll som bytes (utan decode).
+    Går via den lokala cachen (src.storage.blob_cache): finns en cachad kopia skickas en
+    villkorlig GET (If-None-Match) och innehållet laddas bara ned om etagen ändrats.
+    """
+    container_client = _container_client(container)
     blob = container_client.get_blob_client(blob_path)
-    return blob.download_blob().readall()
+
+    cached = blob_cache.lookup(container, blob_path)
+    if cached is not None:
+        from azure.core import MatchConditions
+        from azure.core.exceptions import ResourceNotModifiedError
+
+        etag, data = cached
+        try:
+            downloader = blob.download_blob(etag=etag, match_condition=MatchConditions.IfModified)
+        except ResourceNotModifiedError:
+            blob_cache.touch(container, blob_path)
+            return data
+    else:
+        downloader = blob.download_blob()
+
+    data = downloader.readall()
+    blob_cache.store(container, blob_path, downloader.properties.etag, data)
+    return data
+
+
+def get_range(container: str, blob_path: str, offset: int, length: int) -> bytes:
+    """Hämta bytes [offset, offset + length) ur en blob (ranged GET, går inte via cachen)."""
+    blob = _container_client(container).get_blob_client(blob_path)
+    return blob.download_blob(offset=offset, length=length).readall()
+
+
+# ---------- Batch-operationer (parallella, begränsad worker-pool) ----------
+
+def _max_workers(max_workers=None) -> int:
+    if max_workers:
+        return max(1, int(max_workers))
+    return max(1, int(os.getenv("AZURE_BLOB_MAX_WORKERS", "8")))
+
+
+def run_many(fn, args_list, max_workers=None):
+    """
+    Kör fn(*args) för varje post i args_list i bloboperationernas trådpool
+    (AZURE_BLOB_MAX_WORKERS, delad klient).
+    Returnerar [(result, error)] i samma ordning som args_list; error är None vid lyckat anrop.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def _safe(args):
+        try:
+            return fn(*args), None
+        except Exception as e:
+            return None, e
+
+    if not args_list:
+        return []
+    _client()  # skapa den delade klienten innan trådarna startar
+    workers = min(_max_workers(max_workers), len(args_list))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_safe, args_list))
+
+
+def get_many_bytes(container: str, blob_paths, max_workers=None):
+    """
+    Hämta många blobbar parallellt.
+    Returnerar lista [(blob_path, data | None, error | None)] i samma ordning som blob_paths.
+    """
+    paths = list(blob_paths)
+    results = run_many(get_bytes, [(container, p) for p in paths], max_workers)
+    return [(p, data, err) for p, (data, err) in zip(paths, results)]
+
+
+def get_many_json(container: str, blob_paths, max_workers=None):
+    """
+    Hämta och parsa många JSON-blobbar parallellt.
+    Returnerar lista [(blob_path, obj | None, error | None)] i samma ordning som blob_paths.
+    """
+    paths = list(blob_paths)
+    results = run_many(get_json, [(container, p) for p in paths], max_workers)
+    return [(p, obj, err) for p, (obj, err) in zip(paths, results)]
+
+
+def put_many(container: str, items: dict, content_type: str = "application/octet-stream", max_workers=None):
+    """
+    Ladda upp många blobbar parallellt. items = {blob_path: bytes}.
+    Returnerar lista [(blob_path, error | None)] i samma ordning som items.
+    """
+    _ensure_container(container)
+    paths = list(items.keys())
+    results = run_many(put_bytes, [(container, p, items[p], content_type) for p in paths], max_workers)
+    return [(p, err) for p, (_, err) in zip(paths, results)]
+
+
+def upload_many_json(container: str, objs: dict, max_workers=None):
+    """Som put_many men för {blob_path: obj} som serialiseras likt upload_json."""
+    import json
+    items = {
+        p: json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+        for p, obj in objs.items()
+    }
+    return put_many(container, items, "application/json; charset=utf-8", max_workers)
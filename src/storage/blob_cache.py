@@ -0,0 +1,157 @@
+"""
+Lokal read-through-cache för blob-läsningar (används av src.storage.azure_blob).
+
+Layout under cache-katalogen:
+  objects/<sha256>   innehållet, content-addressed (samma bytes lagras en gång)
+  refs/<sha256(container/path)>.json   {"container", "path", "etag", "sha256", "size"}
+
+Färskhet kontrolleras alltid mot Azure med en villkorlig GET (If-None-Match på etag),
+så cachen sparar bara överföringen av själva innehållet – aldrig korrektheten.
+Eviction sker LRU (mtime på objektfilerna) när storleken passerar budgeten.
+
+Env:
+  AFP_BLOB_CACHE=0            stäng av cachen
+  AFP_BLOB_CACHE_DIR          katalog (default: /tmp/afp_blob_cache)
+  AFP_BLOB_CACHE_MAX_MB       storleksbudget i MB (default: 512)
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+
+_LOCK = threading.Lock()
+_approx_size = None
+
+
+def enabled() -> bool:
+    return os.getenv("AFP_BLOB_CACHE", "1") not in ("0", "false", "False", "")
+
+
+def _root() -> str:
+    return os.getenv("AFP_BLOB_CACHE_DIR", os.path.join(tempfile.gettempdir(), "afp_blob_cache"))
+
+
+def _max_bytes() -> int:
+    return int(float(os.getenv("AFP_BLOB_CACHE_MAX_MB", "512")) * 1024 * 1024)
+
+
+def _ref_path(container: str, blob_path: str) -> str:
+    key = hashlib.sha256(f"{container}/{blob_path}".encode("utf-8")).hexdigest()
+    return os.path.join(_root(), "refs", f"{key}.json")
+
+
+def _object_path(digest: str) -> str:
+    return os.path.join(_root(), "objects", digest)
+
+
+def _atomic_write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except Exception:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def lookup(container: str, blob_path: str):
+    """Returnerar (etag, data) för en cachad blob, annars None."""
+    if not enabled():
+        return None
+    try:
+        with open(_ref_path(container, blob_path), "r", encoding="utf-8") as f:
+            ref = json.load(f)
+        obj = _object_path(ref["sha256"])
+        with open(obj, "rb") as f:
+            data = f.read()
+    except (OSError, ValueError, KeyError):
+        return None
+    if hashlib.sha256(data).hexdigest() != ref["sha256"]:
+        invalidate(container, blob_path)
+        return None
+    return ref.get("etag"), data
+
+
+def touch(container: str, blob_path: str):
+    """Markera en cachad blob som nyligen använd (för LRU)."""
+    if not enabled():
+        return
+    try:
+        with open(_ref_path(container, blob_path), "r", encoding="utf-8") as f:
+            ref = json.load(f)
+        os.utime(_object_path(ref["sha256"]))
+    except (OSError, ValueError, KeyError):
+        pass
+
+
+def store(container: str, blob_path: str, etag, data: bytes):
+    """Spara innehåll + etag för en blob. Fel sväljs – cachen får aldrig fälla ett jobb."""
+    global _approx_size
+    if not enabled() or not etag or len(data) > _max_bytes():
+        return
+    try:
+        digest = hashlib.sha256(data).hexdigest()
+        obj = _object_path(digest)
+        if os.path.exists(obj):
+            os.utime(obj)
+        else:
+            _atomic_write(obj, data)
+            with _LOCK:
+                if _approx_size is not None:
+                    _approx_size += len(data)
+        ref = {"container": container, "path": blob_path, "etag": etag, "sha256": digest, "size": len(data)}
+        _atomic_write(_ref_path(container, blob_path), json.dumps(ref).encode("utf-8"))
+        _maybe_evict()
+    except Exception:
+        pass
+
+
+def invalidate(container: str, blob_path: str):
+    try:
+        os.unlink(_ref_path(container, blob_path))
+    except OSError:
+        pass
+
+
+def _scan_objects():
+    objects_dir = os.path.join(_root(), "objects")
+    entries = []
+    try:
+        with os.scandir(objects_dir) as it:
+            for e in it:
+                if e.is_file() and not e.name.startswith(".tmp-"):
+                    st = e.stat()
+                    entries.append((st.st_mtime, st.st_size, e.path))
+    except OSError:
+        pass
+    return entries
+
+
+def _maybe_evict():
+    """LRU-eviction ned till 80 % av budgeten. Refs till borttagna objekt blir cache-missar."""
+    global _approx_size
+    budget = _max_bytes()
+    with _LOCK:
+        if _approx_size is None:
+            _approx_size = sum(size for _, size, _ in _scan_objects())
+        if _approx_size <= budget:
+            return
+        entries = sorted(_scan_objects())
+        total = sum(size for _, size, _ in entries)
+        target = int(budget * 0.8)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+            except OSError:
+                pass
+        _approx_size = total
@@ -0,0 +1,324 @@
+# src/storage/parquet_dataset.py
+"""
+Partitionerade parquet-dataset i blob storage.
+
+Layout (Hive-stil, partitionskolumnerna finns även kvar i filerna):
+  <root>/season=<s>/league_id=<l>/part-0000.parquet
+  <root>/_dataset.json   manifest: partitionering, kolumner och per fil
+                         {"partition": {...}, "rows", "bytes", "row_groups"}
+
+Skrivning (write_dataset): en fil per partition, begränsad row group-storlek,
+kolumnstatistik (min/max per row group) och dictionary-kodning för id-/namnkolumner.
+write_partitions skriver om enskilda partitioner (delta-läget) och behåller resten.
+Manifestet skrivs sist, så läsare ser aldrig en halvskriven uppsättning filer;
+filer som inte står i manifestet ignoreras.
+
+Läsning (read_dataset): filter på partitionskolumner väljer filer via manifestet
+(ingen listning), filter på övriga kolumner väljer row groups via statistiken,
+och bara efterfrågade kolumner läses. Stora filer läses med ranged GETs (footer +
+valda kolumn-chunks) istället för att hela filen laddas ned.
+
+Saknas manifestet faller read_dataset tillbaka på den gamla enfilsvarianten
+<root>.parquet (filtreras i pandas), så läsare kan flyttas före skrivarna.
+"""
+
+import io
+import os
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from src.storage import azure_blob
+
+MANIFEST_NAME = "_dataset.json"
+
+ROW_GROUP_SIZE = int(os.getenv("PARQUET_ROW_GROUP_SIZE", "50000"))
+# Filer mindre än så här hämtas hela (via blob-cachen) – ranged reads lönar sig inte
+RANGED_READ_MIN_BYTES = int(os.getenv("PARQUET_RANGED_READ_MIN_MB", "8")) * 1024 * 1024
+
+# Strängkolumner som dictionary-kodas (utöver *_id och *_name)
+DICTIONARY_COLUMNS = {"season", "country", "club", "team", "event_type", "status"}
+
+
+def _root(root: str) -> str:
+    return root if root.endswith("/") else root + "/"
+
+
+def _partition_value(value) -> str:
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return "null"
+    return str(value)
+
+
+def dictionary_columns(names):
+    """Kolumner som ska dictionary-kodas: id:n, namn och andra lågkardinala strängar."""
+    return [
+        c for c in names
+        if c.endswith("_id") or c.endswith("_name") or c in DICTIONARY_COLUMNS
+    ]
+
+
+def to_parquet_bytes(df: pd.DataFrame, row_group_size: int = None) -> bytes:
+    """DataFrame → parquet-bytes med statistik, dictionary-kodning och begränsade row groups."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    buf = io.BytesIO()
+    pq.write_table(
+        table,
+        buf,
+        row_group_size=row_group_size or ROW_GROUP_SIZE,
+        write_statistics=True,
+        use_dictionary=dictionary_columns(df.columns) or False,
+        compression="zstd",
+    )
+    return buf.getvalue()
+
+
+def _write_files(container: str, root: str, df: pd.DataFrame, partition_by, sort_by, row_group_size) -> dict:
+    """En fil per partition i df (put_many). Returnerar manifestets files-poster för dem."""
+    if sort_by:
+        df = df.sort_values(list(sort_by), kind="stable")
+
+    if partition_by:
+        groups = df.groupby(partition_by, sort=True, dropna=False)
+    else:
+        groups = [((), df)]
+
+    files, uploads = {}, {}
+    for key, part in groups:
+        key = key if isinstance(key, tuple) else (key,)
+        partition = {col: _partition_value(v) for col, v in zip(partition_by, key)}
+        rel = "".join(f"{col}={val}/" for col, val in partition.items()) + "part-0000.parquet"
+        data = to_parquet_bytes(part, row_group_size)
+        rg_size = row_group_size or ROW_GROUP_SIZE
+        uploads[root + rel] = data
+        files[rel] = {
+            "partition": partition,
+            "rows": int(len(part)),
+            "bytes": len(data),
+            "row_groups": max(1, -(-len(part) // rg_size)),
+        }
+
+    errors = [(p, e) for p, e in azure_blob.put_many(container, uploads) if e is not None]
+    if errors:
+        raise RuntimeError(f"[parquet_dataset] {len(errors)} av {len(uploads)} filer kunde inte skrivas "
+                           f"under {root}: {errors[0][1]}")
+    return files
+
+
+def _write_manifest(container: str, root: str, partition_by, columns, files: dict) -> dict:
+    manifest = {
+        "partition_by": partition_by,
+        "columns": [str(c) for c in columns],
+        "files": files,
+        "written_at": datetime.now(timezone.utc).isoformat(),
+    }
+    azure_blob.upload_json(container, root + MANIFEST_NAME, manifest)
+    return manifest
+
+
+def write_dataset(container: str, root: str, df: pd.DataFrame, partition_by=(), sort_by=None,
+                  row_group_size: int = None) -> dict:
+    """
+    Skriv df som partitionerat dataset under root. sort_by sorterar raderna inom varje fil
+    (ger snäva min/max per row group för t.ex. player_id). Returnerar manifestet.
+    """
+    root = _root(root)
+    partition_by = list(partition_by or [])
+    files = _write_files(container, root, df, partition_by, sort_by, row_group_size)
+    return _write_manifest(container, root, partition_by, df.columns, files)
+
+
+def write_partitions(container: str, root: str, df: pd.DataFrame, partition_by=(), sort_by=None,
+                     row_group_size: int = None) -> dict:
+    """
+    Skriv om bara partitionerna som förekommer i df; övriga filer i manifestet behålls.
+    df ska innehålla hela innehållet för sina partitioner. En skrivare åt gången per dataset.
+    """
+    root = _root(root)
+    partition_by = list(partition_by or [])
+    existing = load_manifest(container, root) or {}
+    if existing and existing.get("partition_by") != partition_by:
+        raise ValueError(f"[parquet_dataset] {root} är partitionerat på {existing.get('partition_by')}, "
+                         f"inte {partition_by}")
+
+    files = dict(existing.get("files", {}))
+    files.update(_write_files(container, root, df, partition_by, sort_by, row_group_size))
+    columns = list(dict.fromkeys(list(existing.get("columns", [])) + [str(c) for c in df.columns]))
+    return _write_manifest(container, root, partition_by, columns, files)
+
+
+def load_manifest(container: str, root: str):
+    try:
+        return azure_blob.get_json(container, _root(root) + MANIFEST_NAME)
+    except Exception:
+        return None
+
+
+class BlobRangeReader(io.RawIOBase):
+    """Seekbar, read-only fil över en blob där varje read() blir en ranged GET."""
+
+    def __init__(self, container: str, blob_path: str, size: int):
+        super().__init__()
+        self.container = container
+        self.blob_path = blob_path
+        self.size = size
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.pos = offset
+        elif whence == io.SEEK_CUR:
+            self.pos += offset
+        else:
+            self.pos = self.size + offset
+        return self.pos
+
+    def readinto(self, b):
+        length = min(len(b), self.size - self.pos)
+        if length <= 0:
+            return 0
+        data = azure_blob.get_range(self.container, self.blob_path, self.pos, length)
+        n = len(data)
+        b[:n] = data
+        self.pos += n
+        return n
+
+
+def _as_values(value):
+    return set(value) if isinstance(value, (list, tuple, set, frozenset)) else {value}
+
+
+def _partition_matches(partition: dict, filters: dict) -> bool:
+    for col, value in filters.items():
+        if col in partition and partition[col] not in {_partition_value(v) for v in _as_values(value)}:
+            return False
+    return True
+
+
+def _row_group_matches(rg_meta, col_index: dict, filters: dict) -> bool:
+    """False bara om statistiken visar att ingen rad i row groupen kan matcha."""
+    for col, value in filters.items():
+        idx = col_index.get(col)
+        if idx is None:
+            continue
+        stats = rg_meta.column(idx).statistics
+        if stats is None or not stats.has_min_max:
+            continue
+        lo, hi = stats.min, stats.max
+        try:
+            if not any(lo <= v <= hi for v in _as_values(value)):
+                return False
+        except TypeError:
+            continue  # olika typer (t.ex. str mot int) – kan inte avgöra, läs row groupen
+    return True
+
+
+def _read_file(container: str, path: str, size: int, columns, filters: dict):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if size >= RANGED_READ_MIN_BYTES:
+        source = BlobRangeReader(container, path, size)
+    else:
+        source = pa.BufferReader(azure_blob.get_bytes(container, path))
+    pf = pq.ParquetFile(source)
+
+    names = pf.schema_arrow.names
+    col_index = {name: i for i, name in enumerate(pf.metadata.schema.names)}
+    row_groups = [
+        i for i in range(pf.metadata.num_row_groups)
+        if _row_group_matches(pf.metadata.row_group(i), col_index, filters)
+    ]
+    read_cols = None
+    if columns is not None:
+        read_cols = [c for c in dict.fromkeys(list(columns) + list(filters)) if c in names]
+    if not row_groups:
+        table = pf.schema_arrow.empty_table()
+        return table.select(read_cols) if read_cols is not None else table
+    return pf.read_row_groups(row_groups, columns=read_cols)
+
+
+def value_set(values, type_):
+    """Filtervärden som Arrow-array av kolumnens typ; värden som inte går att konvertera kan inte matcha."""
+    import pyarrow as pa
+
+    values = list(values)
+    try:
+        return pa.array(values).cast(type_)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+        kept = []
+        for v in values:
+            try:
+                kept.append(pa.array([v]).cast(type_)[0].as_py())
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+                continue
+        return pa.array(kept, type=type_)
+
+
+def filter_table(table, filters: dict):
+    """Likhet/IN-filter {kolumn: värde | [värden]} på en Arrow-tabell (typade jämförelser)."""
+    import pyarrow.compute as pc
+
+    for col, value in filters.items():
+        if col not in table.column_names:
+            continue
+        column = table.column(col)
+        table = table.filter(pc.is_in(column, value_set=value_set(_as_values(value), column.type)))
+    return table
+
+
+def read_table(container: str, root: str, filters: dict = None, columns=None):
+    """
+    Läs ett dataset som Arrow-tabell med filter-pushdown. filters = {kolumn: värde | [värden]}
+    (likhet/IN), columns = projektion. Kastar om varken dataset eller gammal enfilsvariant finns.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    filters = dict(filters or {})
+    root = _root(root)
+    manifest = load_manifest(container, root)
+
+    if manifest is None:
+        legacy = root.rstrip("/") + ".parquet"
+        tables = [pq.read_table(pa.BufferReader(azure_blob.get_bytes(container, legacy)))]
+    else:
+        selected = [
+            (root + rel, info["bytes"])
+            for rel, info in manifest.get("files", {}).items()
+            if _partition_matches(info.get("partition", {}), filters)
+        ]
+        results = azure_blob.run_many(
+            _read_file, [(container, path, size, columns, filters) for path, size in selected]
+        )
+        tables = []
+        for (path, _), (table, err) in zip(selected, results):
+            if err is not None:
+                raise RuntimeError(f"[parquet_dataset] Kunde inte läsa {path}: {err}")
+            tables.append(table)
+
+    if not tables:
+        cols = list(columns) if columns is not None else manifest.get("columns", [])
+        return pa.table({c: pa.array([]) for c in cols})
+    table = tables[0] if len(tables) == 1 else pa.concat_tables(tables, promote_options="permissive")
+    table = filter_table(table, filters)
+    if columns is not None:
+        table = table.select([c for c in columns if c in table.column_names])
+    return table
+
+
+def read_dataset(container: str, root: str, filters: dict = None, columns=None) -> pd.DataFrame:
+    """Som read_table men returnerar en pandas DataFrame."""
+    return read_table(container, root, filters, columns).to_pandas()
@@ -2,27 +2,27 @@ import os
 import json
 from collections import defaultdict
 from src.storage import azure_blob
+from src.common import master_players
 
 CONTAINER = os.getenv("AZURE_STORAGE_CONTAINER", "afp")
 
 def generate_club_index():
-    master_path = "players/africa/players_africa_master.json"
-    master = azure_blob.get_json(CONTAINER, master_path)
+    registry = master_players.get_registry(CONTAINER)
 
-    if not master or "players" not in master:
-        raise RuntimeError(f"[generate_club_index] Missing or invalid master file at {master_path}")
+    if not registry.players:
+        raise RuntimeError(f"[generate_club_index] Missing or invalid master file at {master_players.MASTER_PATH}")
 
     club_index = defaultdict(list)
 
-    for p in master["players"]:
-        club = p.get("club", "").strip()
+    for p in registry.players:
+        club = (p.get("club") or "").strip()
         if not club:
             continue
         club_index[club].append({
             "id": p.get("id"),
             "name": p["name"],
-            "short_aliases": p.get("short_aliases", []),
-            "aliases": p.get("aliases", []),
+            "short_aliases": list(p.get("short_aliases") or []),
+            "aliases": list(p.get("aliases") or []),
             "country": p.get("country")
         })
 
@@ -41,8 +41,8 @@ def scan_missing_players():
     results = {}
 
     # Hitta alla manifest
-    blob_list = azure_blob.list_prefix(CONTAINER, "stats/")
-    manifests = [b for b in blob_list if b.endswith("manifest.json")]
+    # Manifest ligger direkt under stats/<season>/<league>/ – lista hierarkiskt istället för hela stats/
+    manifests = [b for b in azure_blob.iter_stats_files(CONTAINER) if b.endswith("manifest.json")]
 
     for mpath in manifests:
         parts = mpath.split("/")
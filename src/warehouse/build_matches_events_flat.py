@@ -1,147 +1,384 @@
-import os
-import json
-import pandas as pd
-from collections import defaultdict
-from src.storage import azure_blob
-
-
-def load_json_from_blob(container: str, path: str):
-    text = azure_blob.get_text(container, path)
-    return json.loads(text)
-
+"""
+matches_flat + events_flat från stats/<season>/<league>/*.json.
+
+Gemensam builder för base- och live-läget (live/build_matches_events_flat.py är
+en tunn wrapper med mode="live"):
+
+  base  SEASON och LEAGUE krävs. Inkrementell: en vattenstämpel (blob → etag,
+        match_id) avgör vilka match-filer som är nya/ändrade; befintliga rader
+        kopieras över batchvis och bara ändrade matcher flattas om.
+        FULL_REBUILD=1 tvingar full build. Skriver warehouse/base/...
+  live  SEASON/LEAGUE valfria (filter). Full build per säsong/liga.
+        Skriver warehouse/live/...
+
+Flattningen strömmar: match-JSON hämtas i batchar och skrivs direkt till Arrow
+record batches med fast schema (typade id-kolumner), som parquet-skrivaren tar
+row group för row group. Match-JSON och Arrow-rader hålls bara en batch i taget,
+och parquet-filerna skrivs till temporära filer (i minnet upp till
+FLAT_SPOOL_MAX_MB, sedan på disk) som laddas upp som filströmmar. Minnet är
+begränsat av batchstorleken, inte av hur många matcher en säsong har.
+"""
 
-def main():
-    container = "afp"
-    matches_prefix = "stats/"
-
-    # ✅ Require filters
-    filter_season = os.environ.get("SEASON")
-    filter_league = os.environ.get("LEAGUE")
-
-    if not filter_season or not filter_league:
-        raise RuntimeError(
-            "❌ Must set SEASON and LEAGUE environment variables "
-            "(example: SEASON=2024-2025 LEAGUE=premier_league)"
+import os
+import tempfile
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from src.storage import azure_blob, parquet_dataset
+
+FETCH_BATCH_SIZE = 200
+ROWS_PER_BATCH = 20000
+# Utdatafil hålls i minnet upp till så här mycket, därefter spills den till disk
+SPOOL_MAX_BYTES = int(float(os.getenv("FLAT_SPOOL_MAX_MB", "16")) * 1024 * 1024)
+
+# Vattenstämpel: vilka match-filer (blob-namn → etag, match_id) som redan finns i parquet-filerna
+MANIFEST_PREFIX = "warehouse/_state/events_flat"
+
+OUTPUT_ROOTS = {
+    "base": ("warehouse/base/matches_flat", "warehouse/base/events_flat"),
+    "live": ("warehouse/live/matches_flat", "warehouse/live/events_flat"),
+}
+
+MATCH_SCHEMA = pa.schema([
+    ("match_id", pa.int64()),
+    ("date", pa.string()),
+    ("time", pa.string()),
+    ("league_id", pa.string()),
+    ("season", pa.string()),
+    ("home_team_id", pa.int64()),
+    ("home_team_name", pa.string()),
+    ("away_team_id", pa.int64()),
+    ("away_team_name", pa.string()),
+    ("status", pa.string()),
+    ("winner", pa.string()),
+    ("home_goals", pa.int32()),
+    ("away_goals", pa.int32()),
+    ("has_extra_time", pa.bool_()),
+    ("has_penalties", pa.bool_()),
+])
+
+EVENT_SCHEMA = pa.schema([
+    ("match_id", pa.int64()),
+    ("league_id", pa.string()),
+    ("season", pa.string()),
+    ("event_type", pa.string()),
+    ("event_minute", pa.int32()),
+    ("team", pa.string()),
+    ("player_id", pa.int64()),
+    ("player_name", pa.string()),
+    ("assist_id", pa.int64()),
+    ("assist_name", pa.string()),
+    ("player_in_id", pa.int64()),
+    ("player_in_name", pa.string()),
+    ("player_out_id", pa.int64()),
+    ("player_out_name", pa.string()),
+])
+
+
+def _int(value):
+    """Id/antal → int (123, 123.0, "123"); annat → None."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else None
+    text = str(value).strip()
+    return int(text) if text.isdigit() else None
+
+
+def _minute(value):
+    """event_minute → int ("45+2" → 47)."""
+    if value is None or isinstance(value, (int, float)):
+        return _int(value)
+    base, _, extra = str(value).partition("+")
+    base, extra = _int(base), _int(extra) or 0
+    return None if base is None else base + extra
+
+
+def _str(value):
+    return None if value is None else str(value)
+
+
+def _bool(value):
+    return None if value is None else bool(value)
+
+
+def iter_match_json(container: str, paths: list, batch_size: int = FETCH_BATCH_SIZE):
+    """Hämta match-JSON parallellt i batchar. Yield (path, match, error) i samma ordning som paths."""
+    for start in range(0, len(paths), batch_size):
+        yield from azure_blob.get_many_json(container, paths[start:start + batch_size])
+
+
+def is_match_file(path: str) -> bool:
+    """Bara match-filer (inte players, manifest eller batch-filen matches.json)"""
+    return (
+        path.endswith(".json")
+        and "/players/" not in path
+        and not path.endswith("manifest.json")
+        and not path.endswith("matches.json")
+        and len(path.split("/")) >= 4
+    )
+
+
+class BatchBuilder:
+    """Kolumnvisa buffertar för ett fast schema; batch() töms till en RecordBatch."""
+
+    def __init__(self, schema: pa.Schema):
+        self.schema = schema
+        self.columns = [[] for _ in schema.names]
+        self.rows = 0
+
+    def append(self, values):
+        for col, value in zip(self.columns, values):
+            col.append(value)
+        self.rows += 1
+
+    def batch(self) -> pa.RecordBatch:
+        arrays = [pa.array(col, type=field.type) for col, field in zip(self.columns, self.schema)]
+        self.columns = [[] for _ in self.schema.names]
+        self.rows = 0
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+
+def flatten_match(match: dict, season: str, league_id: str, matches: BatchBuilder, events: BatchBuilder):
+    """En match-JSON → en rad i matches och en rad per event i events. Returnerar match_id."""
+    match_id = _int(match.get("id"))
+    teams = match.get("teams") or {}
+    home = teams.get("home") or {}
+    away = teams.get("away") or {}
+    goals = match.get("goals") or {}
+
+    matches.append((
+        match_id,
+        _str(match.get("date")),
+        _str(match.get("time")),
+        league_id,
+        season,
+        _int(home.get("id")),
+        _str(home.get("name")),
+        _int(away.get("id")),
+        _str(away.get("name")),
+        _str(match.get("status")),
+        _str(match.get("winner")),
+        _int(goals.get("home_ft_goals")),
+        _int(goals.get("away_ft_goals")),
+        _bool(match.get("has_extra_time")),
+        _bool(match.get("has_penalties")),
+    ))
+
+    for ev in match.get("events") or []:
+        player = ev.get("player") or {}
+        assist = ev.get("assist_player") or {}
+        pin = ev.get("player_in") or {}
+        pout = ev.get("player_out") or {}
+        events.append((
+            match_id,
+            league_id,
+            season,
+            _str(ev.get("event_type")),
+            _minute(ev.get("event_minute")),
+            _str(ev.get("team")),
+            _int(player.get("id")),
+            _str(player.get("name")),
+            _int(assist.get("id")),
+            _str(assist.get("name")),
+            _int(pin.get("id")),
+            _str(pin.get("name")),
+            _int(pout.get("id")),
+            _str(pout.get("name")),
+        ))
+    return match_id
+
+
+class ParquetSink:
+    """
+    Parquet-fil som skrivs batch för batch (statistik + dictionary-kodning av id/namn)
+    till en temporär fil som spills till disk över SPOOL_MAX_BYTES.
+    """
+
+    def __init__(self, schema: pa.Schema):
+        self.file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        self.rows = 0
+        self.writer = pq.ParquetWriter(
+            self.file,
+            schema,
+            compression="zstd",
+            write_statistics=True,
+            use_dictionary=parquet_dataset.dictionary_columns(schema.names) or False,
         )
 
-    print(f"[build_matches_events_flat] Starting → season={filter_season}, league={filter_league}")
+    def write(self, batch: pa.RecordBatch):
+        if batch.num_rows:
+            self.writer.write_batch(batch)
+            self.rows += batch.num_rows
+
+    def close(self):
+        """Avsluta parquet-filen och returnera filströmmen spolad till början (för put_file)."""
+        self.writer.close()
+        self.file.seek(0)
+        return self.file
+
+    def discard(self):
+        self.file.close()
+
+
+def load_manifest(container: str, season: str, league: str) -> dict:
+    try:
+        return azure_blob.get_json(container, f"{MANIFEST_PREFIX}/{season}/{league}.json")
+    except Exception:
+        return {}
+
+
+def open_existing(container: str, path: str, schema: pa.Schema):
+    """Befintlig parquet som ParquetFile, eller None om den saknas/har ett annat schema."""
+    try:
+        pf = pq.ParquetFile(pa.BufferReader(azure_blob.get_bytes(container, path)))
+    except Exception:
+        return None
+    if not pf.schema_arrow.remove_metadata().equals(schema):
+        print(f"[build_matches_events_flat] ℹ️ {path} har äldre schema – byggs om helt")
+        return None
+    return pf
+
+
+def copy_existing(pf, sink: ParquetSink, drop_match_ids: set):
+    """Kopiera befintliga rader batchvis, utom de för matcher som ersätts eller tagits bort."""
+    drop = pa.array(sorted(drop_match_ids), type=pa.int64())
+    for batch in pf.iter_batches(batch_size=ROWS_PER_BATCH):
+        if len(drop):
+            batch = batch.filter(pc.invert(pc.is_in(batch.column("match_id"), value_set=drop)))
+        sink.write(batch)
+
+
+def build_group(container: str, season: str, league: str, listing: dict, mode: str = "base",
+                full_rebuild: bool = False, tag: str = "build_matches_events_flat"):
+    """Bygg matches_flat/events_flat för en säsong/liga. listing = {blob: etag} för dess match-filer."""
+    root_matches, root_events = OUTPUT_ROOTS[mode]
+    path_matches = f"{root_matches}/{season}/{league}.parquet"
+    path_events = f"{root_events}/{season}/{league}.parquet"
+
+    incremental = mode == "base" and not full_rebuild
+    manifest = load_manifest(container, season, league) if incremental else {}
+    existing_matches = open_existing(container, path_matches, MATCH_SCHEMA) if manifest else None
+    existing_events = open_existing(container, path_events, EVENT_SCHEMA) if manifest else None
+    if existing_matches is None or existing_events is None:
+        manifest, existing_matches, existing_events = {}, None, None
+
+    changed = sorted(f for f, etag in listing.items() if manifest.get(f, {}).get("etag") != etag)
+    removed = [f for f in manifest if f not in listing]
+
+    print(f"[{tag}] {season}/{league}: mode={'incremental' if manifest else 'full'}, "
+          f"{len(listing)} match files, {len(changed)} new/changed, {len(removed)} removed")
+
+    if not changed and not removed:
+        print(f"[{tag}] ✅ Nothing new – parquet is up to date")
+        return
 
-    all_files = azure_blob.list_prefix(container, matches_prefix)
+    # Matcher vars gamla rader ska tas bort; ändrade filer läggs till först när de hämtats om
+    drop_match_ids = {_int(manifest[f].get("match_id")) for f in removed}
+    for f in removed:
+        manifest.pop(f, None)
 
-    # Filtrera fram bara match-filer (inte players eller manifest)
-    match_files = [
-        f for f in all_files
-        if f.endswith(".json")
-        and "/players/" not in f
-        and not f.endswith("manifest.json")
-    ]
+    sink_matches, sink_events = ParquetSink(MATCH_SCHEMA), ParquetSink(EVENT_SCHEMA)
+    matches, events = BatchBuilder(MATCH_SCHEMA), BatchBuilder(EVENT_SCHEMA)
 
-    match_files = [f for f in match_files if f.split("/")[1] == filter_season]
-    match_files = [f for f in match_files if f.split("/")[2] == filter_league]
+    # 1) Nya/ändrade matcher strömmas in
+    total = len(changed)
+    for i, (path, match, err) in enumerate(iter_match_json(container, changed), start=1):
+        if err is not None:
+            # Gamla rader och manifestposten behålls – filen försöks igen nästa körning
+            print(f"[{tag}] ⚠️ Skipping {path}: {err} ({i}/{total})")
+            continue
 
-    total = len(match_files)
-    if total == 0:
-        print("[build_matches_events_flat] ⚠️ No match files found with given filters")
+        if i % 100 == 0 or i == total:
+            print(f"[{tag}] Processing {i}/{total} → {path}")
+
+        if path in manifest:
+            drop_match_ids.add(_int(manifest.pop(path).get("match_id")))
+        if not isinstance(match, dict):
+            continue  # t.ex. batch-filer – inte en enskild match
+
+        match_id = flatten_match(match, season, league, matches, events)
+        drop_match_ids.add(match_id)
+        manifest[path] = {"etag": listing[path], "match_id": match_id}
+
+        if events.rows >= ROWS_PER_BATCH:
+            sink_events.write(events.batch())
+        if matches.rows >= ROWS_PER_BATCH:
+            sink_matches.write(matches.batch())
+
+    new_matches = sink_matches.rows + matches.rows
+    sink_matches.write(matches.batch())
+    sink_events.write(events.batch())
+
+    # 2) Befintliga rader för oförändrade matcher
+    drop_match_ids.discard(None)
+    if existing_matches is not None:
+        copy_existing(existing_matches, sink_matches, drop_match_ids)
+        copy_existing(existing_events, sink_events, drop_match_ids)
+
+    # --- Skriv parquet för säsong/liga (strömmas från de temporära filerna) ---
+    uploads = [(path_matches, sink_matches), (path_events, sink_events)]
+    try:
+        results = azure_blob.run_many(azure_blob.put_file, [(container, p, sink.close()) for p, sink in uploads])
+    finally:
+        for _, sink in uploads:
+            sink.discard()
+    errors = [(p, err) for (p, _), (_, err) in zip(uploads, results) if err is not None]
+    if errors:
+        raise RuntimeError(f"[{tag}] ❌ Upload failed for {errors[0][0]}: {errors[0][1]}")
+
+    # Manifestet skrivs sist – avbryts körningen innan dess görs allt om nästa gång
+    if mode == "base":
+        azure_blob.upload_json(container, f"{MANIFEST_PREFIX}/{season}/{league}.json", manifest)
+
+    print(f"[{tag}] ✅ Uploaded {sink_matches.rows} matches, {sink_events.rows} events "
+          f"(+{new_matches} matches this run) → {season}/{league}")
+
+
+def group_match_files(container: str, season: str = None, league: str = None) -> dict:
+    """En hierarkisk listning → {(season, league): {blob: etag}} för alla match-filer som matchar filtren."""
+    groups = {}
+    for path, etag in azure_blob.iter_stats_files(container, season, league, with_etag=True):
+        if is_match_file(path):
+            _, s, lg = path.split("/")[:3]
+            groups.setdefault((s, lg), {})[path] = etag
+    return groups
+
+
+def build(container: str, season: str = None, league: str = None, mode: str = "base",
+          full_rebuild: bool = False):
+    """Lista match-filer hierarkiskt och bygg varje säsong/liga som matchar filtren."""
+    tag = "build_matches_events_flat" if mode == "base" else "build_matches_events_flat:live"
+
+    groups = group_match_files(container, season, league)
+    if not groups:
+        print(f"[{tag}] ⚠️ No match files found with given filters")
         return
 
-    print(f"[build_matches_events_flat] Found {total} match files to process")
+    for (s, lg), listing in sorted(groups.items()):
+        build_group(container, s, lg, listing, mode=mode, full_rebuild=full_rebuild, tag=tag)
 
-    # Samla rader per (season, league_id)
-    matches_by_group = defaultdict(list)
-    events_by_group = defaultdict(list)
-
-    for i, path in enumerate(match_files, start=1):
-        parts = path.split("/")
-        if len(parts) < 4:
-            continue
 
-        season = parts[1]
-        league_id = parts[2]
-
-        try:
-            match = load_json_from_blob(container, path)
-        except Exception as e:
-            if i % 100 == 0 or i == total:
-                print(f"[build_matches_events_flat] ⚠️ Skipping {path}: {e} ({i}/{total})")
-            continue
+def main(mode: str = "base"):
+    container = "afp"
 
-        if i % 100 == 0 or i == total:
-            print(f"[build_matches_events_flat] Processing {i}/{total} → {path}")
-
-        # --- Matchnivå ---
-        matches_by_group[(season, league_id)].append({
-            "match_id": match.get("id"),
-            "date": match.get("date"),
-            "time": match.get("time"),
-            "league_id": league_id,
-            "season": season,
-            "home_team_id": (match.get("teams", {}).get("home") or {}).get("id"),
-            "home_team_name": (match.get("teams", {}).get("home") or {}).get("name"),
-            "away_team_id": (match.get("teams", {}).get("away") or {}).get("id"),
-            "away_team_name": (match.get("teams", {}).get("away") or {}).get("name"),
-            "status": match.get("status"),
-            "winner": match.get("winner"),
-            "home_goals": (match.get("goals") or {}).get("home_ft_goals"),
-            "away_goals": (match.get("goals") or {}).get("away_ft_goals"),
-            "has_extra_time": match.get("has_extra_time"),
-            "has_penalties": match.get("has_penalties"),
-        })
-
-        # --- Eventnivå ---
-        for ev in match.get("events", []):
-            row = {
-                "match_id": match.get("id"),
-                "league_id": league_id,
-                "season": season,
-                "event_type": ev.get("event_type"),
-                "event_minute": ev.get("event_minute"),
-                "team": ev.get("team"),
-            }
-
-            player = ev.get("player") or {}
-            row["player_id"] = player.get("id")
-            row["player_name"] = player.get("name")
-
-            assist = ev.get("assist_player") or {}
-            row["assist_id"] = assist.get("id")
-            row["assist_name"] = assist.get("name")
-
-            pin = ev.get("player_in") or {}
-            row["player_in_id"] = pin.get("id")
-            row["player_in_name"] = pin.get("name")
-
-            pout = ev.get("player_out") or {}
-            row["player_out_id"] = pout.get("id")
-            row["player_out_name"] = pout.get("name")
-
-            events_by_group[(season, league_id)].append(row)
-
-    # --- Skriv en parquet per grupp ---
-    for (season, league_id), rows in matches_by_group.items():
-        df_matches = pd.DataFrame(rows)
-        df_events = pd.DataFrame(events_by_group[(season, league_id)])
-
-        path_matches = f"warehouse/base/matches_flat/{season}/{league_id}.parquet"
-        path_events = f"warehouse/base/events_flat/{season}/{league_id}.parquet"
-
-        parquet_matches = df_matches.to_parquet(index=False, engine="pyarrow")
-        parquet_events = df_events.to_parquet(index=False, engine="pyarrow")
-
-        azure_blob.put_bytes(
-            container=container,
-            blob_path=path_matches,
-            data=parquet_matches,
-            content_type="application/octet-stream"
-        )
+    filter_season = os.environ.get("SEASON")
+    filter_league = os.environ.get("LEAGUE") or os.environ.get("LEAGUE_ID")
+    full_rebuild = os.environ.get("FULL_REBUILD", "").lower() in ("1", "true", "yes")
 
-        azure_blob.put_bytes(
-            container=container,
-            blob_path=path_events,
-            data=parquet_events,
-            content_type="application/octet-stream"
+    # ✅ Base kräver filter; live bygger alla säsonger/ligor som matchar (valfria) filter
+    if mode == "base" and (not filter_season or not filter_league):
+        raise RuntimeError(
+            "❌ Must set SEASON and LEAGUE environment variables "
+            "(example: SEASON=2024-2025 LEAGUE=premier_league)"
         )
 
-        print(f"[build_matches_events_flat] ✅ Uploaded {len(df_matches)} matches, {len(df_events)} events → {season}/{league_id}")
+    print(f"[build_matches_events_flat] Starting → mode={mode}, season={filter_season}, league={filter_league}")
+    build(container, filter_season, filter_league, mode=mode, full_rebuild=full_rebuild)
 
 
 if __name__ == "__main__":
@@ -1,8 +1,9 @@
 import json
 import pandas as pd
 from io import BytesIO
-from src.storage import azure_blob
-from src.warehouse import utils_ids  # 🔑 använd utils istället för lokal normalize_id
+from src.storage import azure_blob, parquet_dataset
+from src.common import master_players
+from src.warehouse import utils_ids  # 🔑 kanoniska Int64-id:n
 
 
 def load_json_from_blob(container: str, path: str):
@@ -12,36 +13,110 @@ def load_json_from_blob(container: str, path: str):
 
 def load_parquet_from_blob(container: str, path: str) -> pd.DataFrame:
     """Ladda parquet från Azure Blob till Pandas."""
-    blob_bytes = (
-        azure_blob._client()
-        .get_container_client(container)
-        .get_blob_client(path)
-        .download_blob()
-        .readall()
-    )
+    blob_bytes = azure_blob.get_bytes(container, path)
     return pd.read_parquet(BytesIO(blob_bytes), engine="pyarrow")
 
 
+OUTPUT_ROOT = "warehouse/base/player_match_stats/"
+
+KEYS = ["player_id", "match_id", "league_id", "season"]
+
+# event_type → stat för huvudspelaren (player_id)
+EVENT_STATS = {
+    "goal": "goals",
+    "penalty_goal": "penalty_goals",
+    "assist": "assists",
+    "yellow_card": "yellow_cards",
+    "red_card": "red_cards",
+}
+COUNT_COLS = ["goals", "penalty_goals", "assists", "yellow_cards", "red_cards", "subs_in", "subs_out"]
+
+# Ordinarie matchlängd; matchens slut = max(90, sista eventminut)
+FULL_MATCH_MINUTES = 90
+
+
+def parse_minutes(col: pd.Series) -> pd.Series:
+    """event_minute → float ('45+2' → 47, saknas → NaN)."""
+    if pd.api.types.is_numeric_dtype(col):
+        return pd.to_numeric(col, errors="coerce").astype(float)  # events_flat skrivs redan som int
+    parts = col.astype(str).str.extract(r"^\s*(\d+)(?:\s*\+\s*(\d+))?")
+    return pd.to_numeric(parts[0], errors="coerce") + pd.to_numeric(parts[1], errors="coerce").fillna(0)
+
+
+def _roles(df: pd.DataFrame, mask: pd.Series, id_col: str, stat, minutes: pd.Series) -> pd.DataFrame:
+    mask = mask & df[id_col].notna()
+    return pd.DataFrame({
+        "player_id": df.loc[mask, id_col],
+        "match_id": df.loc[mask, "match_id"],
+        "league_id": df.loc[mask, "league_id"],
+        "season": df.loc[mask, "season"],
+        "stat": stat[mask] if isinstance(stat, pd.Series) else stat,
+        "minute": minutes[mask],
+    })
+
+
+def event_roles(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    events_flat → långt format med en rad per (spelare, roll i eventet):
+    målskytt/kort via player_id, assist via assist_id, byten via player_in_id/player_out_id.
+    Assists dedupliceras per (spelare, match, minut) eftersom de kan komma från båda källorna.
+    """
+    minutes = parse_minutes(df["event_minute"])
+    etype = df["event_type"]
+    stat = etype.map(EVENT_STATS)
+    subs = etype == "substitution"
+    roles = pd.concat([
+        _roles(df, stat.notna(), "player_id", stat, minutes),
+        _roles(df, etype == "penalty_goal", "player_id", "goals", minutes),  # straffmål räknas även som mål
+        _roles(df, pd.Series(True, index=df.index), "assist_id", "assists", minutes),
+        _roles(df, subs, "player_in_id", "subs_in", minutes),
+        _roles(df, subs, "player_out_id", "subs_out", minutes),
+    ], ignore_index=True)
+    # Samma assist kan finnas både som eget "assist"-event och som assist_id på målet → räkna en gång
+    dup = roles.duplicated(KEYS + ["stat", "minute"]) & (roles["stat"] == "assists")
+    return roles[~dup].reset_index(drop=True)
+
+
+def aggregate_player_matches(df: pd.DataFrame, player_ids) -> pd.DataFrame:
+    """Vektoriserad player × match-aggregering (räknare + spelade minuter) för spelarna i player_ids."""
+    # Matchens längd tas från alla events, innan filtrering på spelare
+    match_end = (
+        parse_minutes(df["event_minute"]).groupby(df["match_id"]).max()
+        .fillna(FULL_MATCH_MINUTES).clip(lower=FULL_MATCH_MINUTES)
+    )
+
+    roles = event_roles(df)
+    roles = roles[roles["player_id"].isin(player_ids)]
+    if roles.empty:
+        return pd.DataFrame(columns=KEYS + COUNT_COLS + ["minutes_played"])
+
+    counts = (
+        roles.groupby(KEYS + ["stat"], sort=False).size()
+        .unstack("stat", fill_value=0)
+        .reindex(columns=COUNT_COLS, fill_value=0)
+    )
+
+    # Minuter: från inbytet (annars 0) till utbytet/rött kort (annars matchens slut)
+    came_on = roles[roles["stat"] == "subs_in"].groupby(KEYS)["minute"].min()
+    went_off = roles[roles["stat"].isin(["subs_out", "red_cards"])].groupby(KEYS)["minute"].min()
+    start = came_on.reindex(counts.index).fillna(0)
+    end = went_off.reindex(counts.index)
+    end = end.fillna(pd.Series(
+        counts.index.get_level_values("match_id").map(match_end), index=counts.index
+    )).fillna(FULL_MATCH_MINUTES)
+    counts["minutes_played"] = (end - start).clip(lower=0).round().astype(int)
+
+    return counts.reset_index().rename_axis(columns=None)
+
+
 def main():
     container = "afp"
 
     # 🎯 Masterlista för afrikanska spelare
-    master_path = "players/africa/players_africa_master.json"
-    master = load_json_from_blob(container, master_path)
-
-    # Endast numeriska ID:n (skip placeholders som AFR007, NEW005)
-    player_ids = {
-        str(p.get("id"))
-        for p in master.get("players", [])
-        if str(p.get("id")).isdigit()
-    }
-
-    # Skapa mapping {player_id -> player_name}
-    id_to_name = {
-        str(p.get("id")): p.get("name")
-        for p in master.get("players", [])
-        if str(p.get("id")).isdigit()
-    }
+    registry = master_players.get_registry(container)
+
+    # Endast numeriska ID:n som heltal (skip placeholders som AFR007, NEW005)
+    player_ids = utils_ids.int_id_set(registry.numeric_ids)
 
     rows = []
 
@@ -60,47 +135,39 @@ def main():
             print(f"[build_player_match_stats] ⚠️ Kunde inte läsa {path}: {e}")
             continue
 
-        # 🔑 Normalisera ID-kolumner med utils
-        df = utils_ids.normalize_ids(df, cols=["player_id", "assist_id"])
+        # 🔑 Id-kolumner som Int64 (no-op för filer skrivna med det kanoniska schemat)
+        df = utils_ids.to_int_ids(df)
+        for col in ("assist_id", "player_in_id", "player_out_id"):
+            if col not in df.columns:
+                df[col] = pd.Series(pd.NA, index=df.index, dtype=utils_ids.ID_DTYPE)
 
-        # Filtrera på spelare i masterlistan
-        df = df[df["player_id"].isin(player_ids)]
-        if df.empty:
+        # Bygg player × match rader (bara spelare i masterlistan)
+        grouped = aggregate_player_matches(df, player_ids)
+        if grouped.empty:
             continue
 
-        # Bygg player × match rader
-        grouped = df.groupby(["player_id", "match_id", "league_id", "season"]).agg(
-            goals=("event_type", lambda x: (x == "goal").sum()),
-            assists=("event_type", lambda x: (x == "assist").sum()),
-            yellow_cards=("event_type", lambda x: (x == "yellow_card").sum()),
-            red_cards=("event_type", lambda x: (x == "red_card").sum()),
-            minutes_played=("event_minute", "max"),
-        ).reset_index()
-
         rows.append(grouped)
 
     if not rows:
         print("[build_player_match_stats] ⚠️ Ingen data efter filtrering i någon fil")
         return
 
-    result = pd.concat(rows, ignore_index=True)
+    result = utils_ids.to_int_ids(pd.concat(rows, ignore_index=True), cols=["player_id", "match_id"])
 
-    # 📦 Spara till Parquet
-    parquet_bytes = result.to_parquet(index=False, engine="pyarrow")
-    output_path = "warehouse/base/player_match_stats.parquet"
-    azure_blob.put_bytes(
-        container=container,
-        blob_path=output_path,
-        data=parquet_bytes,
-        content_type="application/octet-stream",
+    # 📦 Spara som dataset partitionerat på säsong/liga (sorterat på spelare → snäva row group-statistik)
+    manifest = parquet_dataset.write_dataset(
+        container, OUTPUT_ROOT, result,
+        partition_by=["season", "league_id"],
+        sort_by=["player_id", "match_id"],
     )
 
-    print(f"[build_player_match_stats] ✅ Uploaded {len(result)} rows → {output_path}")
+    print(f"[build_player_match_stats] ✅ Uploaded {len(result)} rows in "
+          f"{len(manifest['files'])} partitions → {OUTPUT_ROOT}")
 
     # 👀 Preview per spelare (med namn)
     print("\n[build_player_match_stats] 🔎 Sample (per spelare):")
     preview = result.groupby("player_id").head(3).copy()
-    preview["player_name"] = preview["player_id"].map(id_to_name)
+    preview["player_name"] = preview["player_id"].map(lambda pid: (registry.get(pid) or {}).get("name"))
     print(preview.to_string(index=False))
 
 
@@ -0,0 +1,313 @@
+# src/warehouse/delta_pipeline.py
+"""
+Delta-läge: nyinsamlade matcher → per-match delta → aggregaten uppdateras på plats.
+
+Full kedja (B5 → B7 → M0/L1) räknar om events_flat, player_match_stats, player_totals
+och alla metrics från början. I delta-läget:
+
+  1. Match-filer i stats/<season>/<league>/ som är nya eller ändrade sedan förra
+     körningen (etag mot warehouse/deltas/<season>/<league>/_applied.json) flattas
+     och aggregeras till player × match-rader (samma logik som build_player_match_stats)
+     plus clean_sheets för målvakter. Varje match sparas som ett litet delta:
+     warehouse/deltas/<season>/<league>/<match_id>.parquet
+  2. Säsongens/ligans partition i player_match_stats skrivs om med de nya raderna,
+     och matches_flat/events_flat uppdateras inkrementellt (build_group) så att de
+     och deras vattenstämpel alltid innehåller delta-matcherna.
+  3. Nya matcher: deltat slås ihop med befintliga aggregat – player_totals,
+     goals_assists, cards, clean_sheets (bara berörda säsongspartitioner) och
+     leaderboards. toplists räknas om ur de uppdaterade (små) metrics-tabellerna.
+  4. Rättade matcher (matchen finns redan i player_match_stats): då räknas
+     aggregaten om (metrics_engine + leaderboards.rebuild) eftersom den gamla
+     matchens bidrag (t.ex. clean sheets) inte kan dras av säkert.
+
+_applied.json skrivs sist. Saknas den initieras den från events_flat-vattenstämpeln
+(matcher som full kedja redan räknat) – kör full kedja en gång före första delta-körningen.
+Delta-läget och full kedja ska inte köras samtidigt (se warehouse_auto --mode).
+
+Körning:
+  python -m src.warehouse.delta_pipeline                                  # alla säsonger/ligor
+  SEASON=2025-2026 LEAGUE_ID=228 python -m src.warehouse.delta_pipeline   # filter
+"""
+
+import os
+
+import pandas as pd
+import pyarrow as pa
+
+from src.storage import azure_blob, parquet_dataset
+from src.warehouse import (
+    build_matches_events_flat as flat,
+    build_player_match_stats as pms,
+    leaderboards,
+    metrics_engine,
+    utils_ids,
+)
+
+CONTAINER = "afp"
+DELTA_ROOT = "warehouse/deltas/"
+
+STATS_ROOT = pms.OUTPUT_ROOT
+STATS_COLS = pms.KEYS + pms.COUNT_COLS + ["minutes_played"]
+TOTALS_COLS = ["apps", "goals", "assists", "yellow_cards", "red_cards", "minutes_played"]
+
+
+def _applied_path(season: str, league: str) -> str:
+    return f"{DELTA_ROOT}{season}/{league}/_applied.json"
+
+
+def load_applied(container: str, season: str, league: str) -> dict:
+    """{blob: {"etag", "match_id"}} för matcher som redan ingår i aggregaten."""
+    try:
+        return azure_blob.get_json(container, _applied_path(season, league))
+    except Exception as e:
+        if not azure_blob.is_not_found(e):
+            raise  # tillfälligt fel – att initiera om skulle göra alla delta-matcher till "rättade"
+        seeded = flat.load_manifest(container, season, league)
+        if seeded:
+            print(f"[delta_pipeline] ℹ️ {season}/{league}: index saknas → initieras från events_flat "
+                  f"({len(seeded)} matcher)")
+        return seeded
+
+
+# --- 1. Match-filer → per-match delta ---
+
+def flatten_matches(container: str, season: str, league: str, paths: list):
+    """Match-JSON → (matches, events) som DataFrames med Int64-id:n, samt {blob: match_id}."""
+    matches, events = flat.BatchBuilder(flat.MATCH_SCHEMA), flat.BatchBuilder(flat.EVENT_SCHEMA)
+    match_ids = {}
+    for path, match, err in flat.iter_match_json(container, paths):
+        if err is not None:
+            print(f"[delta_pipeline] ⚠️ Skipping {path}: {err}")
+            continue
+        if isinstance(match, dict):
+            match_ids[path] = flat.flatten_match(match, season, league, matches, events)
+    df_matches = pa.Table.from_batches([matches.batch()]).to_pandas()
+    df_events = pa.Table.from_batches([events.batch()]).to_pandas()
+    return utils_ids.to_int_ids(df_matches), utils_ids.to_int_ids(df_events), match_ids
+
+
+def match_stats(df_matches: pd.DataFrame, df_events: pd.DataFrame, player_ids, gk_ids) -> pd.DataFrame:
+    """player × match-rader (som player_match_stats) + clean_sheets (0/1) för målvakterna."""
+    rows = pms.aggregate_player_matches(df_events, player_ids)
+    rows = utils_ids.to_int_ids(rows, cols=["player_id", "match_id"])
+    rows["clean_sheets"] = 0
+    if rows.empty:
+        return rows
+
+    gk_rows = rows[rows["player_id"].isin(gk_ids)]
+    if not gk_rows.empty:
+        sheets = metrics_engine.clean_sheet_rows(
+            gk_rows, df_matches, metrics_engine.keeper_sides(df_events, gk_ids)
+        ).set_index(["player_id", "match_id"])["clean_sheets"]
+        keys = pd.MultiIndex.from_frame(rows[["player_id", "match_id"]])
+        rows["clean_sheets"] = sheets.reindex(keys).fillna(0).astype(int).to_numpy()
+    return rows
+
+
+def write_match_deltas(container: str, season: str, league: str, rows: pd.DataFrame, match_ids):
+    """Ett litet delta per match (även matcher utan afrikanska spelare → tom fil)."""
+    uploads = {
+        f"{DELTA_ROOT}{season}/{league}/{mid}.parquet":
+            parquet_dataset.to_parquet_bytes(rows[rows["match_id"] == mid])
+        for mid in match_ids
+    }
+    errors = [(p, e) for p, e in azure_blob.put_many(container, uploads) if e is not None]
+    if errors:
+        raise RuntimeError(f"[delta_pipeline] {len(errors)} delta-filer kunde inte skrivas: {errors[0][1]}")
+
+
+# --- 2. player_match_stats-partitionen ---
+
+def upsert_partition(container: str, season: str, league: str, rows: pd.DataFrame, match_ids) -> set:
+    """
+    Ersätt matchernas rader i säsongens/ligans partition. Returnerar match_id:n som redan
+    fanns där (= rättade matcher, eller en tidigare körning som avbröts före indexet).
+    """
+    existing = parquet_dataset.read_dataset(container, STATS_ROOT, filters={"season": season, "league_id": league})
+    existing = utils_ids.to_int_ids(existing, cols=["player_id", "match_id"])
+    replaced = existing["match_id"].isin(list(match_ids))
+    corrected = set(existing.loc[replaced, "match_id"].dropna().astype(int))
+
+    part = pd.concat([existing[~replaced], rows[STATS_COLS]], ignore_index=True)
+    part["season"], part["league_id"] = season, league
+    parquet_dataset.write_partitions(
+        container, STATS_ROOT, part, partition_by=["season", "league_id"], sort_by=["player_id", "match_id"]
+    )
+    return corrected
+
+
+# --- 3. Delta → aggregat ---
+
+def merge_counts(existing: pd.DataFrame, delta: pd.DataFrame, keys, sums: dict) -> pd.DataFrame:
+    """
+    existing + delta per nyckel. sums = {kolumn i existing: kolumn i delta}; övriga kolumner
+    i existing behålls (nya nycklar får NaN där och fylls i av anroparen).
+    """
+    d = (
+        delta.rename(columns={v: k for k, v in sums.items()})
+        .groupby(keys, sort=False)[list(sums)].sum()
+    )
+    if existing is None or existing.empty:
+        return d.reset_index()
+    out = existing.set_index(keys)
+    out = out.reindex(out.index.union(d.index))
+    out[list(sums)] = out[list(sums)].fillna(0).add(d.reindex(out.index, fill_value=0)).astype(int)
+    return out.reset_index()
+
+
+def _fill(df: pd.DataFrame, col: str, lookup):
+    missing = df[col].isna() if col in df.columns else pd.Series(True, index=df.index)
+    df.loc[missing, col] = df.loc[missing, "player_id"].map(lookup)
+    return df
+
+
+def season_deltas(rows: pd.DataFrame) -> pd.DataFrame:
+    """Delta per spelare × säsong (apps + räknare + clean_sheets)."""
+    sums = {c: (c, "sum") for c in TOTALS_COLS[1:] + ["clean_sheets"]}
+    return rows.groupby(["player_id", "season"], sort=False).agg(
+        apps=("match_id", "nunique"), **sums
+    ).reset_index()
+
+
+def _read_season(container: str, root: str, season: str):
+    try:
+        df = parquet_dataset.read_dataset(container, root, filters={"season": season})
+    except Exception:
+        return None
+    return utils_ids.to_int_ids(df, cols=["player_id"])
+
+
+def _gk_ids(registry) -> set:
+    return {int(p["id"]) for p in registry.position_players("GK") if str(p.get("id")).isdigit()}
+
+
+def merge_metrics(container: str, rows: pd.DataFrame, tables: "metrics_engine.BaseTables"):
+    """Slå ihop nya matchers delta med player_totals, goals_assists, cards, clean_sheets och toplists."""
+    registry = tables.registry
+    by_season = season_deltas(rows)
+    name = lambda pid: (registry.get(pid) or {}).get("name")
+    country = lambda pid: (registry.get(pid) or {}).get("country")
+
+    # player_totals (en fil, alla säsonger)
+    totals_path = metrics_engine.METRICS["player_totals"].output
+    try:
+        totals = utils_ids.to_int_ids(metrics_engine.read_parquet(container, totals_path), cols=["player_id"])
+    except Exception:
+        totals = None
+    totals = merge_counts(totals, by_season, ["player_id"], {c: c for c in TOTALS_COLS})
+
+    # Säsongspartitioner: bara de säsonger deltat berör läses och skrivs om
+    ga_parts, card_parts, cs_parts = [], [], []
+    players_flat = tables.players.drop_duplicates("player_id").set_index("player_id")
+    gk_ids = _gk_ids(registry)
+    for season, delta in by_season.groupby("season"):
+        ga = _read_season(container, metrics_engine.METRICS["goals_assists"].output, season)
+        ga = merge_counts(ga, delta, ["player_id", "season"], {"total_goals": "goals", "total_assists": "assists"})
+        ga["goal_contributions"] = ga["total_goals"] + ga["total_assists"]
+        ga_parts.append(_fill(_fill(ga, "player_name", name), "country", country))
+
+        cards = _read_season(container, metrics_engine.METRICS["cards"].output, season)
+        cards = merge_counts(cards, delta, ["player_id", "season"],
+                             {"total_yellow": "yellow_cards", "total_red": "red_cards"})
+        cards["total_cards"] = cards["total_yellow"] + cards["total_red"]
+        cards = _fill(cards, "player_name", players_flat["name"])
+        card_parts.append(_fill(cards, "country", players_flat["country"]))
+
+        gk_delta = delta[delta["player_id"].isin(gk_ids)]
+        if not gk_delta.empty:
+            cs = _read_season(container, metrics_engine.METRICS["clean_sheets"].output, season)
+            cs = merge_counts(cs, gk_delta, ["player_id", "season"], {"clean_sheets": "clean_sheets"})
+            cs_parts.append(_fill(_fill(cs, "player_name", name), "country", country))
+
+    azure_blob.put_bytes(container, totals_path, parquet_dataset.to_parquet_bytes(totals))
+    for metric_name, parts in (("goals_assists", ga_parts), ("cards", card_parts), ("clean_sheets", cs_parts)):
+        if not parts:
+            continue
+        m = metrics_engine.METRICS[metric_name]
+        df = utils_ids.to_int_ids(pd.concat(parts, ignore_index=True), cols=["player_id"])
+        parquet_dataset.write_partitions(container, m.output, df, partition_by=m.partition_by, sort_by=["player_id"])
+        print(f"[delta_pipeline] ✅ {metric_name}: {len(df)} rader i {len(parts)} säsong(er) → {m.output}")
+
+    # toplists är över alla säsonger men metrics-tabellerna är små – räkna om ur dem
+    results = {
+        name: parquet_dataset.read_dataset(container, metrics_engine.METRICS[name].output)
+        for name in metrics_engine.METRICS["toplists"].depends_on
+    }
+    toplists = metrics_engine.METRICS["toplists"]
+    azure_blob.put_bytes(container, toplists.output,
+                         parquet_dataset.to_parquet_bytes(toplists.compute(tables, results)))
+    print(f"[delta_pipeline] ✅ player_totals ({len(totals)} spelare) och toplists uppdaterade")
+
+
+# --- Körning ---
+
+def run(container: str = CONTAINER, season: str = None, league: str = None) -> dict:
+    """Ta in nya/ändrade matcher för alla säsonger/ligor som matchar filtren. Returnerar en sammanfattning."""
+    if parquet_dataset.load_manifest(container, STATS_ROOT) is None:
+        raise RuntimeError(f"[delta_pipeline] ❌ {STATS_ROOT} saknas – kör full kedja (B5 → B7 → M0) först")
+
+    tables = metrics_engine.BaseTables(container)
+    player_ids = utils_ids.int_id_set(tables.registry.numeric_ids)
+    gk_ids = _gk_ids(tables.registry)
+
+    new_rows, corrected, indexes = [], set(), {}
+    for (s, lg), listing in sorted(flat.group_match_files(container, season, league).items()):
+        applied = load_applied(container, s, lg)
+        changed = sorted(f for f, etag in listing.items() if applied.get(f, {}).get("etag") != etag)
+        if not changed:
+            continue
+
+        df_matches, df_events, match_ids = flatten_matches(container, s, lg, changed)
+        rows = match_stats(df_matches, df_events, player_ids, gk_ids)
+        ids = set(match_ids.values()) - {None}
+        write_match_deltas(container, s, lg, rows, ids)
+        fixed = upsert_partition(container, s, lg, rows, ids)
+        # matches_flat/events_flat och deras vattenstämpel hålls i fas: en omräkning
+        # (clean_sheets) och initiering av indexet ser då även delta-matcherna
+        flat.build_group(container, s, lg, listing, tag="delta_pipeline")
+
+        print(f"[delta_pipeline] 📦 {s}/{lg}: {len(changed)} nya/ändrade filer, {len(ids)} matcher, "
+              f"{len(rows)} spelarrader, {len(fixed)} rättade")
+        corrected |= {(s, mid) for mid in fixed}
+        new_rows.append(rows[~rows["match_id"].isin(fixed)])
+        for path, mid in match_ids.items():
+            applied[path] = {"etag": listing[path], "match_id": mid}
+        indexes[(s, lg)] = applied
+
+    if not indexes:
+        print("[delta_pipeline] ✅ Inga nya matcher")
+        return {"matches": 0, "corrected": 0}
+
+    rows = pd.concat(new_rows, ignore_index=True) if new_rows else pd.DataFrame(columns=STATS_COLS)
+    if corrected:
+        # Rättade matcher: räkna om aggregaten från (den uppdaterade) player_match_stats
+        print(f"[delta_pipeline] 🔁 {len(corrected)} rättade matcher → räknar om metrics och leaderboards")
+        metrics_engine.run(container=container)
+        for s in sorted({s for s, _ in corrected} | set(rows["season"].unique())):
+            leaderboards.rebuild(container, s)
+    elif not rows.empty:
+        merge_metrics(container, rows, tables)
+        for s, part in rows.groupby("season"):
+            leaderboards.apply_deltas(container, s, leaderboards.match_deltas(part), part["match_id"].unique())
+
+    # Indexet sist: avbryts körningen innan dess tas matcherna med (som rättade) nästa gång
+    errors = [
+        (p, e) for p, e in azure_blob.upload_many_json(
+            container, {_applied_path(s, lg): applied for (s, lg), applied in indexes.items()}
+        ) if e is not None
+    ]
+    if errors:
+        raise RuntimeError(f"[delta_pipeline] ❌ Kunde inte skriva {errors[0][0]}: {errors[0][1]}")
+
+    summary = {"matches": int(rows["match_id"].nunique()), "corrected": len(corrected)}
+    print(f"[delta_pipeline] ✅ Klar: {summary}")
+    return summary
+
+
+def main():
+    # LEAGUE (warehouse_auto sätter en default för full kedja) filtrerar inte – delta tar alla ligor
+    run(CONTAINER, os.environ.get("SEASON"), os.environ.get("LEAGUE_ID"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+# src/warehouse/leaderboards.py
+"""
+Förberäknade topplistor (leaderboards) per säsong: hela Afrika, per liga,
+per land och per klubb.
+
+Layout:
+  warehouse/leaderboards/<season>/all.json
+  warehouse/leaderboards/<season>/league/<league_id>.json
+  warehouse/leaderboards/<season>/country/<slug>.json     ("South Africa" → south-africa)
+  warehouse/leaderboards/<season>/club/<slug>.json
+  warehouse/leaderboards/<season>/_state.parquet          räknare per spelare × liga
+  warehouse/leaderboards/<season>/_index.json             match_id:n som ingår i state
+
+Varje listfil innehåller alla BOARDS (top_scorers, top_assists, top_contributions,
+bad_boys) med TOP_K rader var, redan sorterade – en sektion läser sin lista med en
+liten blob-läsning (read_board/top) och behöver aldrig sortera metrics-filerna själv.
+
+Uppdatering: _state.parquet är summan av alla inkluderade matchers delta
+(player_match_stats-rader aggregerade per spelare × liga). Nya matcher blir ett
+delta som slås ihop med state (apply_deltas) och bara listor vars spelare ändrats
+(deras liga, land, klubb + all) räknas om och skrivs. update läser om säsongens
+player_match_stats och diffar mot state, så rättade eller borttagna matcher blir
+negativa delta på samma sätt. --rebuild räknar om allt från player_match_stats,
+t.ex. efter övergångar i masterlistan (klubb/land läses därifrån).
+
+Körning:
+  SEASON=2025-2026 python -m src.warehouse.leaderboards            # nya/ändrade matcher
+  SEASON=2025-2026 python -m src.warehouse.leaderboards --rebuild  # allt om
+"""
+
+import argparse
+import os
+from io import BytesIO
+
+import pandas as pd
+
+from src.storage import azure_blob, parquet_dataset
+from src.common import master_players
+from src.warehouse import utils_ids
+
+CONTAINER = os.getenv("AZURE_STORAGE_CONTAINER", "afp")
+
+ROOT = "warehouse/leaderboards/"
+STATS_ROOT = "warehouse/base/player_match_stats/"
+TOP_K = int(os.getenv("LEADERBOARD_TOP_K", "20"))
+
+# Lista → kolumn den rankas på
+BOARDS = {
+    "top_scorers": "total_goals",
+    "top_assists": "total_assists",
+    "top_contributions": "goal_contributions",
+    "bad_boys": "total_cards",
+}
+SCOPES = {"league": "league_id", "country": "country", "club": "club"}
+
+STATE_KEYS = ["player_id", "league_id"]
+# player_match_stats-kolumn → räknare i state
+COUNTERS = {
+    "goals": "total_goals",
+    "assists": "total_assists",
+    "yellow_cards": "total_yellow",
+    "red_cards": "total_red",
+    "minutes_played": "minutes_played",
+}
+STATE_COLS = STATE_KEYS + ["apps"] + list(COUNTERS.values())
+PLAYER_COLS = ["player_id", "player_name", "country", "club"]
+
+
+def scope_key(value) -> str:
+    """Filnamn för en land-/klubb-/liganyckel ("Al Ahly SC" → "al-ahly-sc")."""
+    return master_players.normalize_name(value).replace(" ", "-")
+
+
+def board_path(season: str, scope: str = "all", key=None) -> str:
+    if scope == "all":
+        return f"{ROOT}{season}/all.json"
+    if scope not in SCOPES:
+        raise ValueError(f"Okänt scope '{scope}' (finns: all, {', '.join(SCOPES)})")
+    return f"{ROOT}{season}/{scope}/{scope_key(key)}.json"
+
+
+def read_board(season: str, board: str, scope: str = "all", key=None, container: str = CONTAINER) -> list:
+    """En topplista (redan sorterad, högst TOP_K rader) – en blob-läsning."""
+    if board not in BOARDS:
+        raise ValueError(f"Okänd topplista '{board}' (finns: {', '.join(BOARDS)})")
+    return azure_blob.get_json(container, board_path(season, scope, key))["boards"].get(board, [])
+
+
+def top(season: str, board: str, k: int = 5, scope: str = "all", key=None, container: str = CONTAINER) -> list:
+    return read_board(season, board, scope, key, container)[:k]
+
+
+# --- Delta och state ---
+
+def _typed_keys(df: pd.DataFrame) -> pd.DataFrame:
+    """player_id som Int64; league_id är ligans katalognamn i stats/ (sträng, inte alltid numeriskt)."""
+    df = utils_ids.to_int_ids(df, cols=["player_id"])
+    df["league_id"] = df["league_id"].astype(str)
+    return df
+
+
+def match_deltas(df_stats: pd.DataFrame) -> pd.DataFrame:
+    """player_match_stats-rader → delta per spelare × liga (apps + räknare)."""
+    df = _typed_keys(df_stats.rename(columns=COUNTERS))
+    for col in COUNTERS.values():
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(int) if col in df.columns else 0
+    if df.empty:
+        return pd.DataFrame(columns=STATE_COLS)
+    delta = (
+        df.groupby(STATE_KEYS, sort=False)
+        .agg(apps=("match_id", "nunique"), **{col: (col, "sum") for col in COUNTERS.values()})
+        .reset_index()
+    )
+    return delta
+
+
+def merge_deltas(state: pd.DataFrame, delta: pd.DataFrame) -> pd.DataFrame:
+    """state + delta per spelare × liga. Rader som hamnar på noll matcher (rättade bort) tas bort."""
+    merged = (
+        pd.concat([state[STATE_COLS], delta[STATE_COLS]], ignore_index=True)
+        .groupby(STATE_KEYS, sort=False)
+        .sum()
+        .reset_index()
+    )
+    return merged[merged["apps"] > 0].reset_index(drop=True)
+
+
+def diff_state(state: pd.DataFrame, target: pd.DataFrame) -> pd.DataFrame:
+    """target − state per spelare × liga (delta-format); bara rader där något skiljer sig."""
+    values = [c for c in STATE_COLS if c not in STATE_KEYS]
+    negated = state[STATE_COLS].copy()
+    negated[values] = -negated[values]
+    diff = (
+        pd.concat([target[STATE_COLS], negated], ignore_index=True)
+        .groupby(STATE_KEYS, sort=False)
+        .sum()
+        .reset_index()
+    )
+    return diff[(diff[values] != 0).any(axis=1)].reset_index(drop=True)
+
+
+def with_players(state: pd.DataFrame, registry) -> pd.DataFrame:
+    """Namn, land och klubb från masterlistan + härledda kolumner (goal_contributions, total_cards)."""
+    df = state.copy()
+    info = df["player_id"].map(lambda pid: registry.get(pid, {}))
+    df["player_name"] = info.map(lambda p: p.get("name"))
+    df["country"] = info.map(lambda p: p.get("country"))
+    df["club"] = info.map(lambda p: p.get("club"))
+    df["goal_contributions"] = df["total_goals"] + df["total_assists"]
+    df["total_cards"] = df["total_yellow"] + df["total_red"]
+    return df
+
+
+def top_k(df: pd.DataFrame, col: str, k: int = TOP_K) -> pd.DataFrame:
+    """De k högsta (> 0) på col; lika värden ordnas på player_id så att listorna är stabila."""
+    df = df[df[col] > 0]
+    return df.sort_values([col, "player_id"], ascending=[False, True], kind="stable").head(k)
+
+
+def _boards(df: pd.DataFrame, k: int) -> dict:
+    """Alla BOARDS för ett scope (df = state-rader i scopet, summeras per spelare över ligor)."""
+    value_cols = ["apps", "minutes_played", "total_goals", "total_assists", "goal_contributions",
+                  "total_yellow", "total_red", "total_cards"]
+    per_player = df.groupby("player_id", sort=False).agg(
+        **{c: (c, "first") for c in PLAYER_COLS[1:]}, **{c: (c, "sum") for c in value_cols}
+    ).reset_index()
+    out = {}
+    for board, col in BOARDS.items():
+        rows = top_k(per_player, col, k).astype(object).where(lambda d: d.notna(), None)
+        out[board] = [dict(r, rank=i + 1) for i, r in enumerate(rows.to_dict(orient="records"))]
+    return out
+
+
+def _scope_keys(df: pd.DataFrame) -> dict:
+    """{scope: Series med filnyckel per rad}; namn som skiljer sig bara i stavning/accenter delar nyckel."""
+    return {
+        scope: df[col].map(lambda v: scope_key(v) if pd.notna(v) and str(v).strip() else None)
+        for scope, col in SCOPES.items()
+    }
+
+
+def affected_scopes(df: pd.DataFrame) -> set:
+    """Scopes vars listor kan ändras när raderna i df (spelare × liga med metadata) ändras."""
+    scopes = {("all", None)}
+    for scope, keys in _scope_keys(df).items():
+        scopes.update((scope, key) for key in keys.dropna().unique())
+    return scopes
+
+
+def build_boards(df: pd.DataFrame, season: str, scopes=None, k: int = TOP_K) -> dict:
+    """
+    {blob-sökväg: listfil} för scopes = {(scope, nyckel)} (None = alla scopes i df).
+    Scope-nycklar som inte längre har några rader ger tomma listor (så gamla filer skrivs över).
+    """
+    if scopes is None:
+        scopes = affected_scopes(df)
+    updated_at = azure_blob.utc_now_iso()
+    groups = {scope: dict(tuple(df.groupby(keys, sort=False))) for scope, keys in _scope_keys(df).items()}
+
+    files = {}
+    for scope, key in scopes:
+        part = df if scope == "all" else groups[scope].get(key, df.iloc[0:0])
+        label = None if scope == "all" else (str(part[SCOPES[scope]].iloc[0]) if not part.empty else str(key))
+        files[board_path(season, scope, key)] = {
+            "season": season,
+            "scope": scope,
+            "key": label,
+            "top_k": k,
+            "updated_at": updated_at,
+            "boards": _boards(part, k),
+        }
+    return files
+
+
+# --- Blob I/O ---
+
+def _state_path(season: str) -> str:
+    return f"{ROOT}{season}/_state.parquet"
+
+
+def _index_path(season: str) -> str:
+    return f"{ROOT}{season}/_index.json"
+
+
+def load_state(container: str, season: str):
+    """(state, index) eller (None, None) om säsongen inte byggts (eller med annat TOP_K)."""
+    try:
+        index = azure_blob.get_json(container, _index_path(season))
+        state = pd.read_parquet(BytesIO(azure_blob.get_bytes(container, _state_path(season))), engine="pyarrow")
+    except Exception:
+        return None, None
+    if index.get("top_k") != TOP_K or any(c not in state.columns for c in STATE_COLS):
+        return None, None
+    return _typed_keys(state), index
+
+
+def _write(container: str, season: str, files: dict, state: pd.DataFrame, match_ids):
+    """Listfilerna först, state + index sist (ett avbrutet jobb räknas om nästa gång)."""
+    errors = [(p, e) for p, e in azure_blob.upload_many_json(container, files) if e is not None]
+    if errors:
+        raise RuntimeError(f"[leaderboards] {len(errors)} av {len(files)} listor kunde inte skrivas: {errors[0][1]}")
+
+    azure_blob.put_bytes(container, _state_path(season), parquet_dataset.to_parquet_bytes(state[STATE_COLS]),
+                         content_type="application/octet-stream")
+    azure_blob.upload_json(container, _index_path(season), {
+        "season": season,
+        "top_k": TOP_K,
+        "matches": sorted(int(m) for m in match_ids),
+        "updated_at": azure_blob.utc_now_iso(),
+    })
+
+
+def read_season_stats(container: str, season: str) -> pd.DataFrame:
+    cols = ["player_id", "match_id", "league_id", "season"] + list(COUNTERS)
+    df = parquet_dataset.read_dataset(container, STATS_ROOT, filters={"season": season}, columns=cols)
+    return utils_ids.to_int_ids(df, cols=["player_id", "match_id"])
+
+
+def rebuild(container: str, season: str, df_stats: pd.DataFrame = None) -> dict:
+    """Bygg state och alla listor för säsongen från player_match_stats."""
+    df_stats = read_season_stats(container, season) if df_stats is None else df_stats
+    state = match_deltas(df_stats)
+    state = state[state["apps"] > 0].reset_index(drop=True)
+    df = with_players(state, master_players.get_registry(container))
+    files = build_boards(df, season)
+    _write(container, season, files, state, df_stats["match_id"].dropna().unique())
+    print(f"[leaderboards] ✅ {season}: {len(files)} listor från {len(state)} spelare × liga (full build)")
+    return files
+
+
+def apply_deltas(container: str, season: str, delta: pd.DataFrame, match_ids=(),
+                 replace_index: bool = False) -> dict:
+    """
+    Slå ihop ett delta (match_deltas-format, får vara negativt) med säsongens state och
+    skriv om bara de listor som berörs. match_ids läggs till i indexets inkluderade matcher
+    (replace_index=True: ersätter dem).
+    """
+    state, index = load_state(container, season)
+    if state is None:
+        print(f"[leaderboards] ℹ️ {season}: inget state → full build")
+        return rebuild(container, season)
+
+    registry = master_players.get_registry(container)
+    merged = merge_deltas(state, delta)
+    df = with_players(merged, registry)
+    # Listor där någon av deltats spelare ingår (liga från deltat, land/klubb från masterlistan)
+    changed = with_players(delta.drop_duplicates(STATE_KEYS), registry)
+    scopes = affected_scopes(changed)
+
+    files = build_boards(df, season, scopes=scopes)
+    included = {int(m) for m in match_ids}
+    if not replace_index:
+        included |= set(index.get("matches", []))
+    _write(container, season, files, merged, included)
+    print(f"[leaderboards] ✅ {season}: {len(files)} listor uppdaterade ({len(delta)} delta-rader)")
+    return files
+
+
+def update(container: str, season: str) -> dict:
+    """
+    Synka mot player_match_stats: säsongens rader aggregeras om och diffas mot state,
+    så nya, rättade och borttagna matcher ger (positiva/negativa) delta.
+    Bara listor vars spelare fått ändrade räknare skrivs om.
+    """
+    state, index = load_state(container, season)
+    df_stats = read_season_stats(container, season)
+    if state is None:
+        return rebuild(container, season, df_stats)
+
+    df_stats = df_stats[df_stats["match_id"].notna()]
+    match_ids = {int(m) for m in df_stats["match_id"].unique()}
+    delta = diff_state(state, match_deltas(df_stats))
+    if delta.empty and match_ids == set(index.get("matches", [])):
+        print(f"[leaderboards] ⏭️ {season}: inga nya eller ändrade matcher")
+        return {}
+    return apply_deltas(container, season, delta, match_ids, replace_index=True)
+
+
+def seasons(container: str) -> list:
+    manifest = parquet_dataset.load_manifest(container, STATS_ROOT) or {}
+    return sorted({f["partition"].get("season") for f in manifest.get("files", {}).values()} - {None})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bygg/uppdatera förberäknade topplistor per säsong")
+    parser.add_argument("--season", default=os.getenv("SEASON"), help="Default: alla säsonger i player_match_stats")
+    parser.add_argument("--rebuild", action="store_true", help="Räkna om allt istället för att diffa mot state")
+    args = parser.parse_args(argv)
+
+    for season in ([args.season] if args.season else seasons(CONTAINER)):
+        if args.rebuild:
+            rebuild(CONTAINER, season)
+        else:
+            update(CONTAINER, season)
+
+
+if __name__ == "__main__":
+    main()
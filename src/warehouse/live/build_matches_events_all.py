@@ -1,14 +1,21 @@
 import os
-import subprocess
-import pandas as pd
 import io
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from src.storage import azure_blob
+from src.warehouse import build_matches_events_flat
 
 # Konstanter
 CONTAINER = os.environ.get("AZURE_CONTAINER", "afp")
 SEASONS_PARQUET = "warehouse/base/seasons_flat.parquet"
 CURRENT_SEASON = "2025-2026"
 
+# Antal ligor som byggs parallellt (I/O-bundet: blob-hämtning + upload)
+MAX_WORKERS = int(os.environ.get("LIVE_MAX_WORKERS", "4"))
+
+TAG = "build_matches_events_flat:live"
+
+
 def load_seasons_flat():
     """Läs seasons_flat.parquet från Azure Blob Storage."""
     if not azure_blob.exists(CONTAINER, SEASONS_PARQUET):
@@ -17,11 +24,18 @@ def load_seasons_flat():
             "Kör build_seasons_flat först."
         )
 
-    svc = azure_blob._client()
-    container_client = svc.get_container_client(CONTAINER)
-    blob_client = container_client.get_blob_client(SEASONS_PARQUET)
-    stream = io.BytesIO(blob_client.download_blob().readall())
-    return pd.read_parquet(stream)
+    return pd.read_parquet(io.BytesIO(azure_blob.get_bytes(CONTAINER, SEASONS_PARQUET)))
+
+
+def _build_league(league_id: str, league_name: str, listing: dict):
+    """Bygg en liga; fel fångas och returneras så att övriga ligor inte påverkas."""
+    try:
+        build_matches_events_flat.build_group(CONTAINER, CURRENT_SEASON, league_id, listing, mode="live", tag=TAG)
+        return None
+    except Exception as e:
+        print(f"[{TAG}] ❌ {league_name} ({league_id}) failed: {e}")
+        return e
+
 
 def main():
     df = load_seasons_flat()
@@ -31,23 +45,28 @@ def main():
 
     print(f"▶️ Hittade {len(active)} aktiva ligor för {CURRENT_SEASON}")
 
+    # En listning för hela säsongen, grupperad per liga
+    groups = build_matches_events_flat.group_match_files(CONTAINER, CURRENT_SEASON)
+
+    jobs = []
     for _, row in active.iterrows():
-        league_id = row["league_id"]
-        league_name = row.get("league_name", str(league_id))
+        league_id = str(row["league_id"])
+        league_name = row.get("league_name", league_id)
+        listing = groups.get((CURRENT_SEASON, league_id))
+        if not listing:
+            print(f"⚠️ Inga match-filer för {league_name} ({league_id}) – hoppar över")
+            continue
+        jobs.append((league_id, league_name, listing))
 
-        print(f"▶️ Kör build_matches_events_flat för {league_name} ({league_id})")
+    print(f"▶️ Bygger {len(jobs)} ligor med {MAX_WORKERS} workers")
+    with ThreadPoolExecutor(max_workers=max(1, MAX_WORKERS)) as pool:
+        errors = list(pool.map(lambda job: _build_league(*job), jobs))
 
-        env = {
-            **os.environ,
-            "SEASON": CURRENT_SEASON,
-            "LEAGUE_ID": str(league_id),
-        }
+    failed = [(league_id, name) for (league_id, name, _), err in zip(jobs, errors) if err is not None]
+    print(f"✅ {len(jobs) - len(failed)}/{len(jobs)} ligor klara")
+    if failed:
+        raise SystemExit(f"❌ Misslyckades: {', '.join(f'{name} ({lid})' for lid, name in failed)}")
 
-        subprocess.run(
-            ["python", "-m", "src.warehouse.live.build_matches_events_flat"],
-            env=env,
-            check=True,
-        )
 
 if __name__ == "__main__":
     main()
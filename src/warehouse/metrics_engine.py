@@ -0,0 +1,366 @@
+# src/warehouse/metrics_engine.py
+"""
+Metrics-motor: laddar bas-tabellerna en gång och räknar alla registrerade
+metrics ur samma delade frame.
+
+Tidigare laddade build_goals_assists_africa, build_cards_africa, build_player_totals,
+build_clean_sheets_africa och build_toplists_africa var för sig ned
+player_match_stats.parquet och masterlistan och körde egna groupby. Nu:
+  - BaseTables laddar varje bas-tabell högst en gång, och bara om någon metric behöver den
+  - season_totals är EN groupby (spelare × säsong) över player_match_stats;
+    goals_assists, cards och player_totals härleds ur den
+  - metrics är registrerade definitioner (@metric) med output och beroenden till
+    andra metrics; säsongsbaserade metrics skrivs som dataset partitionerade på
+    season (parquet_dataset), övriga som enskilda filer
+  - en metric som fallerar (t.ex. saknad bas-tabell) stoppar bara sig själv och
+    metrics som beror på den; resten laddas upp och körningen avslutas med fel
+
+Körning:
+  python -m src.warehouse.metrics_engine                          # alla metrics
+  python -m src.warehouse.metrics_engine --only cards toplists    # urval (beroenden räknas i minnet)
+"""
+
+import argparse
+from functools import cached_property
+from io import BytesIO
+
+import pandas as pd
+
+from src.storage import azure_blob, parquet_dataset
+from src.common import master_players
+from src.warehouse import leaderboards, utils_ids
+
+CONTAINER = "afp"
+
+STATS_ROOT = "warehouse/base/player_match_stats/"
+PLAYERS_PATH = "warehouse/base/players_flat.parquet"
+MATCHES_PREFIX = "warehouse/base/matches_flat/"
+EVENTS_PREFIX = "warehouse/base/events_flat/"
+
+COUNT_COLS = ["goals", "penalty_goals", "assists", "yellow_cards", "red_cards", "subs_in", "subs_out"]
+SIDE_ID_COLS = ["player_id", "assist_id", "player_in_id", "player_out_id"]
+
+METRICS = {}
+
+
+class Metric:
+    """
+    En registrerad metric: compute(tables, results) → DataFrame som skrivs till output.
+    Med partition_by är output ett dataset-prefix (parquet_dataset), annars en enskild fil.
+    """
+
+    __slots__ = ("name", "output", "depends_on", "partition_by", "compute")
+
+    def __init__(self, name, output, depends_on, partition_by, compute):
+        self.name = name
+        self.output = output
+        self.depends_on = tuple(depends_on)
+        self.partition_by = tuple(partition_by)
+        self.compute = compute
+
+
+def metric(name: str, output: str, depends_on=(), partition_by=()):
+    """Dekorator: registrera en metric-funktion (tables, results) → DataFrame."""
+    def _register(fn):
+        if name in METRICS:
+            raise ValueError(f"Metric '{name}' är redan registrerad")
+        METRICS[name] = Metric(name, output, depends_on, partition_by, fn)
+        return fn
+    return _register
+
+
+def read_parquet(container: str, path: str) -> pd.DataFrame:
+    return pd.read_parquet(BytesIO(azure_blob.get_bytes(container, path)), engine="pyarrow")
+
+
+def read_parquet_prefix(container: str, prefix: str):
+    """Läs och slå ihop alla parquet-filer under prefix (parallell hämtning). None om inga gick att läsa."""
+    paths = [p for p in azure_blob.list_prefix(container, prefix) if p.endswith(".parquet")]
+    frames = []
+    for path, data, err in azure_blob.get_many_bytes(container, paths):
+        if err is not None:
+            print(f"[metrics_engine] ⚠️ Kunde inte läsa {path}: {err}")
+            continue
+        frames.append(pd.read_parquet(BytesIO(data), engine="pyarrow"))
+    if not frames:
+        return None
+    return pd.concat(frames, ignore_index=True)
+
+
+class BaseTables:
+    """Bas-tabellerna för en körning. Varje tabell laddas (och normaliseras) vid första användning."""
+
+    def __init__(self, container: str = CONTAINER):
+        self.container = container
+
+    @cached_property
+    def registry(self):
+        return master_players.get_registry(self.container)
+
+    @cached_property
+    def stats(self) -> pd.DataFrame:
+        print(f"[metrics_engine] 📥 Laddar {STATS_ROOT}")
+        df = parquet_dataset.read_dataset(self.container, STATS_ROOT)
+        df = utils_ids.to_int_ids(df, cols=["player_id", "match_id"])
+        df["season"] = df["season"].astype(str)
+        for col in COUNT_COLS + ["minutes_played"]:
+            if col not in df.columns:
+                df[col] = 0  # äldre player_match_stats saknar t.ex. penalty_goals/subs_*
+            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(int)
+        return df
+
+    @cached_property
+    def season_totals(self) -> pd.DataFrame:
+        """Spelare × säsong: apps + summor av alla räknare. Den enda groupby:n över player_match_stats."""
+        aggs = {col: (col, "sum") for col in COUNT_COLS + ["minutes_played"]}
+        return (
+            self.stats.groupby(["player_id", "season"], sort=False)
+            .agg(apps=("match_id", "nunique"), **aggs)
+            .reset_index()
+        )
+
+    @cached_property
+    def players(self) -> pd.DataFrame:
+        print(f"[metrics_engine] 📥 Laddar {PLAYERS_PATH}")
+        df = read_parquet(self.container, PLAYERS_PATH)
+        return utils_ids.to_int_ids(df, cols=["player_id"])
+
+    @cached_property
+    def matches(self):
+        print(f"[metrics_engine] 📥 Laddar {MATCHES_PREFIX}")
+        df = read_parquet_prefix(self.container, MATCHES_PREFIX)
+        return None if df is None else utils_ids.to_int_ids(df)
+
+    @cached_property
+    def events(self):
+        print(f"[metrics_engine] 📥 Laddar {EVENTS_PREFIX}")
+        df = read_parquet_prefix(self.container, EVENTS_PREFIX)
+        return None if df is None else utils_ids.to_int_ids(df)
+
+
+# --- Metrics ---
+
+@metric("player_totals", "warehouse/base/player_totals.parquet")
+def player_totals(tables, results):
+    cols = ["apps", "goals", "assists", "yellow_cards", "red_cards", "minutes_played"]
+    return tables.season_totals.groupby("player_id")[cols].sum().reset_index()
+
+
+@metric("goals_assists", "warehouse/metrics/goals_assists_africa/", partition_by=("season",))
+def goals_assists(tables, results):
+    registry = tables.registry
+    df = tables.season_totals
+    df = df[df["player_id"].isin(utils_ids.int_id_set(registry.numeric_ids))]
+    out = df[["player_id", "season"]].copy()
+    out["total_goals"] = df["goals"]
+    out["total_assists"] = df["assists"]
+    out["goal_contributions"] = out["total_goals"] + out["total_assists"]
+    out["player_name"] = out["player_id"].map(lambda pid: registry.get(pid).get("name"))
+    out["country"] = out["player_id"].map(lambda pid: registry.get(pid).get("country"))
+    return out.reset_index(drop=True)
+
+
+@metric("cards", "warehouse/metrics/cards_africa/", partition_by=("season",))
+def cards(tables, results):
+    df = tables.season_totals[["player_id", "season", "yellow_cards", "red_cards"]].rename(
+        columns={"yellow_cards": "total_yellow", "red_cards": "total_red"}
+    )
+    players = tables.players[["player_id", "name", "country"]].drop_duplicates("player_id")
+    df = df.merge(players, on="player_id", how="left").rename(columns={"name": "player_name"})
+    df["total_cards"] = df["total_yellow"] + df["total_red"]
+    return df
+
+
+def keeper_sides(df_events: pd.DataFrame, gk_ids) -> pd.DataFrame:
+    """(player_id, match_id, side) för målvakterna, där side är eventets team ("home"/"away")."""
+    parts = []
+    for col in SIDE_ID_COLS:
+        if col not in df_events.columns:
+            continue
+        ids = df_events[col]
+        mask = ids.isin(gk_ids) & df_events["team"].isin(["home", "away"])
+        parts.append(pd.DataFrame({
+            "player_id": ids[mask],
+            "match_id": df_events.loc[mask, "match_id"],
+            "side": df_events.loc[mask, "team"],
+        }))
+    if not parts:
+        return pd.DataFrame(columns=["player_id", "match_id", "side"])
+    # Första kända laget per spelare och match
+    return pd.concat(parts, ignore_index=True).drop_duplicates(["player_id", "match_id"])
+
+
+def clean_sheet_rows(df_stats: pd.DataFrame, df_matches: pd.DataFrame, sides: pd.DataFrame) -> pd.DataFrame:
+    """
+    Målvakt × match med clean_sheets = 1 om målvaktens eget lag inte släppte in mål.
+    Matcher utan känt lag (side saknas) eller utan resultat ger 0.
+    """
+    matches = df_matches.drop_duplicates("match_id")[["match_id", "home_goals", "away_goals"]]
+    df = (
+        df_stats[["player_id", "season", "match_id"]]
+        .merge(matches, on="match_id", how="inner")
+        .merge(sides, on=["player_id", "match_id"], how="left")
+    )
+    conceded = df["away_goals"].where(df["side"] == "home", df["home_goals"].where(df["side"] == "away"))
+    df["clean_sheets"] = (pd.to_numeric(conceded, errors="coerce") == 0).astype(int)
+    return df
+
+
+@metric("clean_sheets", "warehouse/metrics/clean_sheets_africa/", partition_by=("season",))
+def clean_sheets(tables, results):
+    gks = [p for p in tables.registry.position_players("GK") if str(p.get("id")).isdigit()]
+    gk_ids = {int(p["id"]) for p in gks}
+    id_to_name = {int(p["id"]): p.get("name") for p in gks}
+    id_to_country = {int(p["id"]): p.get("country") for p in gks}
+    empty = pd.DataFrame(columns=["player_id", "season", "clean_sheets", "player_name", "country"])
+
+    df_stats = tables.stats[tables.stats["player_id"].isin(gk_ids)]
+    if df_stats.empty:
+        print("[metrics_engine] ⚠️ clean_sheets: ingen matchdata för målvakter")
+        return empty
+    if tables.matches is None or tables.events is None:
+        print("[metrics_engine] ⚠️ clean_sheets: matches_flat/events_flat saknas")
+        return empty
+
+    # Hash join: målvakt × match → lag (home/away) → insläppta mål
+    df = clean_sheet_rows(df_stats, tables.matches, keeper_sides(tables.events, gk_ids))
+    unknown = df["side"].isna().sum()
+    if unknown:
+        print(f"[metrics_engine] ⚠️ clean_sheets: {unknown} målvakt-matcher utan känt lag – räknas inte")
+
+    grouped = df.groupby(["player_id", "season"]).agg(clean_sheets=("clean_sheets", "sum")).reset_index()
+    grouped["player_name"] = grouped["player_id"].map(id_to_name)
+    grouped["country"] = grouped["player_id"].map(id_to_country)
+    return grouped
+
+
+@metric("toplists", "warehouse/metrics/toplists_africa.parquet", depends_on=("goals_assists", "cards"))
+def toplists(tables, results):
+    players = (
+        tables.players[["player_id", "name", "current_club", "country"]]
+        .rename(columns={"current_club": "club", "name": "player_name"})
+    )
+    df_goals = results["goals_assists"][["player_id", "season", "total_goals", "total_assists", "goal_contributions"]]
+    df_cards = results["cards"][["player_id", "season", "total_cards"]]
+    df = (
+        df_goals.merge(df_cards, on=["player_id", "season"], how="outer")
+        .merge(players, on="player_id", how="left")
+    )
+    for col in ["total_goals", "total_assists", "goal_contributions", "total_cards"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(int)
+
+    # Samma listor som leaderboards, men över alla säsonger (per säsong/liga/land/klubb: leaderboards)
+    toplist_cols = leaderboards.BOARDS
+    per_player = df.groupby(["player_id", "player_name", "country", "club"])[list(toplist_cols.values())].sum()
+    tables_by_name = {
+        name: leaderboards.top_k(per_player[col].reset_index(), col).reset_index(drop=True)
+        for name, col in toplist_cols.items()
+    }
+    return pd.concat(tables_by_name, names=["toplist", "rank"]).reset_index(level="toplist").reset_index(drop=True)
+
+
+# --- Motor ---
+
+def resolve(names):
+    """Metrics som måste räknas (inkl. beroenden), i beroendeordning."""
+    order, seen = [], set()
+
+    def _visit(name, stack=()):
+        if name in seen:
+            return
+        if name not in METRICS:
+            raise KeyError(f"Okänd metric '{name}' (finns: {', '.join(METRICS)})")
+        if name in stack:
+            raise ValueError(f"Cykel i metric-beroenden: {' → '.join(stack + (name,))}")
+        for dep in METRICS[name].depends_on:
+            _visit(dep, stack + (name,))
+        seen.add(name)
+        order.append(name)
+
+    for name in names:
+        _visit(name)
+    return order
+
+
+def compute(names=None, tables: BaseTables = None, failures: dict = None) -> dict:
+    """
+    Räkna valda metrics (default alla) över delade bas-tabeller. Returnerar {namn: DataFrame}.
+    Med failures (dict) kastas inte fel: misslyckade metrics hamnar där ({namn: fel}),
+    metrics som beror på dem hoppas över och övriga räknas ändå.
+    """
+    tables = tables or BaseTables()
+    results = {}
+    for name in resolve(names or list(METRICS)):
+        if failures is not None:
+            broken = [dep for dep in METRICS[name].depends_on if dep in failures]
+            if broken:
+                failures[name] = RuntimeError(f"beroende misslyckades: {', '.join(broken)}")
+                print(f"[metrics_engine] ⏭️ {name}: hoppas över ({', '.join(broken)} misslyckades)")
+                continue
+        try:
+            results[name] = METRICS[name].compute(tables, results)
+        except Exception as e:
+            if failures is None:
+                raise
+            failures[name] = e
+            print(f"[metrics_engine] ❌ {name}: {e}")
+            continue
+        print(f"[metrics_engine] 📊 {name}: {len(results[name])} rader")
+    return results
+
+
+def run(names=None, container: str = CONTAINER) -> dict:
+    """
+    Räkna och ladda upp valda metrics (beroenden som inte valts räknas bara i minnet).
+    En metric som misslyckas (t.ex. saknad bas-tabell) stoppar bara sig själv och sina
+    beroende metrics; övriga laddas upp och felet kastas först på slutet.
+    """
+    selected = list(names or METRICS)
+    failures = {}
+    results = compute(selected, BaseTables(container), failures)
+
+    failed = sum(1 for name in selected if name in failures)
+    uploads = {}
+    for name in selected:
+        if name not in results:
+            continue
+        m = METRICS[name]
+        if not m.partition_by:
+            uploads[m.output] = parquet_dataset.to_parquet_bytes(results[name])
+            continue
+        try:
+            manifest = parquet_dataset.write_dataset(
+                container, m.output, results[name], partition_by=m.partition_by, sort_by=["player_id"]
+            )
+            print(f"[metrics_engine] ✅ Uploaded {len(manifest['files'])} partitions → {m.output}")
+        except Exception as e:
+            failed += 1
+            print(f"[metrics_engine] ❌ Kunde inte skriva {m.output}: {e}")
+
+    for path, err in azure_blob.put_many(container, uploads, content_type="application/octet-stream"):
+        if err is not None:
+            failed += 1
+            print(f"[metrics_engine] ❌ Kunde inte skriva {path}: {err}")
+        else:
+            print(f"[metrics_engine] ✅ Uploaded → {path}")
+    if failed:
+        names_failed = ", ".join(n for n in selected if n in failures)
+        raise RuntimeError(f"[metrics_engine] {failed} av {len(selected)} outputs misslyckades"
+                           + (f" (compute: {names_failed})" if names_failed else ""))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Räkna alla Africa-metrics från en laddning av bas-tabellerna")
+    parser.add_argument("--only", nargs="+", choices=sorted(METRICS), help="Bara dessa metrics")
+    args = parser.parse_args(argv)
+
+    results = run(args.only)
+
+    for name, df in results.items():
+        print(f"\n[metrics_engine] 🔎 Sample ({name}):")
+        print(df.head(10).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+# src/warehouse/query.py
+"""
+Litet frågelager över warehouse-dataseten för stats-sektionerna.
+
+En sektion beskriver vad den behöver och får tillbaka bara de raderna:
+
+    rows = (
+        query.table("cards")
+        .where("season", "==", season)
+        .where("total_cards", ">", 0)
+        .top(5, by="total_cards")
+        .join_players("current_club")
+        .records()
+    )
+
+Körs på pyarrow compute (filter, select_k, join). Likhets-/IN-filter skickas
+vidare till parquet_dataset (partition- och row group-pruning, projektion);
+övriga filter, top-k och join görs på Arrow-tabellen. Laddade tabeller delas i
+processen (nyckel: dataset + pushdown-filter + kolumner) i högst QUERY_CACHE_TTL_S
+sekunder, och blob-läsningarna går via den lokala blob-cachen, så en ny sektion på
+samma data kostar inga extra hela-fil-nedladdningar. Filter på en kolumn som inte
+finns i datasetet kastar ValueError.
+"""
+
+import os
+import threading
+import time
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from src.storage import parquet_dataset
+from src.warehouse import utils_ids
+
+CONTAINER = os.getenv("AZURE_STORAGE_CONTAINER", "afp")
+
+# Hur länge en laddad tabell återanvänds innan datasetet läses om (warehouse skrivs om under körning)
+CACHE_TTL_S = float(os.getenv("QUERY_CACHE_TTL_S", "300"))
+
+DATASETS = {
+    "player_match_stats": "warehouse/base/player_match_stats/",
+    "goals_assists": "warehouse/metrics/goals_assists_africa/",
+    "cards": "warehouse/metrics/cards_africa/",
+    "clean_sheets": "warehouse/metrics/clean_sheets_africa/",
+}
+PLAYERS_PATH = "warehouse/base/players_flat"
+
+_COMPARE = {
+    "==": pc.equal,
+    "!=": pc.not_equal,
+    "<": pc.less,
+    "<=": pc.less_equal,
+    ">": pc.greater,
+    ">=": pc.greater_equal,
+}
+OPS = set(_COMPARE) | {"in", "not in", "date in"}
+
+_LOCK = threading.Lock()
+_TABLES = {}   # nyckel → (laddad monotonic-tid, tabell)
+
+
+def clear_cache():
+    with _LOCK:
+        _TABLES.clear()
+
+
+def _freeze(filters: dict):
+    return tuple(sorted((k, tuple(sorted(map(str, v))) if isinstance(v, (list, tuple, set)) else str(v))
+                        for k, v in filters.items()))
+
+
+def load(root: str, filters: dict = None, columns=None, container: str = CONTAINER) -> pa.Table:
+    """Arrow-tabell för ett dataset (delad i processen per dataset/filter/kolumner)."""
+    filters = dict(filters or {})
+    key = (container, root, _freeze(filters), tuple(columns) if columns is not None else None)
+    now = time.monotonic()
+    with _LOCK:
+        cached = _TABLES.get(key)
+    if cached is not None and now - cached[0] <= CACHE_TTL_S:
+        return cached[1]
+    table = parquet_dataset.read_table(container, root, filters=filters, columns=columns)
+    with _LOCK:
+        _TABLES[key] = (now, table)
+    return table
+
+
+def _scalar(value, type_):
+    return parquet_dataset.value_set([value], type_)[0] if not isinstance(value, pa.Scalar) else value
+
+
+def _as_date(column):
+    """Kolumn → date32 (timestamp, date eller ISO-sträng 'YYYY-MM-DD...')."""
+    if pa.types.is_date32(column.type):
+        return column
+    if pa.types.is_timestamp(column.type) or pa.types.is_date64(column.type):
+        return pc.cast(column, pa.date32(), safe=False)
+    text = pc.utf8_slice_codeunits(pc.cast(column, pa.string()), 0, 10)
+    return pc.cast(pc.strptime(text, format="%Y-%m-%d", unit="s", error_is_null=True), pa.date32(), safe=False)
+
+
+def _mask(table: pa.Table, col: str, op: str, value):
+    column = table.column(col)
+    if op == "date in":
+        dates = [d if isinstance(d, date) else date.fromisoformat(str(d)[:10]) for d in value]
+        return pc.is_in(_as_date(column), value_set=pa.array(dates, type=pa.date32()))
+    if op in ("in", "not in"):
+        mask = pc.is_in(column, value_set=parquet_dataset.value_set(value, column.type))
+        return pc.invert(mask) if op == "not in" else mask
+    return _COMPARE[op](column, _scalar(value, column.type))
+
+
+class Query:
+    """Deklarativ fråga: where/select/top/join_players, körs av records()/to_pandas()."""
+
+    def __init__(self, root: str, container: str = CONTAINER):
+        self.root = root
+        self.container = container
+        self.filters = []          # [(kolumn, op, värde)]
+        self.columns = None
+        self.order = None          # (kolumn, descending)
+        self.limit = None
+        self.player_columns = ()
+
+    def where(self, col: str, op: str, value):
+        if op not in OPS:
+            raise ValueError(f"Okänd operator '{op}' (tillåtna: {', '.join(sorted(OPS))})")
+        self.filters.append((col, op, value))
+        return self
+
+    def select(self, *columns):
+        self.columns = list(columns)
+        return self
+
+    def top(self, k: int, by, descending: bool = True):
+        """Top-k på kolumnen by (eller första befintliga av flera kandidater, t.ex. ("score", "rating"))."""
+        self.order = ((by,) if isinstance(by, str) else tuple(by), descending)
+        self.limit = k
+        return self
+
+    def join_players(self, *columns):
+        """Left join mot players_flat på player_id (t.ex. "current_club", "country")."""
+        self.player_columns = tuple(columns)
+        return self
+
+    def _pushdown(self):
+        return {col: (value if op == "==" else list(value)) for col, op, value in self.filters if op in ("==", "in")}
+
+    def to_arrow(self) -> pa.Table:
+        read_cols = None
+        if self.columns is not None:
+            needed = list(self.columns) + [c for c, _, _ in self.filters]
+            if self.order:
+                needed.extend(self.order[0])
+            if self.player_columns:
+                needed.append("player_id")
+            read_cols = list(dict.fromkeys(needed))
+
+        table = load(self.root, self._pushdown(), read_cols, self.container)
+
+        missing = [c for c, _, _ in self.filters if c not in table.column_names]
+        if missing:
+            raise ValueError(f"Filter på saknade kolumner i {self.root}: {', '.join(dict.fromkeys(missing))}")
+
+        for col, op, value in self.filters:
+            if op in ("==", "in"):
+                continue  # redan applicerat i parquet_dataset
+            table = table.filter(_mask(table, col, op, value))
+
+        sort_keys = None
+        if self.order:
+            by = next((c for c in self.order[0] if c in table.column_names), None)
+            if by is not None:
+                sort_keys = [(by, "descending" if self.order[1] else "ascending")]
+        if sort_keys:
+            if self.limit is not None and table.num_rows > self.limit:
+                indices = pc.select_k_unstable(table, k=self.limit, sort_keys=sort_keys)
+                table = table.take(pc.take(indices, pc.sort_indices(table.take(indices), sort_keys=sort_keys)))
+            else:
+                table = table.sort_by(sort_keys)
+        if self.limit is not None:
+            table = table.slice(0, self.limit)
+
+        if self.player_columns and "player_id" in table.column_names:
+            table = _join_players(table, self.player_columns, self.container)
+            if sort_keys:
+                table = table.sort_by(sort_keys)  # join bevarar inte radordningen
+
+        if self.columns is not None:
+            keep = list(self.columns) + [c for c in self.player_columns if c not in self.columns]
+            table = table.select([c for c in keep if c in table.column_names])
+        return table
+
+    def to_pandas(self):
+        return self.to_arrow().to_pandas()
+
+    def records(self):
+        return self.to_arrow().to_pylist()
+
+
+def _players_table(columns, container: str) -> pa.Table:
+    cols = ["player_id"] + [c for c in columns if c != "player_id"]
+    players = load(PLAYERS_PATH, None, None, container)
+    df = players.select([c for c in cols if c in players.column_names]).to_pandas()
+    df = utils_ids.to_int_ids(df, cols=["player_id"]).dropna(subset=["player_id"]).drop_duplicates("player_id")
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _join_players(table: pa.Table, columns, container: str) -> pa.Table:
+    players = _players_table(columns, container)
+    # Kolumner som redan finns i faktatabellen behålls därifrån
+    extra = [c for c in players.column_names if c != "player_id" and c not in table.column_names]
+    if not extra:
+        return table
+    players = players.select(["player_id"] + extra)
+    if table.schema.field("player_id").type != pa.int64():
+        idx = table.column_names.index("player_id")
+        table = table.set_column(idx, "player_id", pc.cast(table.column("player_id"), pa.int64()))
+    joined = table.join(players, keys="player_id", join_type="left outer")
+    return joined.select(table.column_names + extra)
+
+
+def table(name_or_root: str, container: str = CONTAINER) -> Query:
+    """Starta en fråga mot ett namngivet dataset (DATASETS) eller ett dataset-prefix."""
+    return Query(DATASETS.get(name_or_root, name_or_root), container)
+
@@ -1,20 +1,43 @@
 import pandas as pd
 
-def normalize_ids(df: pd.DataFrame, cols=None) -> pd.DataFrame:
+# Kanoniskt warehouse-schema för id-kolumner: nullable Int64.
+# events_flat/matches_flat skrivs redan med int64-id:n (Arrow-schema), och
+# player_match_stats/metrics skrivs med Int64 – joins sker alltså på heltal.
+# Placeholders i masterlistan (AFR007, NEW005) saknar matchdata och blir <NA>.
+ID_DTYPE = "Int64"
+ID_COLUMNS = [
+    "match_id",
+    "player_id",
+    "assist_id",
+    "player_in_id",
+    "player_out_id",
+    "home_team_id",
+    "away_team_id",
+]
+
+
+def to_int_ids(df: pd.DataFrame, cols=None) -> pd.DataFrame:
     """
-    Normalisera ID-kolumner till str utan '.0' och med tom sträng för NaN.
-    cols: lista med kolumner att normalisera, default = ["player_id", "assist_id", "player_in_id", "player_out_id"]
+    Säkerställ Int64 för id-kolumnerna (default ID_COLUMNS). Kolumner som redan är
+    Int64 lämnas orörda, så för data skriven med det kanoniska schemat är detta gratis;
+    äldre filer (str/float-id:n) konverteras vektoriserat utan strängoperationer.
     """
-    if cols is None:
-        cols = ["player_id", "assist_id", "player_in_id", "player_out_id"]
-
-    for col in cols:
-        if col in df.columns:
-            df[col] = (
-                df[col]
-                .fillna("")
-                .astype(str)
-                .str.replace(".0", "", regex=False)
-                .str.strip()
-            )
+    for col in cols or ID_COLUMNS:
+        if col not in df.columns or df[col].dtype == ID_DTYPE:
+            continue
+        if pd.api.types.is_integer_dtype(df[col]):
+            df[col] = df[col].astype(ID_DTYPE)
+            continue
+        values = pd.to_numeric(df[col], errors="coerce")
+        df[col] = values.where(values % 1 == 0).astype(ID_DTYPE)
     return df
+
+
+def int_id_set(ids) -> frozenset:
+    """Numeriska id:n (str/int) → frozenset[int]; placeholders som AFR007 hoppas över."""
+    out = set()
+    for pid in ids:
+        text = str(pid).strip()
+        if text.isdigit():
+            out.add(int(text))
+    return frozenset(out)
@@ -1,10 +1,17 @@
 import argparse
 import subprocess
+import threading
+import time
 import yaml
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime, timedelta
 import os
 from glob import glob
 from src.storage import azure_blob
+from src.storage.hash_util import hash_dict
+
+STATE_PATH = "warehouse/_state/plan_state.json"
+_print_lock = threading.Lock()
 
 
 # ------------------------------------------------------
@@ -13,14 +20,162 @@ from src.storage import azure_blob
 
 def run(cmd, env=None):
     """Helper för att köra subprocess och logga"""
-    print(f"[warehouse_auto] ▶️ Kör: {' '.join(cmd)}")
+    with _print_lock:
+        print(f"[warehouse_auto] ▶️ Kör: {' '.join(cmd)}", flush=True)
     res = subprocess.run(["python", "-m"] + cmd, capture_output=True, text=True, env=env)
-    if res.returncode != 0:
-        print(res.stdout)
-        print(res.stderr)
-        raise RuntimeError(f"Fel vid körning: {' '.join(cmd)}")
-    else:
-        print(res.stdout)
+    # Utskriften samlas per jobb så att parallella jobb inte blandas ihop
+    with _print_lock:
+        if res.returncode != 0:
+            print(res.stdout)
+            print(res.stderr, flush=True)
+            raise RuntimeError(f"Fel vid körning: {' '.join(cmd)}")
+        else:
+            print(res.stdout, flush=True)
+
+
+# ------------------------------------------------------
+# 🧩 DAG-schemaläggning
+# ------------------------------------------------------
+
+def _expand(paths, env):
+    return [p.format(season=env.get("SEASON", ""), league=env.get("LEAGUE", "")) for p in (paths or [])]
+
+
+def input_fingerprint(container: str, inputs) -> str:
+    """Hash över (blob-namn, etag) för alla inputs (sökväg eller prefix)."""
+    listing = {}
+    for prefix in inputs:
+        listing.update(azure_blob.list_etags(container, prefix))
+    return hash_dict(listing)
+
+
+def load_plan_state(container: str) -> dict:
+    try:
+        return azure_blob.get_json(container, STATE_PATH)
+    except Exception:
+        return {}
+
+
+def validate_dag(tasks):
+    """Kontrollera att depends_on pekar på kända tasks och att grafen saknar cykler."""
+    by_id = {t["id"]: t for t in tasks}
+    for t in tasks:
+        for dep in t.get("depends_on", []):
+            if dep not in by_id:
+                raise RuntimeError(f"Task {t['id']} beror på okänd task {dep}")
+    visiting, done = set(), set()
+
+    def _visit(tid):
+        if tid in done:
+            return
+        if tid in visiting:
+            raise RuntimeError(f"Cykel i warehouse_plan vid {tid}")
+        visiting.add(tid)
+        for dep in by_id[tid].get("depends_on", []):
+            _visit(dep)
+        visiting.discard(tid)
+        done.add(tid)
+
+    for t in tasks:
+        _visit(t["id"])
+
+
+def critical_path(tasks, timings):
+    """Längsta (tidsmässigt) beroendekedja bland körda tasks → (sekunder, [task-id])."""
+    by_id = {t["id"]: t for t in tasks}
+    memo = {}
+
+    def _longest(tid):
+        if tid in memo:
+            return memo[tid]
+        own = timings.get(tid, {}).get("seconds", 0.0)
+        best = (0.0, [])
+        for dep in by_id[tid].get("depends_on", []):
+            if dep in by_id:
+                cand = _longest(dep)
+                if cand[0] > best[0]:
+                    best = cand
+        memo[tid] = (best[0] + own, best[1] + [tid])
+        return memo[tid]
+
+    return max((_longest(t["id"]) for t in tasks), default=(0.0, []))
+
+
+def run_dag(tasks, env, container, max_workers=4, force=False):
+    """
+    Kör tasks parallellt så fort deras depends_on är klara.
+    Tasks vars inputs inte ändrats sedan senaste lyckade körning hoppas över (om inte force).
+    Ett misslyckat task gör att dess beroende tasks inte körs.
+    """
+    validate_dag(tasks)
+    by_id = {t["id"]: t for t in tasks}
+    state = load_plan_state(container)
+    state_lock = threading.Lock()
+    timings = {}
+    status = {}
+
+    def _execute(task):
+        tid = task["id"]
+        inputs = _expand(task.get("inputs"), env)
+        fingerprint = None
+        if inputs:
+            try:
+                fingerprint = input_fingerprint(container, inputs)
+            except Exception as e:
+                print(f"[warehouse_auto] ⚠️ {tid}: kunde inte läsa inputs ({e}) → kör ändå", flush=True)
+        if not force and fingerprint and state.get(tid, {}).get("inputs") == fingerprint:
+            return "skipped", 0.0
+
+        started = time.monotonic()
+        run([task["job"]], env=env)
+        seconds = time.monotonic() - started
+        if fingerprint:
+            with state_lock:
+                state[tid] = {"inputs": fingerprint, "finished_at": azure_blob.utc_now_iso(),
+                              "seconds": round(seconds, 1)}
+        return "done", seconds
+
+    pending = dict(by_id)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="wh") as pool:
+        while pending or running:
+            for tid, task in list(pending.items()):
+                deps = task.get("depends_on", [])
+                if any(status.get(d) in ("failed", "blocked") for d in deps):
+                    status[tid] = "blocked"
+                    del pending[tid]
+                    print(f"[warehouse_auto] ⛔ {tid} ({task['job']}) körs inte – beroende misslyckades", flush=True)
+                elif all(status.get(d) in ("done", "skipped") for d in deps):
+                    del pending[tid]
+                    running[pool.submit(_execute, task)] = tid
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                tid = running.pop(fut)
+                try:
+                    result, seconds = fut.result()
+                    status[tid] = result
+                    timings[tid] = {"seconds": seconds}
+                    icon = "⏭️ hoppades över (inputs oförändrade)" if result == "skipped" else f"✅ klar på {seconds:.1f}s"
+                    print(f"[warehouse_auto] {tid} {icon}", flush=True)
+                except Exception as e:
+                    status[tid] = "failed"
+                    timings[tid] = {"seconds": 0.0}
+                    print(f"[warehouse_auto] ❌ {tid} misslyckades: {e}", flush=True)
+
+    try:
+        azure_blob.upload_json(container, STATE_PATH, state)
+    except Exception as e:
+        print(f"[warehouse_auto] ⚠️ Kunde inte spara {STATE_PATH}: {e}")
+
+    total, path = critical_path(tasks, timings)
+    print("[warehouse_auto] ⏱️ Timing per task:")
+    for t in tasks:
+        tid = t["id"]
+        print(f"[warehouse_auto]   {tid:<4} {status.get(tid, '-'):<8} {timings.get(tid, {}).get('seconds', 0.0):7.1f}s  {t['job']}")
+    print(f"[warehouse_auto] ⏱️ Kritisk väg: {' → '.join(path)} ({total:.1f}s)")
+    return status
 
 
 def ensure_fresh_matches(container: str, season: str, league: str, max_age_hours: int = 24, env=None):
@@ -67,10 +222,15 @@ def ensure_fresh_matches(container: str, season: str, league: str, max_age_hours
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--all", action="store_true", help="Kör alla warehouse-scripts i src/warehouse/")
+    parser.add_argument("--force", action="store_true", help="Kör alla tasks även om inputs är oförändrade")
+    parser.add_argument("--mode", choices=["full", "delta"], default=os.getenv("WAREHOUSE_MODE", "full"),
+                        help="full: hela kedjan; delta: bara nya/ändrade matcher (tasks med modes: [delta])")
+    parser.add_argument("--max-workers", type=int, default=int(os.getenv("WAREHOUSE_MAX_WORKERS", "4")),
+                        help="Max antal warehouse-jobb som körs parallellt")
     args = parser.parse_args()
 
     today = datetime.utcnow().strftime("%Y-%m-%d")
-    print(f"[warehouse_auto] 🚀 Startar auto-warehouse {today}")
+    print(f"[warehouse_auto] 🚀 Startar auto-warehouse {today} (mode={args.mode})")
 
     plan_path = "src/warehouse/warehouse_plan.yaml"
     if not os.path.exists(plan_path):
@@ -83,17 +243,23 @@ def main():
 
     # CLI override: kör alla Python-scripts i src/warehouse/
     if args.all:
-        py_files = glob("src/warehouse/*.py")
+        py_files = sorted(glob("src/warehouse/*.py"))
         tasks = []
         for f in py_files:
             if f.endswith("_auto.py"):
                 continue  # undvik att kalla oss själva
             module = os.path.splitext(f.replace("src/", "").replace("/", "."))[0]
-            tasks.append({"job": module, "description": "auto-run", "enabled": True})
+            # Utan deklarerade beroenden: kör i ordning (kedja)
+            deps = [tasks[-1]["id"]] if tasks else []
+            tasks.append({"id": module, "job": module, "description": "auto-run", "enabled": True, "depends_on": deps})
         print(f"[warehouse_auto] 🚀 Override: kör ALLA {len(tasks)} warehouse-moduler")
 
-    # Filtrera på enabled
-    enabled_tasks = [t for t in tasks if t.get("enabled", True)]
+    # Filtrera på enabled och läge; beroenden till avstängda tasks räknas som uppfyllda
+    enabled_tasks = [dict(t) for t in tasks if t.get("enabled", True) and args.mode in t.get("modes", ["full"])]
+    enabled_ids = {t.get("id", t["job"]) for t in enabled_tasks}
+    for t in enabled_tasks:
+        t.setdefault("id", t["job"])
+        t["depends_on"] = [d for d in t.get("depends_on", []) if d in enabled_ids]
     print(f"[warehouse_auto] 📋 Jobs som ska köras: {[t['job'] for t in enabled_tasks]}")
 
     # 🔧 Sätt standardvärden för SEASON/LEAGUE om de inte finns
@@ -107,12 +273,12 @@ def main():
     # 🧠 Säkerställ att matchdata finns innan vi kör
     ensure_fresh_matches(container, base_env["SEASON"], base_env["LEAGUE"], max_age_hours=24, env=base_env)
 
-    # 🚀 Kör alla aktiva tasks
-    for task in enabled_tasks:
-        job = task["job"]
-        cmd = [job]
-        run(cmd, env=base_env)
+    # 🚀 Kör alla aktiva tasks som DAG
+    status = run_dag(enabled_tasks, base_env, container, max_workers=args.max_workers, force=args.force)
 
+    failed = [tid for tid, s in status.items() if s in ("failed", "blocked")]
+    if failed:
+        raise RuntimeError(f"Warehouse-tasks misslyckades/blockerades: {', '.join(failed)}")
     print(f"[warehouse_auto] ✅ Klar {today}")
 
 
@@ -0,0 +1,124 @@
+"""
+Lokala blob-cachen: LRU-eviction, etag-revalidering (304) och att refs/objekt
+håller ihop efter eviction. Körs mot en temporär katalog och en fejkad blob-klient.
+"""
+
+import os
+from types import SimpleNamespace
+
+import pytest
+from azure.core.exceptions import ResourceNotModifiedError
+
+from src.storage import azure_blob, blob_cache
+
+KB = 1024
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("AFP_BLOB_CACHE", "1")
+    monkeypatch.setenv("AFP_BLOB_CACHE_DIR", str(tmp_path))
+    monkeypatch.setenv("AFP_BLOB_CACHE_MAX_MB", str(10 * KB / (1024 * 1024)))  # 10 KB
+    monkeypatch.setattr(blob_cache, "_approx_size", None)
+    return tmp_path
+
+
+class FakeBlob:
+    """download_blob som Azure: villkorlig GET med If-None-Match ger 304 om etagen är oförändrad."""
+
+    def __init__(self, blobs, downloads, path):
+        self.blobs, self.downloads, self.path = blobs, downloads, path
+
+    def download_blob(self, etag=None, match_condition=None):
+        data, current = self.blobs[self.path]
+        if etag is not None and etag == current:
+            raise ResourceNotModifiedError("not modified")
+        self.downloads.append(self.path)
+        return SimpleNamespace(readall=lambda: data, properties=SimpleNamespace(etag=current))
+
+
+@pytest.fixture
+def remote(cache_dir, monkeypatch):
+    blobs, downloads = {}, []
+    client = SimpleNamespace(get_blob_client=lambda path: FakeBlob(blobs, downloads, path))
+    monkeypatch.setattr(azure_blob, "_container_client", lambda container: client)
+    return SimpleNamespace(blobs=blobs, downloads=downloads)
+
+
+def _age(path: str, mtime: float):
+    ref = blob_cache.lookup("afp", path)
+    assert ref is not None
+    digest = blob_cache.hashlib.sha256(ref[1]).hexdigest()
+    os.utime(blob_cache._object_path(digest), (mtime, mtime))
+
+
+def test_store_and_lookup_share_objects_by_content(cache_dir):
+    blob_cache.store("afp", "a.json", "e1", b"same")
+    blob_cache.store("afp", "b.json", "e2", b"same")
+
+    assert blob_cache.lookup("afp", "a.json") == ("e1", b"same")
+    assert blob_cache.lookup("afp", "b.json") == ("e2", b"same")
+    assert len(os.listdir(cache_dir / "objects")) == 1
+
+
+def test_store_without_etag_or_over_budget_is_skipped(cache_dir):
+    blob_cache.store("afp", "a.json", None, b"x")
+    blob_cache.store("afp", "big.bin", "e1", b"x" * 11 * KB)
+    assert blob_cache.lookup("afp", "a.json") is None
+    assert blob_cache.lookup("afp", "big.bin") is None
+
+
+def test_lru_eviction_down_to_80_percent(cache_dir):
+    for i, name in enumerate(["a", "b", "c"]):
+        blob_cache.store("afp", name, f"e{name}", bytes([i]) * 3 * KB)
+        _age(name, 1000 + i)
+    blob_cache.touch("afp", "a")  # a blir senast använd
+
+    blob_cache.store("afp", "d", "ed", b"d" * 3 * KB)  # 12 KB > 10 KB → ned till ≤ 8 KB
+
+    assert blob_cache.lookup("afp", "b") is None
+    assert blob_cache.lookup("afp", "c") is None
+    assert blob_cache.lookup("afp", "a") is not None
+    assert blob_cache.lookup("afp", "d") is not None
+    assert sum(p.stat().st_size for p in (cache_dir / "objects").iterdir()) <= 8 * KB
+
+
+def test_lookup_rejects_corrupt_object_and_drops_ref(cache_dir):
+    blob_cache.store("afp", "a.json", "e1", b"original")
+    digest = blob_cache.hashlib.sha256(b"original").hexdigest()
+    with open(blob_cache._object_path(digest), "wb") as f:
+        f.write(b"tampered")
+
+    assert blob_cache.lookup("afp", "a.json") is None
+    assert not os.path.exists(blob_cache._ref_path("afp", "a.json"))
+
+
+def test_get_bytes_revalidates_with_etag(remote):
+    remote.blobs["x.json"] = (b"v1", "etag-1")
+
+    assert azure_blob.get_bytes("afp", "x.json") == b"v1"
+    assert azure_blob.get_bytes("afp", "x.json") == b"v1"  # 304 → cachad kopia
+    assert remote.downloads == ["x.json"]
+
+    remote.blobs["x.json"] = (b"v2", "etag-2")
+    assert azure_blob.get_bytes("afp", "x.json") == b"v2"
+    assert blob_cache.lookup("afp", "x.json") == ("etag-2", b"v2")
+    assert remote.downloads == ["x.json", "x.json"]
+
+
+def test_ref_to_evicted_object_is_a_miss_and_refetched(remote):
+    remote.blobs["a"] = (b"a" * 4 * KB, "ea")
+    remote.blobs["b"] = (b"b" * 4 * KB, "eb")
+    remote.blobs["c"] = (b"c" * 4 * KB, "ec")
+    azure_blob.get_bytes("afp", "a")
+    _age("a", 1000)
+    azure_blob.get_bytes("afp", "b")
+    azure_blob.get_bytes("afp", "c")  # 12 KB → a evictas, ref finns kvar
+
+    assert os.path.exists(blob_cache._ref_path("afp", "a"))
+    assert blob_cache.lookup("afp", "a") is None
+
+    # Ingen villkorlig GET mot en etag vars innehåll saknas – hela bloben hämtas om
+    assert azure_blob.get_bytes("afp", "a") == b"a" * 4 * KB
+    assert remote.downloads == ["a", "b", "c", "a"]
+    assert blob_cache.lookup("afp", "a") == ("ea", b"a" * 4 * KB)
@@ -0,0 +1,229 @@
+"""
+Delta-läget ska ge samma aggregat som full kedja (B5 → B7 → M0 → leaderboards),
+både för nya matcher och för rättade matcher. Körs mot en blob-store i minnet.
+"""
+
+import hashlib
+import json
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from src.common import master_players
+from src.storage import azure_blob, parquet_dataset
+from src.warehouse import (
+    build_matches_events_flat as flat,
+    build_player_match_stats as pms,
+    delta_pipeline,
+    leaderboards,
+    metrics_engine,
+)
+
+SEASON = "2025-2026"
+PLAYERS = [
+    {"id": "1", "name": "A", "country": "Nigeria", "club": "C1", "pos": "F"},
+    {"id": "2", "name": "B", "country": "Ghana", "club": "C2", "pos": "M"},
+    {"id": "9", "name": "K", "country": "Senegal", "club": "C3", "pos": "GK"},
+]
+
+
+@pytest.fixture
+def store(monkeypatch):
+    blobs = {}
+
+    def get_bytes(container, path):
+        if path not in blobs:
+            raise FileNotFoundError(path)
+        return blobs[path]
+
+    def put_bytes(container, path, data, content_type=None):
+        blobs[path] = data
+
+    def put_many(container, items, content_type=None, max_workers=None):
+        blobs.update(items)
+        return [(p, None) for p in items]
+
+    def iter_stats_files(container, season=None, league=None, with_etag=False):
+        prefix = "stats/" + (f"{season}/" if season else "") + (f"{league}/" if season and league else "")
+        for path in sorted(blobs):
+            if path.startswith(prefix):
+                yield (path, hashlib.md5(blobs[path]).hexdigest()) if with_etag else path
+
+    monkeypatch.setattr(azure_blob, "_client", lambda: None)
+    monkeypatch.setattr(azure_blob, "_ensure_container", lambda container: None)
+    monkeypatch.setattr(azure_blob, "get_bytes", get_bytes)
+    monkeypatch.setattr(azure_blob, "put_bytes", put_bytes)
+    monkeypatch.setattr(azure_blob, "put_many", put_many)
+    monkeypatch.setattr(azure_blob, "put_file",
+                        lambda container, path, fileobj, content_type=None: put_bytes(container, path, fileobj.read()))
+    monkeypatch.setattr(azure_blob, "upload_json",
+                        lambda container, path, obj, *a: put_bytes(container, path, json.dumps(obj).encode()))
+    monkeypatch.setattr(azure_blob, "list_prefix",
+                        lambda container, prefix: sorted(p for p in blobs if p.startswith(prefix)))
+    monkeypatch.setattr(azure_blob, "iter_stats_files", iter_stats_files)
+    monkeypatch.setitem(master_players._REGISTRIES, "afp", master_players.MasterRegistry(PLAYERS))
+
+    blobs["warehouse/base/players_flat.parquet"] = parquet_dataset.to_parquet_bytes(pd.DataFrame({
+        "player_id": ["1", "2", "9"],
+        "name": ["A", "B", "K"],
+        "country": ["Nigeria", "Ghana", "Senegal"],
+        "current_club": ["C1", "C2", "C3"],
+    }))
+    return blobs
+
+
+def put_match(blobs, league, match_id, home_goals, away_goals, events):
+    blobs[f"stats/{SEASON}/{league}/{match_id}.json"] = json.dumps({
+        "id": match_id,
+        "date": f"2025-10-0{match_id}",
+        "teams": {"home": {"id": 100, "name": "H"}, "away": {"id": 200, "name": "W"}},
+        "goals": {"home_ft_goals": home_goals, "away_ft_goals": away_goals},
+        "events": [
+            {"event_type": etype, "event_minute": minute, "team": team,
+             "player": {"id": pid}, "assist_player": {"id": aid} if aid else None}
+            for etype, minute, team, pid, aid in events
+        ],
+    }).encode()
+
+
+def full_chain(full_rebuild=False):
+    for league in ("228", "229"):
+        flat.build("afp", SEASON, league, full_rebuild=full_rebuild)
+    pms.main()
+    metrics_engine.run()
+    leaderboards.rebuild("afp", SEASON)
+
+
+def snapshot(blobs):
+    out = {}
+    for name in ("goals_assists", "cards", "clean_sheets"):
+        df = parquet_dataset.read_dataset("afp", metrics_engine.METRICS[name].output)
+        df = df[[c for c in df.columns if c not in ("player_name", "country")]]
+        out[name] = df.astype(str).sort_values(["player_id", "season"]).reset_index(drop=True)
+    for name in ("player_totals", "toplists"):
+        df = metrics_engine.read_parquet("afp", metrics_engine.METRICS[name].output).astype(str)
+        out[name] = df.sort_values(list(df.columns)).reset_index(drop=True)
+    df = parquet_dataset.read_dataset("afp", pms.OUTPUT_ROOT).astype(str)
+    out["player_match_stats"] = df.sort_values(["player_id", "match_id"]).reset_index(drop=True)
+    out["leaderboards"] = {
+        path: json.loads(data)["boards"] for path, data in blobs.items()
+        if path.startswith(leaderboards.ROOT) and path.endswith(".json") and "/_" not in path
+    }
+    return out
+
+
+def assert_same(delta, full):
+    for name, value in full.items():
+        if isinstance(value, pd.DataFrame):
+            pd.testing.assert_frame_equal(delta[name], value, obj=name)
+        else:
+            assert delta[name] == value, name
+
+
+@pytest.fixture
+def seeded(store):
+    put_match(store, "228", 1, 1, 0, [("goal", 10, "home", 1, 2), ("yellow_card", 50, "home", 9, None)])
+    put_match(store, "228", 2, 0, 2, [("goal", 10, "away", 2, None), ("goal", 80, "away", 1, None)])
+    put_match(store, "229", 3, 2, 2, [("goal", 10, "home", 1, None), ("red_card", 60, "home", 2, None)])
+    full_chain()
+    assert delta_pipeline.run("afp") == {"matches": 0, "corrected": 0}
+    return store
+
+
+def test_merge_counts_adds_and_keeps_other_columns():
+    existing = pd.DataFrame({"player_id": [1, 2], "season": ["s", "s"], "total_goals": [3, 1], "player_name": ["A", "B"]})
+    delta = pd.DataFrame({"player_id": [2, 3, 3], "season": ["s", "s", "s"], "goals": [2, 1, -1]})
+    out = delta_pipeline.merge_counts(existing, delta, ["player_id", "season"], {"total_goals": "goals"})
+    out = out.set_index("player_id")
+    assert out["total_goals"].to_dict() == {1: 3, 2: 3, 3: 0}
+    assert out.loc[2, "player_name"] == "B" and pd.isna(out.loc[3, "player_name"])
+
+
+def test_new_match_equals_full_recompute(seeded):
+    put_match(seeded, "229", 4, 0, 0, [("goal", 20, "home", 2, 1), ("yellow_card", 70, "away", 9, None)])
+    assert delta_pipeline.run("afp") == {"matches": 1, "corrected": 0}
+    delta = snapshot(seeded)
+
+    full_chain(full_rebuild=True)
+    assert_same(delta, snapshot(seeded))
+
+
+def test_correction_keeps_delta_matches_from_other_leagues(seeded):
+    # Ny match (med clean sheet) via delta i 229, sedan en rättelse i 228 utan full kedja emellan
+    put_match(seeded, "229", 4, 0, 0, [("goal", 20, "home", 2, 1), ("yellow_card", 70, "away", 9, None)])
+    assert delta_pipeline.run("afp")["corrected"] == 0
+    put_match(seeded, "228", 1, 0, 0, [("yellow_card", 50, "home", 9, None), ("assist", 20, "home", 2, None)])
+    assert delta_pipeline.run("afp") == {"matches": 0, "corrected": 1}
+    delta = snapshot(seeded)
+    assert delta["clean_sheets"]["clean_sheets"].tolist() == ["2"]
+
+    full_chain(full_rebuild=True)
+    assert_same(delta, snapshot(seeded))
+
+
+def test_transient_index_error_is_raised(store, monkeypatch):
+    def fail(container, path):
+        raise TimeoutError(path)
+
+    monkeypatch.setattr(azure_blob, "get_bytes", fail)
+    with pytest.raises(TimeoutError):
+        delta_pipeline.load_applied("afp", SEASON, "228")
+
+
+def test_failed_refetch_keeps_old_rows_and_manifest_entry(seeded, monkeypatch):
+    path = f"stats/{SEASON}/228/1.json"
+    old_entry = flat.load_manifest("afp", SEASON, "228")[path]
+    put_match(seeded, "228", 1, 3, 0, [("goal", 10, "home", 1, None)])
+    get_json = azure_blob.get_json
+
+    def flaky(container, blob_path):
+        if blob_path == path:
+            raise TimeoutError(blob_path)
+        return get_json(container, blob_path)
+
+    monkeypatch.setattr(azure_blob, "get_json", flaky)
+    flat.build("afp", SEASON, "228")
+    matches = metrics_engine.read_parquet("afp", f"warehouse/base/matches_flat/{SEASON}/228.parquet")
+    assert sorted(matches["match_id"].tolist()) == [1, 2]
+    assert flat.load_manifest("afp", SEASON, "228")[path] == old_entry
+
+
+def test_full_mode_update_reapplies_corrected_match(seeded):
+    # Full läge: B5 → B7 skriver om player_match_stats, sedan leaderboards.update (L1)
+    put_match(seeded, "228", 1, 0, 0, [("yellow_card", 50, "home", 9, None), ("red_card", 60, "home", 1, None)])
+    flat.build("afp", SEASON, "228")
+    pms.main()
+    leaderboards.update("afp", SEASON)
+    boards = json.loads(seeded[leaderboards.board_path(SEASON)])["boards"]
+
+    scorers = {row["player_id"]: row["total_goals"] for row in boards["top_scorers"]}
+    assert scorers == {1: 2, 2: 1}
+    assert {row["player_id"] for row in boards["top_assists"]} == set()
+    leaderboards.rebuild("afp", SEASON)
+    assert json.loads(seeded[leaderboards.board_path(SEASON)])["boards"] == boards
+
+
+def test_parquet_sink_spills_output_to_disk(monkeypatch):
+    monkeypatch.setattr(flat, "SPOOL_MAX_BYTES", 256)
+    sink = flat.ParquetSink(flat.EVENT_SCHEMA)
+    builder = flat.BatchBuilder(flat.EVENT_SCHEMA)
+    for i in range(500):
+        builder.append((i, "228", SEASON, "goal", 10, "home", i, f"P{i}", None, None, None, None, None, None))
+    sink.write(builder.batch())
+    stream = sink.close()
+    assert stream._rolled  # över gränsen → på disk, inte i minnet
+    assert pq.read_table(stream).num_rows == sink.rows == 500
+    sink.discard()
+
+
+def test_failed_metric_only_blocks_its_dependents(store):
+    put_match(store, "228", 1, 1, 0, [("goal", 10, "home", 1, 2), ("yellow_card", 50, "home", 9, None)])
+    flat.build("afp", SEASON, "228")
+    pms.main()
+    del store[metrics_engine.PLAYERS_PATH]  # behövs av cards (och därmed toplists)
+
+    with pytest.raises(RuntimeError, match="cards, toplists"):
+        metrics_engine.run()
+    written = {m.name for m in metrics_engine.METRICS.values() if any(p.startswith(m.output) for p in store)}
+    assert written == {"player_totals", "goals_assists", "clean_sheets"}
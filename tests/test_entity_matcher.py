@@ -0,0 +1,62 @@
+"""
+Aho-Corasick-matcharen: ordgränser, accenter och överlappande träffar.
+"""
+
+import pytest
+
+from src.common import entity_matcher, master_players
+from src.producer import produce_candidates
+
+PLAYERS = [
+    {"id": "1", "name": "Mohamed Salah", "short_aliases": ["Salah", "Mo Salah"], "club": "Liverpool"},
+    {"id": "2", "name": "Sadio Mané", "aliases": ["Mane"], "club": "Al Nassr"},
+    {"id": "3", "name": "Salah Eddine", "club": "Liverpool"},
+    {"id": "4", "name": "Victor Osimhen", "club": "Galatasaray"},
+]
+
+
+@pytest.fixture
+def matcher():
+    return entity_matcher.build_player_matcher(master_players.MasterRegistry(PLAYERS))
+
+
+def ids(hits):
+    return [(kind, payload["id"] if kind != "club" else payload[0]["club"]) for _, _, kind, payload in hits]
+
+
+@pytest.mark.parametrize("text", ["Salahs form", "Assalah scored", "Salahnews"])
+def test_only_whole_words_match(matcher, text):
+    assert matcher.find_all(text) == []
+
+
+def test_punctuation_is_a_word_boundary(matcher):
+    assert ids(matcher.find_all("Goal: Salah, again!")) == [("alias", "1")]
+
+
+@pytest.mark.parametrize("text", ["Sadio Mane scores", "SADIO MANÉ scores", "sadio-mané scores"])
+def test_accents_and_case_are_ignored(matcher, text):
+    assert ids(matcher.find_all(text)) == [("name", "2")]
+
+
+def test_overlap_resolves_leftmost_longest(matcher):
+    assert ids(matcher.find_all("Mo Salah!")) == [("alias", "1")]
+    assert ids(matcher.find_all("Mohamed Salah Eddine")) == [("name", "1")]
+
+
+def test_same_span_keeps_one_hit_per_payload(matcher):
+    matcher = entity_matcher.build_player_matcher(master_players.MasterRegistry(
+        [{"id": "5", "name": "Bertrand Traoré", "aliases": ["Bertrand Traore"]}]
+    ))
+    assert ids(matcher.find_all("Bertrand Traoré")) == [("name", "5")]
+
+
+def test_match_player_counts_one_mention_per_span(matcher):
+    # "Mo Salah" får inte räknas dubbelt och slå Osimhen som nämns två gånger
+    player, score, mentioned = produce_candidates.match_player("Mo Salah! Victor Osimhen, Victor Osimhen", matcher)
+    assert player["id"] == "4" and score == 1.0
+    assert sorted(mentioned) == ["1", "4"]
+
+
+def test_match_player_falls_back_to_club(matcher):
+    player, score, mentioned = produce_candidates.match_player("Liverpool win again", matcher)
+    assert player["id"] == "1" and score == 0.4 and mentioned == []
@@ -0,0 +1,151 @@
+"""
+GPT-svarscachen: träff/TTL, TTL per sektion (sections_library.yaml → run_section)
+och sammanslagning av samtidiga identiska anrop, inklusive när ägaranropet fallerar.
+"""
+
+import sys
+import threading
+import time
+import types
+from argparse import Namespace
+
+import pytest
+
+from src.producer import gpt, produce_section
+from src.storage import azure_blob
+
+
+@pytest.fixture
+def calls(tmp_path, monkeypatch):
+    """Fejkat GPT-anrop + tom cache (minne, temp-katalog, blob i en dict)."""
+    blobs = {}
+
+    def get_json(container, path):
+        if path not in blobs:
+            raise FileNotFoundError(path)
+        return blobs[path]
+
+    made = []
+
+    def call_gpt(messages, persona):
+        made.append(messages)
+        return f"text {len(made)}"
+
+    monkeypatch.setenv("GPT_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(gpt, "_memory_cache", {})
+    monkeypatch.setattr(gpt, "_inflight", {})
+    monkeypatch.setattr(azure_blob, "get_json", get_json)
+    monkeypatch.setattr(azure_blob, "upload_json", lambda container, path, obj: blobs.__setitem__(path, obj))
+    monkeypatch.setattr(gpt, "_call_gpt", call_gpt)
+    return made
+
+
+PROMPT = {"persona": "expert", "instructions": "Summarize"}
+
+
+def test_identical_prompt_is_served_from_cache(calls):
+    assert gpt.render_gpt(PROMPT, {"x": 1}) == "text 1"
+    assert gpt.render_gpt(PROMPT, {"x": 1}) == "text 1"
+    assert gpt.render_gpt(PROMPT, {"x": 2}) == "text 2"
+    assert len(calls) == 2
+
+
+def test_cache_survives_process_memory_via_disk(calls, monkeypatch):
+    gpt.render_gpt(PROMPT, None)
+    monkeypatch.setattr(gpt, "_memory_cache", {})
+    assert gpt.render_gpt(PROMPT, None) == "text 1"
+    assert len(calls) == 1
+
+
+def test_expired_entry_is_regenerated(calls, monkeypatch):
+    gpt.render_gpt({**PROMPT, "cache_ttl_s": 60}, None)
+    later = time.time() + 120
+    monkeypatch.setattr(gpt, "time", types.SimpleNamespace(time=lambda: later))
+    assert gpt.render_gpt({**PROMPT, "cache_ttl_s": 60}, None) == "text 2"
+
+
+def test_section_ttl_applies_unless_prompt_overrides(calls):
+    with gpt.section_cache_ttl(0):
+        gpt.render_gpt(PROMPT, None)
+        gpt.render_gpt(PROMPT, None)
+        assert len(calls) == 2
+        gpt.render_gpt({**PROMPT, "cache_ttl_s": 3600}, None)
+        gpt.render_gpt({**PROMPT, "cache_ttl_s": 3600}, None)
+        assert len(calls) == 3
+    gpt.render_gpt(PROMPT, None)  # utanför sektionen: default-TTL → cachad sedan tidigare
+    assert len(calls) == 3
+
+
+def test_run_section_passes_library_ttl(calls, monkeypatch):
+    def build_section(args):
+        gpt.render_gpt(PROMPT, None)
+        return {"section_code": args.section}
+
+    monkeypatch.setitem(sys.modules, "src.sections.fake_ttl", types.SimpleNamespace(build_section=build_section))
+    library = {"sections": {"S.FAKE": {"module": "fake_ttl", "cache_ttl_s": 0}}}
+    args = Namespace(section="S.FAKE", pod=None, dry_run=False)
+
+    produce_section.run_section(args, library)
+    produce_section.run_section(args, library)
+    assert len(calls) == 2
+
+    library["sections"]["S.FAKE"].pop("cache_ttl_s")
+    produce_section.run_section(args, library)
+    produce_section.run_section(args, library)
+    assert len(calls) == 3
+
+
+def _coalesce(monkeypatch, owner_call):
+    """Kör två identiska anrop där det andra garanterat väntar på ägarens in-flight-anrop."""
+    started, waiting = threading.Event(), threading.Event()
+    log = gpt.logger.info
+
+    def info(msg, *args):
+        if msg.startswith("Waiting for identical in-flight call"):
+            waiting.set()
+        log(msg, *args)
+
+    def call_gpt(messages, persona):
+        started.set()
+        assert waiting.wait(5)
+        return owner_call()
+
+    monkeypatch.setattr(gpt.logger, "info", info)
+    monkeypatch.setattr(gpt, "_call_gpt", call_gpt)
+
+    results = {}
+
+    def run(name):
+        try:
+            results[name] = gpt.render_gpt(PROMPT, None)
+        except Exception as e:
+            results[name] = e
+
+    owner = threading.Thread(target=run, args=("owner",))
+    owner.start()
+    assert started.wait(5)
+    waiter = threading.Thread(target=run, args=("waiter",))
+    waiter.start()
+    owner.join(5)
+    waiter.join(5)
+    return results
+
+
+def test_concurrent_identical_calls_are_coalesced(calls, monkeypatch):
+    made = []
+    results = _coalesce(monkeypatch, lambda: made.append(1) or "shared")
+    assert results == {"owner": "shared", "waiter": "shared"}
+    assert made == [1]
+    assert gpt._inflight == {}
+
+
+def test_owner_failure_propagates_to_waiters(calls, monkeypatch):
+    boom = RuntimeError("rate limited")
+
+    def fail():
+        raise boom
+
+    results = _coalesce(monkeypatch, fail)
+    assert results["owner"] is boom and results["waiter"] is boom
+    assert gpt._inflight == {}
+    assert gpt._memory_cache == {}
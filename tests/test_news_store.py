@@ -0,0 +1,99 @@
+"""
+News-storen: URL-normalisering, dedupe vid append och sammanslagning av chunks.
+"""
+
+import pytest
+
+from src.collectors import news_store
+
+NOW = "2025-10-02T08:00:00+00:00"
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://www.BBC.co.uk/sport/football/123/", "//bbc.co.uk/sport/football/123"),
+    ("http://bbc.co.uk/sport/football/123?at_medium=RSS#comments", "//bbc.co.uk/sport/football/123"),
+    ("https://x.com/a?utm_source=rss&fbclid=1&gclid=2&UTM_Medium=x", "//x.com/a"),
+    ("https://x.com/article.php?id=123&utm_source=rss", "//x.com/article.php?id=123"),
+    ("https://x.com/a?b=2&a=1", "//x.com/a?a=1&b=2"),
+    ("  https://bbc.co.uk/sport/  ", "//bbc.co.uk/sport"),
+    ("", ""),
+    (None, ""),
+])
+def test_normalize_url(url, expected):
+    assert news_store.normalize_url(url) == expected
+
+
+def test_append_items_dedupes_across_sources():
+    index = news_store.empty_index("premier_league", "2025-10-02")
+    new = news_store.append_items(index, None, {
+        "bbc": [{"id": "b1", "link": "https://www.bbc.co.uk/a?utm_source=rss"}, {"id": "b2", "link": "https://bbc.co.uk/b"}],
+        "guardian": [{"link": "https://bbc.co.uk/a/"}, {"title": "utan länk och id"}],
+        "aggregator": [{"id": "b1", "link": "https://agg.example/r/1"}],
+    }, NOW)
+
+    assert [i["id"] for i in new] == ["b1", "b2"]
+    assert all(i["first_seen"] == NOW for i in new)
+    key = new[0]["store_key"]
+    assert index["items"][key]["sources"] == ["bbc", "guardian", "aggregator"]
+    # Även aggregatorns URL pekar nu på samma story
+    assert index["keys"][news_store.item_keys({"link": "https://agg.example/r/1"})[0]] == key
+
+
+def test_append_items_keeps_different_ids_on_the_same_path():
+    index = news_store.empty_index("premier_league", "2025-10-02")
+    new = news_store.append_items(index, None, {
+        "site": [
+            {"id": "123", "link": "https://x.com/article.php?id=123"},
+            {"id": "456", "link": "https://x.com/article.php?id=456"},
+            {"id": "a", "link": "https://x.com/live"},
+            {"id": "b", "link": "https://x.com/live"},
+        ],
+        "mirror": [{"id": "b", "link": "https://x.com/live?utm_source=rss"}],
+    }, NOW)
+
+    assert [i["id"] for i in new] == ["123", "456", "a", "b"]
+    assert len({i["store_key"] for i in new}) == 4
+    assert index["items"][new[3]["store_key"]]["sources"] == ["site", "mirror"]
+
+
+def test_append_items_skips_known_items_and_inherits_first_seen():
+    yesterday = news_store.empty_index("premier_league", "2025-10-01")
+    news_store.append_items(yesterday, None, {"bbc": [{"id": "b1", "link": "https://bbc.co.uk/a"}]},
+                            "2025-10-01T20:00:00+00:00")
+
+    index = news_store.empty_index("premier_league", "2025-10-02")
+    first = news_store.append_items(index, yesterday, {"bbc": [{"id": "b1", "link": "https://bbc.co.uk/a"}]}, NOW)
+    index["chunks"].append("chunks/0000-x.jsonl")
+    again = news_store.append_items(index, yesterday, {"bbc": [{"id": "b1", "link": "https://bbc.co.uk/a"}]}, NOW)
+
+    assert first[0]["first_seen"] == "2025-10-01T20:00:00+00:00"
+    assert again == []
+    assert index["items"][first[0]["store_key"]]["chunk"] == 0
+
+
+def test_merge_stream_dedupes_in_chunk_order_and_adds_sources():
+    index = news_store.empty_index("premier_league", "2025-10-02")
+    c0 = news_store.append_items(index, None, {"bbc": [{"id": "1", "link": "https://x.com/1", "source": "bbc"}]}, NOW)
+    index["chunks"].append("chunks/0000.jsonl")
+    c1 = news_store.append_items(index, None, {
+        "sky": [{"id": "1", "link": "https://x.com/1"}, {"id": "2", "link": "https://x.com/2", "source": "sky"}],
+    }, NOW)
+    chunks = [news_store.from_jsonl(news_store.to_jsonl(c)) for c in (c0, c1 + c0)]
+
+    items = news_store.merge_stream(index, chunks)
+    assert [i["id"] for i in items] == ["1", "2"]
+    assert items[0]["sources"] == ["bbc", "sky"]
+    assert items[1]["sources"] == ["sky"]
+
+
+def test_merge_stream_without_index_entry_falls_back_to_item_source():
+    items = news_store.merge_stream({}, [[{"store_key": "k", "source": "bbc"}, {"source": "no key"}]])
+    assert items == [{"store_key": "k", "source": "bbc", "sources": ["bbc"]}]
+
+
+def test_collector_prefix(monkeypatch):
+    monkeypatch.delenv("COLLECTOR_BLOB_PREFIX", raising=False)
+    assert news_store.collector_prefix() == "collector/"
+    monkeypatch.setenv("COLLECTOR_BLOB_PREFIX", "staging/collector/")
+    assert news_store.store_prefix(news_store.collector_prefix(), "pl", "2025-10-02") == \
+        "staging/collector/curated/news/_store/pl/2025-10-02"